@@ -1,59 +1,44 @@
+import argparse
 import csv
 import os
-#pip install matplotlib
-import matplotlib.pyplot as plt
+import charts
+import instrumentation
+import participation
+import player_identity
+import rating_state
 
 k_factor = 40
 initial_rating = 1400
 
-players_to_hide_output = {
-    'Александар Јакшић',
-    'Стеван Радаковић',
-    'Предраг Тошић',
-    'Емир Баручија',
-    'Слободан Жарић',
-    'Сергеј Хринко',
-    'Звонко Николић',
-    'Ануш',
-    'Милош Грујић (*)',
-    'Перо Остојић',
-    'Мирко Спасојевић',
-    'Марко Лакић',
-    'Tim Hendon',
-    'Саша Радојевић',
-    'Аца Спасојевић',
-    'Слободан Бојанић',
-    'Саша Дожић',
-    'Алекса Миловановић',
-    'Перица Милошевић',
-    'Далибор Марчета',
-    'Nathan Main',
-    'Eric Main',
-    'Sagnik Sinha',
-    'Ивица Колев',
-    'Eli Main',
-    'Кита Колева',
-    'Cody Rose'
-}
+results_folder = os.path.join('..', 'Rezultati')
+history_folder = 'history'
+state_file = 'rating_state.json'
 
 
+def expected_score(player_rating, opponent_rating):
+    """
+    Expected score of a player against an opponent, between 0 and 1.
+    """
+    return 1 / (1 + 10 ** ((opponent_rating - player_rating) / 400))
+
 def new_elo_rating(player_rating, opponent_rating, result):
     """
     Calculate the new Elo rating for a player.
     """
-    expected_score = 1 / (1 + 10 ** ((opponent_rating - player_rating) / 400))
-    new_rating = player_rating + k_factor * (result - expected_score)
+    new_rating = player_rating + k_factor * (result - expected_score(player_rating, opponent_rating))
     return round(new_rating)
 
 def ensure_player_initial_rating(player, per_player_history):
     if player not in per_player_history:
         per_player_history[player] = [initial_rating]
 
-def update_ratings(match_results, per_player_history):
+def update_ratings(match_results, per_player_history, ratings=None):
     """
     Update Elo ratings for a set of players based on match results.
+    Pass the ratings from an earlier run to continue from them.
     """
-    ratings = {}
+    if ratings is None:
+        ratings = {}
 
     for player1, player2, result in match_results:
         ensure_player_initial_rating(player1, per_player_history)
@@ -72,54 +57,11 @@ def update_ratings(match_results, per_player_history):
 
     return ratings
 
-# Read match results from a series of CSV files
-match_results = []
-file_number = 1
-
-while True:
-    filename = f"..\\rezultati\\{file_number}.csv"
-    if not os.path.exists(filename):
-        break
-
-    with open(filename, 'r', encoding='utf-8') as file:
-        print(f"Processing {filename} ...")
-        reader = csv.reader(file)
-        for row in reader:
-            # Skip the first column and read the rest
-            player1, player2, result = row[1], row[2], float(row[3])
-            match_results.append((player1, player2, result))
-
-    file_number += 1
-
-print("\n\n")
-
-# Calculate and print the final ratings
-per_player_history = {}
-final_ratings = update_ratings(match_results, per_player_history)
-
-i = 1
-for player, history in per_player_history.items():
-    if player not in players_to_hide_output:
-        print(f"Processing history for player {i}", end="\r")
-
-        with open(f"history\\{player}.csv", 'w', newline='', encoding='utf-8-sig') as file:
-            writer = csv.writer(file)
-            for rating in history:
-                writer.writerow([int(rating)])
-        plt.figure(figsize=(10, 6))  # Width and height in inches
-        plt.plot(history, marker='o')  # 'o' adds circle markers to each point
-        plt.title(f'{player}')
-        plt.ylabel('Rating')
-
-        # Save the plot as a JPEG file
-        plt.savefig(f'history\\{player}.jpg', format='jpg', dpi = 300)
-        plt.close()
-        i += 1
-
-print("\n\n")
-
-# Sort the ratings by their value in descending order
-sorted_ratings = sorted(final_ratings.items(), key=lambda x: x[1], reverse=True)
+def write_player_history(player, history, folder=history_folder):
+    with open(os.path.join(folder, f"{player}.csv"), 'w', newline='', encoding='utf-8-sig') as file:
+        writer = csv.writer(file)
+        for rating in history:
+            writer.writerow([int(rating)])
 
 def process_and_write_ratings(filename, sorted_ratings, players_to_hide_output=None, print_to_console=False):
     result = []
@@ -136,7 +78,245 @@ def process_and_write_ratings(filename, sorted_ratings, players_to_hide_output=N
         for i, (player, rating) in enumerate(result, start=1):
             writer.writerow([player, rating])
 
-process_and_write_ratings('rating.csv', sorted_ratings, players_to_hide_output=players_to_hide_output, print_to_console=True)
-process_and_write_ratings('all_ratings.csv', sorted_ratings, players_to_hide_output=None, print_to_console=False)
+def load_incremental_state(identity):
+    """
+    Load the saved rating state if it can be continued with the current settings.
+    """
+    state = rating_state.load_state(state_file)
+    if state is None:
+        print(f"No rating state in {state_file}, doing a full replay")
+        return None
+    if state['k_factor'] != k_factor or state['initial_rating'] != initial_rating:
+        print("Rating state was made with different settings, doing a full replay")
+        return None
+    if state.get('aliases') != identity.signature():
+        print("Player aliases have changed, doing a full replay")
+        return None
+    return state
+
+def read_results(incremental, identity):
+    """
+    The rating state to continue from and the results that are not in it yet.
+
+    Falls back to a new state (a full replay) when the saved one cannot be continued.
+    """
+    with instrumentation.span('results.read'):
+        state = load_incremental_state(identity) if incremental else None
+        if state is not None:
+            new_results, files = rating_state.read_new_results(state, results_folder)
+            if new_results is None:
+                print("Already processed results have changed, doing a full replay")
+                state = None
+
+        if state is None:
+            state = rating_state.new_state(k_factor, initial_rating)
+            new_results, files = rating_state.read_new_results(state, results_folder)
+    instrumentation.count('games read', len(new_results))
+    return state, new_results, files
+
+def apply_results(state, identity, new_results, files, engine='python'):
+    """
+    Rate new results into the state.
+
+    Returns the players with new games and the participation index.
+    """
+    # Players in the state are already known under their canonical names
+    for player in state['players']:
+        identity.add_name(player)
+    new_results = [(file_number, round_name, identity.register(player1), identity.register(player2), result)
+                   for file_number, round_name, player1, player2, result in new_results]
+    state['aliases'] = identity.signature()
+
+    participation_index = participation.ParticipationIndex(state['participation'])
+    for file_number, _, player1, player2, _ in new_results:
+        participation_index.add_game(file_number, player1, player2)
+
+    # Continue from the ratings in the state, a full replay starts from an empty one
+    per_player_history = state['players']
+    ratings = {player: history[-1] for player, history in per_player_history.items()}
+    match_results = [(player1, player2, result) for _, _, player1, player2, result in new_results]
+    with instrumentation.span('replay'):
+        if engine == 'numpy':
+            import vectorized_elo
+            round_results = [((file_number, round_name), player1, player2, result)
+                             for file_number, round_name, player1, player2, result in new_results]
+            vectorized_elo.update_ratings_by_round(round_results, per_player_history, ratings, k_factor,
+                                                   initial_rating)
+        else:
+            update_ratings(match_results, per_player_history, ratings)
+    instrumentation.count('games rated', len(match_results))
+
+    rating_state.mark_processed(state, files, new_results)
+
+    changed_players = {player for player1, player2, _ in match_results for player in (player1, player2)}
+    return changed_players, participation_index
+
+def replay_results(incremental, engine):
+    """
+    Rate the results in the CSV files, continuing from the saved state when incremental.
+
+    Returns the state, the players with new games and the participation index. The
+    state is not saved here: run saves it once the output files are written.
+    """
+    identity = player_identity.load_aliases()
+    state, new_results, files = read_results(incremental, identity)
+
+    print("\n\n")
+
+    changed_players, participation_index = apply_results(state, identity, new_results, files, engine)
+    return state, changed_players, participation_index
+
+def replay_backend(backend, use_store):
+    """
+    Rate all games with a rating backend, from the binary game store or the CSV files.
+
+    Returns the history of every player, the players with new games, the participation
+    index and the players the backend leaves out of rating.csv.
+    """
+    import numpy as np
+
+    import game_store
+    import vectorized_elo
+
+    with instrumentation.span('results.read'):
+        if use_store:
+            store = game_store.load_current(results_folder)
+            print(f"Loaded {len(store)} games from the game store\n\n")
+        else:
+            store = game_store.GameStore.from_csv(results_folder)
+            print(f"Read {len(store)} games from {results_folder}\n\n")
+    instrumentation.count('games read', len(store))
+
+    # Spellings of the same player share one id
+    identity = player_identity.load_aliases()
+    player_index = vectorized_elo.PlayerIndex()
+    player_ids = np.array([player_index.add(identity.register(name)) for name in store.names], dtype=np.int64)
+
+    white_ids = player_ids[store.games['white']]
+    black_ids = player_ids[store.games['black']]
+    participation_index = participation.ParticipationIndex.from_arrays(player_index.names, store.games['tournament'],
+                                                                        white_ids, black_ids)
+
+    with instrumentation.span('replay'):
+        histories = backend.replay(store.round_ids(), white_ids, black_ids, store.results(), len(player_index))
+    instrumentation.count('games rated', len(store))
+    per_player_history = {name: history.tolist() for name, history in zip(player_index.names, histories)}
+
+    eligible = backend.eligible()
+    hidden_players = set()
+    if eligible is not None:
+        hidden_players = {name for name, shown in zip(player_index.names, eligible) if not shown}
+    return per_player_history, set(per_player_history), participation_index, hidden_players
+
+def main():
+    parser = argparse.ArgumentParser(description='Rating from the tournament results')
+    parser.add_argument('--incremental', action='store_true',
+                        help=f'apply only results that are not in {state_file} yet')
+    parser.add_argument('--engine', choices=['python', 'numpy'], default='python',
+                        help='game by game loop or NumPy replay that rates a whole round at once')
+    parser.add_argument('--store', action='store_true',
+                        help='read the games from the binary game store instead of the CSV files')
+    parser.add_argument('--backend', choices=['elo', 'glicko2'], default='elo',
+                        help='rating system; glicko2 writes history_glicko2/ and rating_glicko2.csv, leaving '
+                             'players with an uncertain rating out of it')
+    parser.add_argument('--period', choices=['tournament', 'round'], default='tournament',
+                        help='Glicko-2 rating period')
+    parser.add_argument('--max-deviation', type=float, default=150,
+                        help='largest Glicko-2 rating deviation of a player shown in rating_glicko2.csv')
+    parser.add_argument('--charts', choices=sorted(charts.presets), default='print',
+                        help='print: JPEG at 300 dpi, web: PNG at 100 dpi')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='processes used to draw charts (default: one per CPU)')
+    parser.add_argument('--no-charts', action='store_true',
+                        help='only write the CSV files; the charts can be drawn later with charts.py')
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+
+    if args.store and args.incremental:
+        parser.error('--store always replays all games, it cannot be combined with --incremental')
+    if args.backend != 'elo' and args.incremental:
+        parser.error('--incremental is only available for the elo backend')
+
+    with instrumentation.profiling(args):
+        run(args)
+
+def output_files(backend):
+    """
+    History folder and rating lists of a backend.
+
+    Only Elo writes the shared files that the incremental state continues; other
+    backends get their own, e.g. history_glicko2/ and rating_glicko2.csv.
+    """
+    if backend == 'elo':
+        return history_folder, 'rating.csv', 'all_ratings.csv'
+    return f"{history_folder}_{backend}", f"rating_{backend}.csv", f"all_ratings_{backend}.csv"
+
+def run(args):
+    """
+    Rate the results and write the histories, charts and rating lists.
+    """
+    folder, rating_file, all_ratings_file = output_files(args.backend)
+    os.makedirs(folder, exist_ok=True)
+    state = None
+
+    if args.backend == 'glicko2':
+        import rating_backends
+        backend = rating_backends.Glicko2Backend(initial_rating, period=args.period,
+                                                 max_deviation=args.max_deviation)
+        per_player_history, changed_players, participation_index, hidden_players = replay_backend(backend, args.store)
+    elif args.store:
+        import rating_backends
+        backend = rating_backends.EloBackend(k_factor, initial_rating)
+        per_player_history, changed_players, participation_index, hidden_players = replay_backend(backend, True)
+        # The shared files now come from the store, the state may not match them any more
+        if os.path.exists(state_file):
+            os.remove(state_file)
+            print(f"Removed {state_file}, the next --incremental run does a full replay")
+    else:
+        state, changed_players, participation_index = replay_results(args.incremental, args.engine)
+        per_player_history = state['players']
+        hidden_players = set()
+
+    # Only players who played in two tournaments, one of them among the last three, are listed
+    hidden_players |= set(per_player_history) - participation_index.eligible_players()
+    final_ratings = {player: history[-1] for player, history in per_player_history.items()}
+
+    # History of players without new games is already on disk
+    i = 1
+    with instrumentation.span('history.write'):
+        for player, history in per_player_history.items():
+            if player not in hidden_players and player in changed_players:
+                print(f"Processing history for player {i}", end="\r")
+                write_player_history(player, history, folder)
+                i += 1
+    instrumentation.count('histories written', i - 1)
+
+    print("\n\n")
+
+    # Charts that are already drawn from the same history are skipped
+    if not args.no_charts:
+        visible_histories = {player: history for player, history in per_player_history.items()
+                             if player not in hidden_players}
+        with instrumentation.span('charts.render'):
+            drawn = charts.render_history_charts(visible_histories, folder, args.charts, args.workers)
+        instrumentation.count('charts drawn', drawn)
+        print(f"Drew {drawn} history charts\n\n")
+
+    # Sort the ratings by their value in descending order
+    sorted_ratings = sorted(final_ratings.items(), key=lambda x: x[1], reverse=True)
+
+    with instrumentation.span('csv.write'):
+        process_and_write_ratings(rating_file, sorted_ratings, players_to_hide_output=hidden_players,
+                                  print_to_console=True)
+        process_and_write_ratings(all_ratings_file, sorted_ratings, players_to_hide_output=None,
+                                  print_to_console=False)
+
+    # Saved last, so that a run that fails before its files are written is repeated
+    if state is not None:
+        with instrumentation.span('state.write'):
+            rating_state.save_state(state_file, state)
+
+    print("\n\n")
 
-print("\n\n")
+if __name__ == "__main__":
+    main()
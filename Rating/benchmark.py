@@ -0,0 +1,311 @@
+"""
+Benchmarks of the monthly rating run on synthetic archives.
+
+An archive of N tournaments with M players and R rounds is generated in a temporary
+folder laid out like the project: Rezultati/N.csv, "Turnir X/Turnir X.xlsm" with one
+numeric sheet per round, and a tournament folder with a Ucesnici file and a copy of
+the template. Then these stages are timed, each the best of a few repeats:
+
+    read_results     rating_state.read_new_results of all result files
+    update_ratings   Rating.update_ratings of all games
+    izvoz            excel_to_csv.izvoz of every workbook, without a manifest
+    charts           charts.render_history_charts of the first players
+    import           azuriraj_ucesnike.sync_tournament of a full tournament
+
+The times can be saved as a baseline (benchmark_baseline.json) and later runs are
+compared with it; a stage that got slower by more than the tolerance is flagged and
+the exit code is 1, so the check can run before a change is merged.
+
+    python benchmark.py --sizes small medium --save-baseline
+    python benchmark.py --sizes small medium
+"""
+
+import argparse
+import contextlib
+import csv
+import io
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import player_identity
+import rating_state
+from Rating import expected_score, initial_rating, k_factor, update_ratings
+
+project_root = Path(__file__).resolve().parent.parent
+template_file = project_root / "Sabloni" / "Sahovski turnir sablon.xlsm"
+baseline_file = 'benchmark_baseline.json'
+
+# (tournaments, players, rounds)
+sizes = {
+    'small': (5, 40, 7),
+    'medium': (20, 150, 9),
+    'large': (60, 500, 11),
+}
+
+stages = ['read_results', 'update_ratings', 'izvoz', 'charts', 'import']
+
+# Players in one tournament, like the 30 slots of the template
+field_size = 30
+
+
+def synthetic_names(count):
+    return [f"Player {number:04d}" for number in range(1, count + 1)]
+
+
+def generate_games(tournaments, players, rounds, seed=1):
+    """
+    {tournament: [(round, white, black, result)]} of random pairings, the winner drawn
+    from the Elo expected score of hidden strengths.
+    """
+    rng = random.Random(seed)
+    names = synthetic_names(players)
+    strengths = {name: rng.gauss(initial_rating, 200) for name in names}
+
+    archive = {}
+    for tournament in range(1, tournaments + 1):
+        field = rng.sample(names, min(field_size, players) // 2 * 2)
+        games = []
+        for round_number in range(1, rounds + 1):
+            rng.shuffle(field)
+            for white, black in zip(field[::2], field[1::2]):
+                expected = expected_score(strengths[white], strengths[black])
+                value = rng.random()
+                result = 1 if value < expected - 0.05 else 0.5 if value < expected + 0.05 else 0
+                games.append((round_number, white, black, result))
+        archive[tournament] = games
+    return archive
+
+
+def write_results(folder, archive):
+    os.makedirs(folder, exist_ok=True)
+    for tournament, games in archive.items():
+        with open(rating_state.result_filename(folder, tournament), 'w', encoding='utf-8', newline='') as file:
+            csv.writer(file, lineterminator='\n').writerows(games)
+
+
+def workbook_folder(tournament):
+    return f"Turnir {tournament:03d}"
+
+
+def write_workbooks(root, archive):
+    """
+    One workbook per tournament with a numeric sheet per round: board, white, black, result.
+    """
+    # pip install openpyxl
+    import openpyxl
+
+    for tournament, games in archive.items():
+        workbook = openpyxl.Workbook(write_only=True)
+        rounds = {}
+        for round_number, white, black, result in games:
+            rounds.setdefault(round_number, []).append((white, black, result))
+        for round_number, round_games in rounds.items():
+            sheet = workbook.create_sheet(str(round_number))
+            sheet.append(['Сто', 'Бели', 'Црни', 'Резултат'])
+            for board, (white, black, result) in enumerate(round_games, start=1):
+                sheet.append([board, white, black, result])
+        folder = os.path.join(root, workbook_folder(tournament))
+        os.makedirs(folder, exist_ok=True)
+        workbook.save(os.path.join(folder, f"{workbook_folder(tournament)}.xlsm"))
+
+
+def write_participants(folder, names):
+    """
+    Ucesnici workbook with every player paid, in the columns azuriraj_ucesnike.py reads.
+    """
+    import openpyxl
+
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet('Sheet1')
+    sheet.append([None, 'Име', 'Уплаћено учешће'])
+    for name in names:
+        sheet.append([None, name, 1000])
+    workbook.save(os.path.join(folder, f"Ucesnici {Path(folder).name.split()[-1]}.xlsm"))
+
+
+def best_time(function, repeat, setup=None):
+    """
+    Shortest time of repeat calls, with setup run before each call and not timed.
+    """
+    times = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def run_size(tournaments, players, rounds, repeat=3, chart_count=10, selected=None):
+    """
+    Seconds of every selected stage on an archive of the given size.
+    """
+    selected = selected or stages
+    archive = generate_games(tournaments, players, rounds)
+    timings = {}
+
+    with tempfile.TemporaryDirectory(prefix='benchmark-') as root:
+        rating_folder = os.path.join(root, 'Rating')
+        results = os.path.join(root, 'Rezultati')
+        os.makedirs(rating_folder)
+        write_results(results, archive)
+        write_workbooks(root, archive)
+
+        old_folder = os.getcwd()
+        os.chdir(rating_folder)
+        try:
+            # The scripts print progress for every file, which is not what is measured
+            with contextlib.redirect_stdout(io.StringIO()):
+                identity = player_identity.load_aliases()
+
+                if 'read_results' in selected:
+                    timings['read_results'] = best_time(
+                        lambda: rating_state.read_new_results(rating_state.new_state(k_factor, initial_rating),
+                                                              results), repeat)
+
+                match_results = [(white, black, float(result))
+                                 for _, games in sorted(archive.items()) for _, white, black, result in games]
+                histories = {}
+                if 'update_ratings' in selected:
+                    timings['update_ratings'] = best_time(lambda: update_ratings(match_results, histories.clear() or histories),
+                                                          repeat)
+                else:
+                    update_ratings(match_results, histories)
+
+                if 'izvoz' in selected:
+                    import excel_to_csv
+                    timings['izvoz'] = best_time(
+                        lambda: [excel_to_csv.izvoz(str(tournament), workbook_folder(tournament), {}, identity)
+                                 for tournament in archive], repeat)
+
+                if 'charts' in selected:
+                    import charts
+                    chart_folder = os.path.join(rating_folder, 'history')
+                    chart_histories = dict(sorted(histories.items())[:chart_count])
+                    timings['charts'] = best_time(
+                        lambda: charts.render_history_charts(chart_histories, chart_folder, 'web'), repeat,
+                        setup=lambda: (shutil.rmtree(chart_folder, ignore_errors=True), os.makedirs(chart_folder)))
+
+                if 'import' in selected:
+                    timings['import'] = time_import(root, sorted(histories)[:field_size],
+                                                    {player: history[-1] for player, history in histories.items()},
+                                                    repeat)
+        finally:
+            os.chdir(old_folder)
+
+    return timings
+
+
+def time_import(root, names, ratings, repeat):
+    """
+    Best time of entering a full field of paid participants into a new tournament file.
+    """
+    sys.path.insert(0, str(project_root / 'code'))
+    import azuriraj_ucesnike
+    import tournament_model
+
+    folder = Path(root) / "Turnir 9999"
+    folder.mkdir()
+    write_participants(folder, names)
+    tournament_file = folder / "Turnir 9999.xlsm"
+    identity = player_identity.load_aliases(known_names=ratings)
+
+    def import_participants():
+        paid = tournament_model.read_paid_participants(folder / "Ucesnici 9999.xlsm")
+        azuriraj_ucesnike.sync_tournament(str(tournament_file), paid, ratings, identity=identity)
+
+    return best_time(import_participants, repeat, setup=lambda: shutil.copy2(template_file, tournament_file))
+
+
+def load_baseline(filename=baseline_file):
+    if not os.path.exists(filename):
+        return None
+    with open(filename, 'r', encoding='utf-8') as file:
+        return json.load(file)
+
+
+def save_baseline(results, filename=baseline_file):
+    baseline = load_baseline(filename) or {}
+    baseline.update(results)
+    with open(filename + '.tmp', 'w', encoding='utf-8') as file:
+        json.dump(baseline, file, indent=1, sort_keys=True)
+    os.replace(filename + '.tmp', filename)
+
+
+def compare(results, baseline, tolerance=0.25, noise=0.005):
+    """
+    (size, stage, seconds, baseline seconds) of every stage slower than the baseline by
+    more than the tolerance, ignoring differences below the noise in seconds.
+    """
+    regressions = []
+    for size, timings in results.items():
+        for stage, seconds in timings.items():
+            before = (baseline or {}).get(size, {}).get(stage)
+            if before is not None and seconds > before * (1 + tolerance) and seconds - before > noise:
+                regressions.append((size, stage, seconds, before))
+    return regressions
+
+
+def print_results(results, baseline):
+    print(f"{'size':<8} {'stage':<15} {'ms':>10} {'baseline ms':>12} {'change':>8}")
+    for size, timings in results.items():
+        for stage, seconds in timings.items():
+            before = (baseline or {}).get(size, {}).get(stage)
+            line = f"{size:<8} {stage:<15} {seconds * 1000:>10.1f}"
+            if before:
+                line += f" {before * 1000:>12.1f} {100 * (seconds - before) / before:>+7.0f}%"
+            print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the rating run on synthetic archives')
+    parser.add_argument('--sizes', nargs='+', choices=sorted(sizes), default=['small', 'medium'])
+    parser.add_argument('--custom', type=int, nargs=3, metavar=('TOURNAMENTS', 'PLAYERS', 'ROUNDS'),
+                        help='also run an archive of this size')
+    parser.add_argument('--stages', nargs='+', choices=stages, default=stages)
+    parser.add_argument('--repeat', type=int, default=3, help='runs of every stage, the best one counts')
+    parser.add_argument('--charts', type=int, default=10, help='charts drawn in the charts stage')
+    parser.add_argument('--baseline', default=baseline_file)
+    parser.add_argument('--save-baseline', action='store_true', help='store these times as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='flag stages slower than the baseline by more than this fraction')
+    args = parser.parse_args()
+
+    runs = {size: sizes[size] for size in args.sizes}
+    if args.custom:
+        runs['x'.join(map(str, args.custom))] = tuple(args.custom)
+
+    results = {}
+    for size, (tournaments, players, rounds) in runs.items():
+        print(f"Running {size}: {tournaments} tournaments, {players} players, {rounds} rounds")
+        results[size] = run_size(tournaments, players, rounds, args.repeat, args.charts, args.stages)
+
+    baseline = load_baseline(args.baseline)
+    print()
+    print_results(results, baseline)
+
+    if args.save_baseline:
+        save_baseline(results, args.baseline)
+        print(f"\nSaved the baseline to {args.baseline}")
+        return 0
+
+    if baseline is None:
+        print(f"\nNo baseline in {args.baseline}; run with --save-baseline to store one")
+        return 0
+    regressions = compare(results, baseline, args.tolerance)
+    for size, stage, seconds, before in regressions:
+        print(f"REGRESSION: {stage} on {size} takes {seconds * 1000:.1f} ms, was {before * 1000:.1f} ms")
+    if not regressions:
+        print("\nNo regressions")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,154 @@
+"""
+Rating history charts, drawn in a process pool and only when a history changed.
+
+The hash of everything that goes into a chart is kept in charts.json next to the
+images, so a chart whose image on disk was drawn from the same history is skipped.
+matplotlib is imported only when a chart is drawn, so runs without new charts do
+not pay for loading it.
+"""
+
+import hashlib
+import json
+import os
+from multiprocessing import Pool
+
+# Image format and resolution of the charts
+presets = {
+    'print': ('jpg', 300),
+    'web': ('png', 100)
+}
+
+# Change when the look of the charts changes, so that all of them are redrawn
+CHART_VERSION = 1
+
+hash_index_name = 'charts.json'
+
+# Figure and axes reused for every chart a worker draws
+_figure = None
+_axes = None
+
+
+def chart_hash(player, history, preset):
+    image_format, dpi = presets[preset]
+    content = json.dumps([CHART_VERSION, player, image_format, dpi, [int(rating) for rating in history]],
+                         ensure_ascii=False)
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+
+def chart_filename(folder, player, preset):
+    image_format, _ = presets[preset]
+    return os.path.join(folder, f"{player}.{image_format}")
+
+
+def load_hash_index(folder):
+    filename = os.path.join(folder, hash_index_name)
+    if not os.path.exists(filename):
+        return {}
+    try:
+        with open(filename, 'r', encoding='utf-8') as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_hash_index(folder, hash_index):
+    filename = os.path.join(folder, hash_index_name)
+    with open(filename + '.tmp', 'w', encoding='utf-8') as file:
+        json.dump(hash_index, file, ensure_ascii=False, indent=1, sort_keys=True)
+    os.replace(filename + '.tmp', filename)
+
+
+def _init_worker():
+    global _figure, _axes
+    #pip install matplotlib
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    _figure = Figure(figsize=(10, 6))  # Width and height in inches
+    FigureCanvasAgg(_figure)
+    _axes = _figure.add_subplot()
+
+
+def _draw_chart(task):
+    player, history, filename, image_format, dpi = task
+    if _figure is None:
+        _init_worker()
+
+    _axes.clear()
+    _axes.plot(history, marker='o')  # 'o' adds circle markers to each point
+    _axes.set_title(f'{player}')
+    _axes.set_ylabel('Rating')
+    _figure.savefig(filename, format=image_format, dpi=dpi)
+    return filename
+
+
+def read_histories(folder):
+    """
+    Rating histories of the players from the history CSV files, for redrawing the charts.
+    """
+    histories = {}
+    for filename in sorted(os.listdir(folder)):
+        player, extension = os.path.splitext(filename)
+        if extension != '.csv':
+            continue
+        with open(os.path.join(folder, filename), 'r', encoding='utf-8-sig') as file:
+            histories[player] = [int(line) for line in file.read().split()]
+    return histories
+
+
+def render_history_charts(histories, folder, preset='print', workers=None):
+    """
+    Draw the chart of every player in histories ({player: ratings}) whose image is out of date.
+
+    Returns the number of charts drawn.
+    """
+    image_format, dpi = presets[preset]
+    hash_index = load_hash_index(folder)
+
+    tasks = []
+    new_hashes = {}
+    for player, history in histories.items():
+        filename = chart_filename(folder, player, preset)
+        key = os.path.basename(filename)
+        content_hash = chart_hash(player, history, preset)
+        if hash_index.get(key) == content_hash and os.path.exists(filename):
+            continue
+        tasks.append((player, list(history), filename, image_format, dpi))
+        new_hashes[key] = content_hash
+
+    if not tasks:
+        return 0
+
+    if workers == 1 or len(tasks) == 1:
+        for task in tasks:
+            _draw_chart(task)
+    else:
+        with Pool(processes=workers, initializer=_init_worker) as pool:
+            for i, _ in enumerate(pool.imap_unordered(_draw_chart, tasks), start=1):
+                print(f"Drawing chart {i} of {len(tasks)}", end="\r")
+
+    hash_index.update(new_hashes)
+    save_hash_index(folder, hash_index)
+    return len(tasks)
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Draw the rating history charts from the history CSV files')
+    parser.add_argument('--folder', default='history', help='folder of the history files and charts')
+    parser.add_argument('--charts', choices=sorted(presets), default='print',
+                        help='print: JPEG at 300 dpi, web: PNG at 100 dpi')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='processes used to draw charts (default: one per CPU)')
+    parser.add_argument('--force', action='store_true', help='draw every chart, even if it is up to date')
+    args = parser.parse_args()
+
+    if args.force:
+        save_hash_index(args.folder, {})
+    drawn = render_history_charts(read_histories(args.folder), args.folder, args.charts, args.workers)
+    print(f"Drew {drawn} history charts")
+
+
+if __name__ == "__main__":
+    main()
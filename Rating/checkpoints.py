@@ -0,0 +1,321 @@
+"""
+Rating of every player at every round boundary, for point-in-time questions.
+
+The ratings are kept as one row per checkpoint and one column per player in
+checkpoints.npy: row 0 is the start, row i the ratings after the i-th round of the
+archive. Next to it checkpoints.json lists the players, the (tournament, round) of
+every row and the result files it was built from. Looking up a rating is one
+dictionary lookup and one array index, and the file is memory mapped, so a query
+does not replay anything. The checkpoints are rebuilt when a result file changes.
+
+Tournaments are given by their number (Rezultati/N.csv) or by the workbook folder
+name, e.g. "Turnir 2019 - 12", and a point in time as "tournament" (before it
+started), "tournament:round" (before that round) or "end".
+"""
+
+import argparse
+import json
+import os
+import sys
+
+#pip install numpy
+import numpy as np
+
+import game_store
+import player_identity
+from Rating import initial_rating, k_factor, results_folder
+from vectorized_elo import EloReplay, PlayerIndex, conflict_free_chunks, round_boundaries
+
+ratings_file = 'checkpoints.npy'
+index_file = 'checkpoints.json'
+
+# Change when the layout of the checkpoint files changes
+CHECKPOINTS_VERSION = 1
+
+
+def result_files(folder):
+    """
+    Size and modification time of every result file, to notice when the checkpoints are stale.
+    """
+    files = {}
+    file_number = 1
+    while True:
+        filename = os.path.join(folder, f"{file_number}.csv")
+        if not os.path.exists(filename):
+            return files
+        stat = os.stat(filename)
+        files[str(file_number)] = [stat.st_size, stat.st_mtime_ns]
+        file_number += 1
+
+
+class RatingCheckpoints:
+    """
+    Ratings after every round, with lookups by player and (tournament, round).
+    """
+
+    def __init__(self, players, rounds, ratings, first_rows, sources=None, aliases=None):
+        self.players = list(players)
+        self.player_ids = {player: player_id for player_id, player in enumerate(self.players)}
+        self.rounds = [tuple(key) for key in rounds]
+        self.row_of_round = {key: position for position, key in enumerate(self.rounds)}
+        self.ratings = ratings
+        # Row after the first game of every player; before it the player was not rated yet
+        self.first_rows = first_rows
+        self.sources = sources or {}
+        # Signature of the aliases the players were matched with
+        self.aliases = aliases
+
+        self.tournament_rows = {}
+        for position, (tournament, _) in enumerate(self.rounds):
+            first, _ = self.tournament_rows.get(tournament, (position, position))
+            self.tournament_rows[tournament] = (first, position + 1)
+
+    def row(self, tournament=None, round_number=None):
+        """
+        Row of the ratings before the given round, or before the tournament without a round.
+
+        Without a tournament, or for a tournament after the last one, it is the current ratings.
+        """
+        last_row = len(self.rounds)
+        if tournament is None:
+            return last_row
+        position = self.row_of_round.get((tournament, round_number))
+        if position is not None:
+            return position
+
+        rows = self.tournament_rows.get(tournament)
+        if rows is None:
+            # Tournament without results: the ratings after the closest earlier tournament
+            earlier = [end for number, (_, end) in self.tournament_rows.items() if number < tournament]
+            return max(earlier, default=0)
+        first, end = rows
+        if round_number is None or round_number <= self.rounds[first][1]:
+            return first
+        # A round after the last round with results
+        return end
+
+    def rating(self, player, row):
+        """
+        Rating of the player at a row, or None if the player had not played before it.
+        """
+        player_id = self.player_ids.get(player)
+        if player_id is None or row < self.first_rows[player_id]:
+            return None
+        return int(self.ratings[row, player_id])
+
+    def ratings_at(self, row):
+        """
+        Ratings of all players who had played before the row, e.g. to seed a pairing.
+        """
+        ratings = self.ratings[row]
+        return {player: int(ratings[player_id]) for player_id, player in enumerate(self.players)
+                if self.first_rows[player_id] <= row}
+
+    def diff(self, from_row, to_row):
+        """
+        Players whose rating changed between two rows, as player -> (old, new).
+        """
+        old_ratings = self.ratings[from_row]
+        new_ratings = self.ratings[to_row]
+        changed = np.flatnonzero(old_ratings != new_ratings)
+        return {self.players[player_id]: (self.rating(self.players[player_id], from_row),
+                                          int(new_ratings[player_id]))
+                for player_id in changed.tolist()}
+
+    def label(self, row):
+        """
+        Readable name of a row.
+        """
+        if row == 0:
+            return 'start'
+        if row == len(self.rounds):
+            return 'end'
+        tournament, round_number = self.rounds[row]
+        return f"before round {round_number} of tournament {tournament}"
+
+
+def build(folder=results_folder, use_store=False, identity=None):
+    """
+    Replay all games round by round and keep the ratings after every round.
+    """
+    if use_store:
+        store = game_store.load_current(folder)
+    else:
+        store = game_store.GameStore.from_csv(folder)
+
+    # Spellings of the same player share one column
+    identity = identity or player_identity.load_aliases()
+    aliases = identity.signature()
+    player_index = PlayerIndex()
+    player_ids = np.array([player_index.add(identity.register(name)) for name in store.names], dtype=np.int64)
+    white_ids = player_ids[store.games['white']]
+    black_ids = player_ids[store.games['black']]
+    results = store.results()
+
+    boundaries = round_boundaries(store.round_ids())
+    replay = EloReplay(k_factor, initial_rating, record_history=False)
+    replay.ensure_players(len(player_index))
+    ratings = np.empty((len(boundaries) + 1, len(player_index)), dtype=np.int32)
+    ratings[0] = replay.ratings
+    first_rows = np.full(len(player_index), len(boundaries) + 1, dtype=np.int64)
+
+    rounds = []
+    for row, (start, end) in enumerate(boundaries, start=1):
+        for chunk_start, chunk_end in conflict_free_chunks(white_ids, black_ids, start, end):
+            replay.play_batch(white_ids[chunk_start:chunk_end], black_ids[chunk_start:chunk_end],
+                              results[chunk_start:chunk_end])
+        ratings[row] = replay.ratings
+        players = np.concatenate((white_ids[start:end], black_ids[start:end]))
+        first_rows[players] = np.minimum(first_rows[players], row)
+        rounds.append((int(store.games['tournament'][start]), int(store.games['round'][start])))
+
+    return RatingCheckpoints(player_index.names, rounds, ratings, first_rows, result_files(folder), aliases)
+
+
+def save(checkpoints, folder='.'):
+    """
+    Write the checkpoint files, replacing the old ones only once the new ones are complete.
+    """
+    ratings_path = os.path.join(folder, ratings_file)
+    index_path = os.path.join(folder, index_file)
+
+    with open(ratings_path + '.tmp', 'wb') as file:
+        np.save(file, np.asarray(checkpoints.ratings, dtype=np.int32))
+    with open(index_path + '.tmp', 'w', encoding='utf-8') as file:
+        json.dump({
+            'version': CHECKPOINTS_VERSION,
+            'k_factor': k_factor,
+            'initial_rating': initial_rating,
+            'sources': checkpoints.sources,
+            'aliases': checkpoints.aliases,
+            'players': checkpoints.players,
+            'first_rows': checkpoints.first_rows.tolist(),
+            'rounds': checkpoints.rounds
+        }, file, ensure_ascii=False)
+
+    os.replace(ratings_path + '.tmp', ratings_path)
+    os.replace(index_path + '.tmp', index_path)
+
+
+def load(folder='.', results=results_folder, use_store=False):
+    """
+    Load the checkpoints, rebuilding them first if the results, the aliases or the rating
+    settings changed.
+    """
+    index_path = os.path.join(folder, index_file)
+    ratings_path = os.path.join(folder, ratings_file)
+    identity = player_identity.load_aliases()
+
+    index = None
+    if os.path.exists(index_path) and os.path.exists(ratings_path):
+        try:
+            with open(index_path, 'r', encoding='utf-8') as file:
+                index = json.load(file)
+        except (OSError, ValueError) as e:
+            print(f"Warning: Could not read {index_path}, rebuilding the checkpoints: {e}")
+
+    if (index is None or index.get('version') != CHECKPOINTS_VERSION or
+            index['k_factor'] != k_factor or index['initial_rating'] != initial_rating or
+            index['sources'] != result_files(results) or index.get('aliases') != identity.signature()):
+        checkpoints = build(results, use_store, identity)
+        save(checkpoints, folder)
+        return checkpoints
+
+    return RatingCheckpoints(index['players'], index['rounds'], np.load(ratings_path, mmap_mode='r'),
+                             np.array(index['first_rows'], dtype=np.int64), index['sources'], index['aliases'])
+
+
+def tournament_number(text):
+    """
+    Number of a tournament given as a number or as the name of its workbook folder.
+    """
+    if text.isdigit():
+        return int(text)
+
+    # The workbook folders and the Rezultati/N.csv they are exported to
+    import excel_to_csv
+
+    key = player_identity.fold(text)
+    for file_number, folder in excel_to_csv.workbooks:
+        if player_identity.fold(folder) == key:
+            return int(file_number)
+    raise ValueError(f"Unknown tournament: {text} (give its number or the name of its workbook folder)")
+
+
+def parse_point(checkpoints, text):
+    """
+    Row for "end", "tournament" or "tournament:round".
+    """
+    if text == 'end':
+        return checkpoints.row()
+    tournament, _, round_number = text.partition(':')
+    return checkpoints.row(tournament_number(tournament.strip()),
+                           int(round_number) if round_number else None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Ratings at any round of the archive')
+    parser.add_argument('--store', action='store_true', help='build from the binary game store')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    subparsers.add_parser('build', help='rebuild the checkpoint files')
+
+    rating_parser = subparsers.add_parser('rating', help='rating of players at a point in time')
+    rating_parser.add_argument('at', help='"end", "tournament" or "tournament:round", e.g. "Turnir 2019 - 12:3"')
+    rating_parser.add_argument('players', nargs='*', help='default: everyone who had played')
+
+    diff_parser = subparsers.add_parser('diff', help='rating changes between two points in time')
+    diff_parser.add_argument('start', help='"end", "tournament" or "tournament:round"')
+    diff_parser.add_argument('end', help='"end", "tournament" or "tournament:round"')
+    diff_parser.add_argument('players', nargs='*', help='default: everyone whose rating changed')
+
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        checkpoints = build(results_folder, args.store)
+        save(checkpoints)
+        print(f"Saved {len(checkpoints.rounds)} rounds of {len(checkpoints.players)} players")
+        return 0
+
+    checkpoints = load(use_store=args.store)
+    identity = player_identity.load_aliases(known_names=checkpoints.players)
+
+    try:
+        if args.command == 'rating':
+            row = parse_point(checkpoints, args.at)
+        else:
+            from_row = parse_point(checkpoints, args.start)
+            to_row = parse_point(checkpoints, args.end)
+    except ValueError as e:
+        print(e)
+        return 1
+
+    if args.command == 'rating':
+        print(f"Ratings {checkpoints.label(row)}")
+        if args.players:
+            ratings = {}
+            for player in args.players:
+                player = identity.canonical(player)
+                ratings[player] = checkpoints.rating(player, row)
+        else:
+            ratings = checkpoints.ratings_at(row)
+        for player, rating in sorted(ratings.items(), key=lambda item: -(item[1] or 0)):
+            print(f"{player}: {rating if rating is not None else 'not rated yet'}")
+    else:
+        print(f"Rating changes from {checkpoints.label(from_row)} to {checkpoints.label(to_row)}")
+        changes = checkpoints.diff(from_row, to_row)
+        if args.players:
+            players = {identity.canonical(player) for player in args.players}
+            changes = {player: change for player, change in changes.items() if player in players}
+        # Biggest gains first, players new in the period last
+        for player, (old, new) in sorted(changes.items(),
+                                         key=lambda item: (item[1][0] is None, item[1][0] - item[1][1] if item[1][0] else 0)):
+            if old is None:
+                print(f"{player}: new, {new}")
+            else:
+                print(f"{player}: {old} -> {new} ({new - old:+d})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,289 @@
+"""
+Crosstables and standings of the tournaments, with Buchholz, Sonneborn-Berger and performance.
+
+Every tournament is accumulated game by game: each player keeps points, games,
+opponents and the running Buchholz and Sonneborn-Berger sums. When a player scores,
+the sums of the opponents met so far are raised by the same amount, so a round adds
+work only for the players it touches and the standings are ready after every round,
+without going over the earlier rounds again.
+
+Players are ranked by points, Buchholz (sum of the opponents' points),
+Sonneborn-Berger (sum of the points of the beaten opponents plus half of those drawn)
+and performance (average rating of the opponents + 400 * (wins - losses) / games).
+Ratings are taken as they were before the tournament. Games against the bye (Непар)
+give the recorded points, but the bye is not an opponent.
+
+The crosstable lists the players in the order of the standings; with the pairing by
+rating (Sabloni/uradi.txt) most games end up close to the diagonal.
+
+    python crosstable.py                    all tournaments to crosstables/N.csv and N.html
+    python crosstable.py 11 --print         standings of Rezultati/11.csv
+"""
+
+import argparse
+import csv
+import html
+import os
+
+import instrumentation
+import player_identity
+import rating_state
+from pairing import BYE
+from Rating import initial_rating, k_factor, results_folder, update_ratings
+
+crosstable_folder = 'crosstables'
+
+_result_texts = {1.0: '1', 0.5: '½', 0.0: '0'}
+
+
+class Crosstable:
+    """
+    Scores and tiebreaks of one tournament, updated with every game that is added.
+    """
+
+    def __init__(self, ratings=None, default_rating=initial_rating):
+        # Ratings as they were before the tournament, read when a player first appears
+        self.ratings = ratings if ratings is not None else {}
+        self.default_rating = default_rating
+        self.ids = {}
+        self.names = []
+        self.start_ratings = []
+        self.points = []
+        self.buchholz = []
+        self.sonneborn_berger = []
+        # Games against opponents: [(opponent id, result)], the bye is not included
+        self.opponents = []
+        self.wins = []
+        self.losses = []
+        self.opponent_ratings = []
+        self.rounds = []
+
+    def player_id(self, name):
+        player_id = self.ids.get(name)
+        if player_id is None:
+            player_id = self.ids[name] = len(self.names)
+            self.names.append(name)
+            self.start_ratings.append(self.ratings.get(name, self.default_rating))
+            self.points.append(0.0)
+            self.buchholz.append(0.0)
+            self.sonneborn_berger.append(0.0)
+            self.opponents.append([])
+            self.wins.append(0)
+            self.losses.append(0)
+            self.opponent_ratings.append(0)
+        return player_id
+
+    def _score(self, player_id, points):
+        """
+        Add points to a player and to the tiebreaks of everyone the player has met.
+        """
+        if not points:
+            return
+        self.points[player_id] += points
+        for opponent_id, result in self.opponents[player_id]:
+            self.buchholz[opponent_id] += points
+            # The opponent's Sonneborn-Berger counts this player's points by the opponent's result
+            self.sonneborn_berger[opponent_id] += points * (1 - result)
+
+    def add_game(self, white, black, result):
+        if white == BYE and black == BYE:
+            return
+        if white == BYE or black == BYE:
+            player, points = (black, 1 - result) if white == BYE else (white, result)
+            self._score(self.player_id(player), points)
+            return
+
+        white_id, black_id = self.player_id(white), self.player_id(black)
+        # The new opponents count with the points they have so far
+        self.buchholz[white_id] += self.points[black_id]
+        self.buchholz[black_id] += self.points[white_id]
+        self.sonneborn_berger[white_id] += result * self.points[black_id]
+        self.sonneborn_berger[black_id] += (1 - result) * self.points[white_id]
+        self.opponents[white_id].append((black_id, result))
+        self.opponents[black_id].append((white_id, 1 - result))
+        self.opponent_ratings[white_id] += self.start_ratings[black_id]
+        self.opponent_ratings[black_id] += self.start_ratings[white_id]
+        if result != 0.5:
+            winner, loser = (white_id, black_id) if result > 0.5 else (black_id, white_id)
+            self.wins[winner] += 1
+            self.losses[loser] += 1
+
+        self._score(white_id, result)
+        self._score(black_id, 1 - result)
+
+    def add_round(self, round_name, games):
+        """
+        Add the games (white, black, result) of a round.
+        """
+        self.rounds.append(round_name)
+        for white, black, result in games:
+            self.add_game(white, black, result)
+
+    def performance(self, player_id):
+        games = len(self.opponents[player_id])
+        if not games:
+            return None
+        return round((self.opponent_ratings[player_id] + 400 * (self.wins[player_id] - self.losses[player_id])) / games)
+
+    def order(self):
+        """
+        Player ids from first to last place.
+        """
+        return sorted(range(len(self.names)), key=lambda player_id: (
+            -self.points[player_id], -self.buchholz[player_id], -self.sonneborn_berger[player_id],
+            -(self.performance(player_id) or 0), self.names[player_id]))
+
+    def standings(self):
+        return [{
+            'place': place,
+            'name': self.names[player_id],
+            'rating': self.start_ratings[player_id],
+            'points': self.points[player_id],
+            'games': len(self.opponents[player_id]),
+            'buchholz': self.buchholz[player_id],
+            'sonneborn_berger': self.sonneborn_berger[player_id],
+            'performance': self.performance(player_id)
+        } for place, player_id in enumerate(self.order(), start=1)]
+
+    def table(self):
+        """
+        Header and rows of the crosstable in the order of the standings.
+
+        The cell of two players holds the results of their games, e.g. '1' or '½ 0'.
+        """
+        order = self.order()
+        places = {player_id: place for place, player_id in enumerate(order)}
+        header = ['#', 'Име', 'Рејтинг'] + [str(place) for place in range(1, len(order) + 1)] + [
+            'Бодови', 'Бухолц', 'Сонеборн-Бергер', 'Перформанс']
+
+        rows = []
+        for place, player_id in enumerate(order):
+            cells = [[] for _ in order]
+            for opponent_id, result in self.opponents[player_id]:
+                cells[places[opponent_id]].append(_result_texts.get(result, str(result)))
+            cells[place] = ['X']
+            performance = self.performance(player_id)
+            rows.append([place + 1, self.names[player_id], self.start_ratings[player_id]] +
+                        [' '.join(cell) for cell in cells] +
+                        [_points_text(self.points[player_id]), _points_text(self.buchholz[player_id]),
+                         _points_text(self.sonneborn_berger[player_id]), '' if performance is None else performance])
+        return header, rows
+
+    def write_csv(self, filename):
+        header, rows = self.table()
+        with open(filename, 'w', newline='', encoding='utf-8-sig') as file:
+            writer = csv.writer(file)
+            writer.writerow(header)
+            writer.writerows(rows)
+
+    def write_html(self, filename, title=''):
+        header, rows = self.table()
+        lines = ['<!DOCTYPE html>', '<html>', '<head>', '<meta charset="utf-8">',
+                 f'<title>{html.escape(title)}</title>', '<style>',
+                 'table { border-collapse: collapse; font-family: sans-serif; }',
+                 'td, th { border: 1px solid #999; padding: 0.1em 0.4em; text-align: center; }',
+                 'td.name { text-align: left; white-space: nowrap; } td.self { background: #ccc; }',
+                 '</style>', '</head>', '<body>']
+        if title:
+            lines.append(f'<h1>{html.escape(title)}</h1>')
+        lines.append('<table>')
+        lines.append('<tr>' + ''.join(f'<th>{html.escape(str(cell))}</th>' for cell in header) + '</tr>')
+        for place, row in enumerate(rows):
+            cells = []
+            for column, cell in enumerate(row):
+                css = ' class="name"' if column == 1 else ' class="self"' if column == place + 3 else ''
+                cells.append(f'<td{css}>{html.escape(str(cell))}</td>')
+            lines.append('<tr>' + ''.join(cells) + '</tr>')
+        lines += ['</table>', '</body>', '</html>', '']
+        with open(filename, 'w', encoding='utf-8') as file:
+            file.write('\n'.join(lines))
+
+
+def _points_text(points):
+    return f"{points:g}"
+
+
+def read_games(use_store=False, folder=results_folder):
+    """
+    All games as (tournament, round, white, black, result), from the CSV files or the game store.
+    """
+    if use_store:
+        import game_store
+        return game_store.load_current(folder).match_results()
+    games, _ = rating_state.read_new_results(rating_state.new_state(k_factor, initial_rating), folder)
+    return games
+
+
+def build_crosstables(games, identity=None, tournaments=None):
+    """
+    {tournament: Crosstable} of the games, with the ratings each tournament started from.
+
+    The ratings are replayed through all tournaments, also those not asked for, so
+    that every crosstable gets the ratings as they were.
+    """
+    identity = identity or player_identity.load_aliases()
+    ratings = {}
+    histories = {}
+    crosstables = {}
+
+    current = None
+    round_games = []
+    for tournament, round_name, white, black, result in games:
+        white, black = identity.register(white), identity.register(black)
+        if (tournament, round_name) != current:
+            _add_round(crosstables, current, round_games, ratings, histories)
+            current = (tournament, round_name)
+            round_games = []
+            if tournament not in crosstables and (tournaments is None or tournament in tournaments):
+                crosstables[tournament] = Crosstable(ratings)
+        round_games.append((white, black, result))
+    _add_round(crosstables, current, round_games, ratings, histories)
+    return crosstables
+
+
+def _add_round(crosstables, key, games, ratings, histories):
+    if key is None:
+        return
+    crosstable = crosstables.get(key[0])
+    if crosstable is not None:
+        # Start ratings are read while the games are added, before the round is rated
+        crosstable.add_round(key[1], games)
+    update_ratings(games, histories, ratings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Crosstables and standings with tiebreaks')
+    parser.add_argument('tournaments', nargs='*', type=int, help='numbers of Rezultati/N.csv (default: all)')
+    parser.add_argument('--folder', default=crosstable_folder, help='where N.csv and N.html are written')
+    parser.add_argument('--format', nargs='+', choices=['csv', 'html'], default=['csv', 'html'])
+    parser.add_argument('--print', action='store_true', help='print the standings instead of writing files')
+    parser.add_argument('--store', action='store_true', help='read the games from the binary game store')
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+
+    with instrumentation.profiling(args):
+        with instrumentation.span('results.read'):
+            games = read_games(args.store)
+        with instrumentation.span('crosstables.build'):
+            crosstables = build_crosstables(games, tournaments=set(args.tournaments) or None)
+
+        if args.print:
+            for tournament, crosstable in crosstables.items():
+                print(f"\nTournament {tournament}")
+                for row in crosstable.standings():
+                    print(f"{row['place']:>3}. {row['name']:<30} {row['points']:>4g}  Buchholz {row['buchholz']:g}  "
+                          f"SB {row['sonneborn_berger']:g}  performance {row['performance']}")
+            return
+
+        os.makedirs(args.folder, exist_ok=True)
+        with instrumentation.span('crosstables.write'):
+            for tournament, crosstable in crosstables.items():
+                if 'csv' in args.format:
+                    crosstable.write_csv(os.path.join(args.folder, f"{tournament}.csv"))
+                if 'html' in args.format:
+                    crosstable.write_html(os.path.join(args.folder, f"{tournament}.html"), f"Турнир {tournament}")
+        print(f"Wrote {len(crosstables)} crosstables to {args.folder}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,94 +1,267 @@
-# pip install pandas openpyxl
-import pandas as pd
+# pip install openpyxl
+import csv
+import hashlib
+import io
+import itertools
+import json
 import os
+import posixpath
+import zipfile
+import xml.etree.ElementTree as ET
 
-def replace_strings(df):
-    
-    replacement_map = {
-        'Vlada Vulovic': 'Влада Вуловић',
-        'Petar Spasic': 'Петар Спасић',
-        'Branislav Koledin': 'Бранислав Коледин',
-        'Ognjen Sobajic': 'Огњен Шобајић',
-        'Zeljko Nikolicic': 'Жељко Николичић',
-        'Dejan Subotic': 'Дејан Суботић',
-        'Jovica Spasic': 'Јовица Спасић',
-        'Milan Stefanovic': 'Милан Стефановић',
-        'Vojislav Kokeza': 'Војислав Кокеза',
-        'Predrag Roso': 'Предраг Росо',
-        'Mirko Spasojevic': 'Мирко Спасојевић',
-        'Aca Spasojevic': 'Аца Спасојевић',
-        'Dalibor Marceta': 'Далибор Марчета',
-        'Nikola Rudic': 'Никола Рудић',
-        'Aca': 'Аца Спасојевић',
-        'Mirko': 'Мирко Спасојевић',
-        'Воја Кокеза': 'Војислав Кокеза'
-    }
+import openpyxl
 
-    # Iterate over each item in the mapping
-    for old_value, new_value in replacement_map.items():
-        # Replace occurrences of old_value with new_value
-        df = df.replace(old_value, new_value)
-    return df
+import game_store
+import instrumentation
+import player_identity
 
+results_folder = os.path.join('..', 'Rezultati')
 
-def izvoz(output_file_id, input_file_name):
-    print(f'Processing {input_file_name}')
+# What was exported from each workbook, so that unchanged workbooks and sheets are skipped
+manifest_file = 'export_manifest.json'
 
-    # Set the output file path
-    output_file = f"..\\Rezultati\\{output_file_id}.csv"
+# Change when the rows kept in the manifest are read differently
+MANIFEST_VERSION = 2
 
-    # Check if the file already exists, and if so, delete it
-    if os.path.exists(output_file):
-        os.remove(output_file)
+MAIN_NAMESPACE = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+RELATIONSHIP_NAMESPACE = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+
+def load_player_identity():
+    """
+    Spellings of player names, together with the names already on the rating list.
+    """
+    known_names = []
+    if os.path.exists('all_ratings.csv'):
+        with open('all_ratings.csv', 'r', encoding='utf-8-sig', newline='') as file:
+            known_names = [row[0] for row in csv.reader(file) if row]
+    return player_identity.load_aliases(known_names=known_names)
+
+
+def replace_strings(rows, identity):
+    """
+    Replace other spellings of player names in (round, white, black, result) rows.
+    """
+    for round_name, white, black, result in rows:
+        if isinstance(white, str):
+            white = identity.register(white)
+        if isinstance(black, str):
+            black = identity.register(black)
+        yield round_name, white, black, result
+
+
+def load_manifest():
+    if not os.path.exists(manifest_file):
+        return {}
+    try:
+        with open(manifest_file, 'r', encoding='utf-8') as file:
+            manifest = json.load(file)
+    except (OSError, ValueError) as e:
+        print(f"Warning: Could not read {manifest_file}, exporting everything: {e}")
+        return {}
+    if manifest.get('version') != MANIFEST_VERSION:
+        return {}
+    return manifest.get('workbooks', {})
+
+
+def save_manifest(manifest):
+    with open(manifest_file + '.tmp', 'w', encoding='utf-8') as file:
+        json.dump({'version': MANIFEST_VERSION, 'workbooks': manifest}, file, ensure_ascii=False)
+    os.replace(manifest_file + '.tmp', manifest_file)
+
+
+def file_sha1(file_name):
+    sha1 = hashlib.sha1()
+    with open(file_name, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            sha1.update(block)
+    return sha1.hexdigest()
+
+
+def sheet_keys(input_file):
+    """
+    Content key of every sheet, in workbook order.
+
+    An .xlsm file is a zip archive which already keeps a checksum of every sheet, so
+    the keys are read without parsing any cells. Cell text can be kept in the shared
+    string table, so its checksum is part of every key.
+    """
+    with zipfile.ZipFile(input_file) as archive:
+        workbook = ET.fromstring(archive.read('xl/workbook.xml'))
+        relationships = ET.fromstring(archive.read('xl/_rels/workbook.xml.rels'))
+        checksums = {info.filename: info.CRC for info in archive.infolist()}
+
+    targets = {relationship.get('Id'): relationship.get('Target') for relationship in relationships}
+    shared_strings = checksums.get('xl/sharedStrings.xml', 0)
+
+    keys = {}
+    for sheet in workbook.iter(f'{{{MAIN_NAMESPACE}}}sheet'):
+        target = targets[sheet.get(f'{{{RELATIONSHIP_NAMESPACE}}}id')]
+        if target.startswith('/'):
+            part = target[1:]
+        else:
+            part = posixpath.normpath(posixpath.join('xl', target))
+        keys[sheet.get('name')] = f"{checksums.get(part, 0):08x}-{shared_strings:08x}"
+    return keys
+
+
+def iter_sheet_games(worksheet):
+    """
+    Stream the games (white, black, result) from columns B-D of one round sheet.
 
-    # Create a new DataFrame for the output
-    output_df = pd.DataFrame()
+    The first row holds the headers. Rows without a white player are skipped.
+    """
+    rows = worksheet.iter_rows(min_row=2, max_col=4, values_only=True)
 
-    # Create object for Excel file
-    xls = pd.ExcelFile(f"..\\{input_file_name}\\{input_file_name}.xlsm")
+    # Check if the sheet is not empty and the first cell is not empty
+    first_row = next(rows, None)
+    if first_row is None or first_row[0] == '':
+        return
 
-    # Loop through each sheet
-    for sheet_name in xls.sheet_names:
-        if sheet_name.isnumeric():
-            df = pd.read_excel(xls, sheet_name=sheet_name)
+    for row in itertools.chain([first_row], rows):
+        row = tuple(row) + (None,) * (4 - len(row))
+        if row[1] is not None:
+            yield row[1], row[2], row[3]
 
-            # Check if the DataFrame is not empty and the first cell is not empty
-            if not df.empty and df.iloc[0, 0] != '':
-                last_row = df[df.columns[1]].last_valid_index()
 
-                # Select only columns B, C, and D
-                filtered_df = df.iloc[0:last_row + 1, 1:4].dropna(subset=[df.columns[1]])
+def format_results(rows):
+    """
+    Write results as 0/1, or as 0.0/0.5/1.0 when any result is fractional or missing.
+    """
+    results = [row[-1] for row in rows]
+    if any(isinstance(result, str) for result in results):
+        return rows
+    if all(isinstance(result, int) for result in results):
+        return rows
+    return [row[:-1] + ('' if result is None else float(result),) for row, result in zip(rows, results)]
 
-                # Insert the sheet name as the first column
-                filtered_df.insert(0, 'SheetName', sheet_name)
 
-                # Append the filtered data to the output DataFrame
-                output_df = pd.concat([output_df, filtered_df], ignore_index=True)
+def izvoz(output_file_id, input_file_name, manifest, identity):
+    """
+    Export the round sheets of one tournament workbook to Rezultati/<output_file_id>.csv.
 
-    # Apply replacements
-    output_df = replace_strings(output_df)
+    Returns True if the CSV file changed.
+    """
+    input_file = os.path.join('..', input_file_name, f"{input_file_name}.xlsm")
+    output_file = os.path.join(results_folder, f"{output_file_id}.csv")
 
-    # Save the DataFrame to a CSV file
-    output_df.to_csv(output_file, index=False, header=False)
+    stat = os.stat(input_file)
+    entry = manifest.get(input_file)
+    if entry is not None and (entry['output'] != output_file_id or not os.path.exists(output_file)):
+        entry = None
+
+    # With other aliases the names in the CSV file can change even for the same workbook
+    same_aliases = entry is not None and entry.get('aliases') == identity.signature()
+
+    if same_aliases and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+        return False
+
+    with instrumentation.span('workbook.checksum'):
+        digest = file_sha1(input_file)
+    if same_aliases and entry['sha1'] == digest:
+        # Saved again without changes
+        entry['size'], entry['mtime_ns'] = stat.st_size, stat.st_mtime_ns
+        return False
+
+    print(f'Processing {input_file_name}')
+
+    cached_sheets = entry['sheets'] if entry is not None else {}
+    sheets = {}
+    workbook = None
+    try:
+        with instrumentation.span('workbook.keys'):
+            keys = sheet_keys(input_file)
+        for sheet_name, key in keys.items():
+            if not sheet_name.isnumeric():
+                continue
+
+            cached = cached_sheets.get(sheet_name)
+            if cached is not None and cached['key'] == key:
+                sheets[sheet_name] = cached
+                instrumentation.count('sheets unchanged')
+                continue
+
+            if workbook is None:
+                # Opened once, cells are streamed instead of loaded into memory
+                with instrumentation.span('workbook.open'):
+                    workbook = openpyxl.load_workbook(input_file, read_only=True, data_only=True, keep_links=False)
+            print(f'  Reading round {sheet_name}')
+            with instrumentation.span('sheet.parse'):
+                sheets[sheet_name] = {'key': key, 'rows': list(iter_sheet_games(workbook[sheet_name]))}
+            instrumentation.count('sheets parsed')
+    finally:
+        if workbook is not None:
+            workbook.close()
+
+    manifest[input_file] = {
+        'output': output_file_id,
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'sha1': digest,
+        'aliases': identity.signature(),
+        'sheets': sheets
+    }
+
+    # Insert the sheet name as the first column and apply replacements
+    rows = ((sheet_name, *row) for sheet_name, sheet in sheets.items() for row in sheet['rows'])
+    rows = format_results(list(replace_strings(rows, identity)))
+
+    output = io.StringIO()
+    csv.writer(output, lineterminator='\n').writerows(rows)
+    csv_text = output.getvalue()
+
+    if os.path.exists(output_file):
+        with open(output_file, 'r', encoding='utf-8', newline='') as file:
+            if file.read() == csv_text:
+                print(f"{output_file} is up to date\n")
+                return False
+
+    with instrumentation.span('csv.write'):
+        with open(output_file, 'w', encoding='utf-8', newline='') as file:
+            file.write(csv_text)
+    instrumentation.count('workbooks exported')
 
     print(f"Data exported successfully to {output_file}\n")
+    return True
+
+# Rezultati file number and folder of every tournament workbook
+workbooks = [
+    ("1", r'Turnir 2011'),
+    ("2", r'Turnir 2013'),
+    ("3", r'Turnir 2015 - 02'),
+    ("4", r'Turnir 2015 - 12'),
+    ("5", r'Turnir 2016'),
+    ("6", r'Turnir 2017'),
+    ("7", r'Turnir 2019 - 02'),
+    ("8", r'Turnir 2019 - 12'),
+    ("9", r'Turnir 2022'),
+    ("10", r'Turnir 2023'),
+    ("11", r'Turnir 2024')
+]
 
 def excel_to_csv():
     
-    pairs = [
-        ("1", r'Turnir 2011'),
-        ("2", r'Turnir 2013'),
-        ("3", r'Turnir 2015 - 02'),
-        ("4", r'Turnir 2015 - 12'),
-        ("5", r'Turnir 2016'),
-        ("6", r'Turnir 2017'),
-        ("7", r'Turnir 2019 - 02'),
-        ("8", r'Turnir 2019 - 12'),
-        ("9", r'Turnir 2022'),
-        ("10", r'Turnir 2023'),
-        ("11", r'Turnir 2024')
-    ]
-    for id, fileName in pairs:
-        izvoz(id, fileName)
-
-excel_to_csv()
+    manifest = load_manifest()
+    identity = load_player_identity()
+    changed = False
+    try:
+        for id, fileName in workbooks:
+            changed = izvoz(id, fileName, manifest, identity) or changed
+    finally:
+        save_manifest(manifest)
+
+    # Keep the binary game store in step with the exported files
+    if changed or not game_store.GameStore.exists(results_folder):
+        with instrumentation.span('game_store.import'):
+            game_store.import_csv(results_folder)
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Export the results of the tournament workbooks to Rezultati/N.csv')
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+    with instrumentation.profiling(args):
+        excel_to_csv()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""
+Compact binary store of all games, as an alternative to parsing Rezultati/N.csv.
+
+The store is a name dictionary (players.txt, one name per line, the line number is
+the player id) and one fixed-width record per game in games.npy, which is memory
+mapped for reading. Results are kept in half points (0, 1, 2) so that they stay exact.
+"""
+
+import csv
+import os
+
+#pip install numpy
+import numpy as np
+
+game_dtype = np.dtype([
+    ('tournament', '<u2'),
+    ('round', '<u2'),
+    ('white', '<u4'),
+    ('black', '<u4'),
+    ('half_points', 'u1')
+])
+
+games_file_name = 'games.npy'
+players_file_name = 'players.txt'
+
+
+class GameStore:
+    """
+    Player names and the records of all games, in the order they were played.
+    """
+
+    def __init__(self, names, games):
+        self.names = list(names)
+        self.ids = {name: player_id for player_id, name in enumerate(self.names)}
+        self.games = games
+
+    def __len__(self):
+        return len(self.games)
+
+    @classmethod
+    def load(cls, folder, mmap=True):
+        with open(os.path.join(folder, players_file_name), 'r', encoding='utf-8') as file:
+            names = file.read().splitlines()
+        games = np.load(os.path.join(folder, games_file_name), mmap_mode='r' if mmap else None)
+        return cls(names, games)
+
+    @staticmethod
+    def exists(folder):
+        return (os.path.exists(os.path.join(folder, games_file_name)) and
+                os.path.exists(os.path.join(folder, players_file_name)))
+
+    def save(self, folder):
+        """
+        Write the store, replacing the old files only once the new ones are complete.
+        """
+        games_file = os.path.join(folder, games_file_name)
+        players_file = os.path.join(folder, players_file_name)
+
+        with open(games_file + '.tmp', 'wb') as file:
+            np.save(file, np.asarray(self.games, dtype=game_dtype))
+        with open(players_file + '.tmp', 'w', encoding='utf-8', newline='\n') as file:
+            for name in self.names:
+                file.write(name + '\n')
+
+        os.replace(games_file + '.tmp', games_file)
+        os.replace(players_file + '.tmp', players_file)
+
+    @classmethod
+    def from_csv(cls, results_folder):
+        """
+        Import Rezultati/1.csv, 2.csv, ... until the first missing file.
+        """
+        names = []
+        ids = {}
+        records = []
+
+        def player_id(name):
+            if name not in ids:
+                ids[name] = len(names)
+                names.append(name)
+            return ids[name]
+
+        file_number = 1
+        while True:
+            filename = os.path.join(results_folder, f"{file_number}.csv")
+            if not os.path.exists(filename):
+                break
+
+            with open(filename, 'r', encoding='utf-8') as file:
+                for row in csv.reader(file):
+                    white = player_id(row[1])
+                    black = player_id(row[2])
+                    records.append((file_number, int(row[0]), white, black, round(float(row[3]) * 2)))
+
+            file_number += 1
+
+        return cls(names, np.array(records, dtype=game_dtype))
+
+    def to_csv(self, results_folder):
+        """
+        Export every tournament to Rezultati/N.csv in the format excel_to_csv writes.
+        """
+        for tournament in self.tournaments():
+            games = self.tournament_games(tournament)
+            # Results are written as 0/1, or as 0.0/0.5/1.0 when there are draws
+            with_draws = bool((games['half_points'] == 1).any())
+
+            filename = os.path.join(results_folder, f"{tournament}.csv")
+            with open(filename, 'w', newline='', encoding='utf-8') as file:
+                writer = csv.writer(file, lineterminator='\n')
+                for game in games:
+                    points = game['half_points'] / 2
+                    writer.writerow([int(game['round']), self.names[game['white']], self.names[game['black']],
+                                     points if with_draws else int(points)])
+
+    def tournaments(self):
+        return np.unique(self.games['tournament']).tolist()
+
+    def tournament_games(self, tournament):
+        # Games are stored in tournament order, so every tournament is one slice
+        tournaments = self.games['tournament']
+        start = np.searchsorted(tournaments, tournament, side='left')
+        end = np.searchsorted(tournaments, tournament, side='right')
+        return self.games[start:end]
+
+    def round_ids(self):
+        """
+        One id per game that changes whenever the tournament or the round changes.
+        """
+        return self.games['tournament'].astype(np.int64) * 65536 + self.games['round']
+
+    def results(self):
+        return self.games['half_points'] / 2
+
+    def match_results(self):
+        """
+        Games as (tournament, round, white, black, result), like rating_state.read_new_results.
+        """
+        return [(int(game['tournament']), str(game['round']), self.names[game['white']],
+                 self.names[game['black']], game['half_points'] / 2) for game in self.games]
+
+
+def import_csv(results_folder, store_folder=None):
+    """
+    Rebuild the store in store_folder (by default the results folder) from the CSV files.
+    """
+    store = GameStore.from_csv(results_folder)
+    store.save(store_folder or results_folder)
+    print(f"Stored {len(store)} games of {len(store.names)} players")
+    return store
+
+
+def is_current(results_folder, store_folder=None):
+    """
+    Whether the store exists and no result file is newer than it.
+    """
+    store_folder = store_folder or results_folder
+    if not GameStore.exists(store_folder):
+        return False
+    stored = os.stat(os.path.join(store_folder, games_file_name)).st_mtime_ns
+    file_number = 1
+    while os.path.exists(os.path.join(results_folder, f"{file_number}.csv")):
+        if os.stat(os.path.join(results_folder, f"{file_number}.csv")).st_mtime_ns > stored:
+            return False
+        file_number += 1
+    return True
+
+
+def load_current(results_folder, store_folder=None, mmap=True):
+    """
+    Load the store, importing the CSV files first when it is missing or older than them.
+    """
+    store_folder = store_folder or results_folder
+    if not is_current(results_folder, store_folder):
+        print(f"Game store in {store_folder} is missing or older than the result files, importing them")
+        return import_csv(results_folder, store_folder)
+    store = GameStore.load(store_folder, mmap)
+    # A removed result file leaves its tournament in the store
+    if len(store) and not os.path.exists(os.path.join(results_folder, f"{int(store.games['tournament'][-1])}.csv")):
+        print(f"Game store in {store_folder} has tournaments without a result file, importing them again")
+        return import_csv(results_folder, store_folder)
+    return store
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Convert between Rezultati CSV files and the game store')
+    parser.add_argument('command', choices=['import', 'export'])
+    parser.add_argument('--results', default=os.path.join('..', 'Rezultati'), help='folder with N.csv files')
+    parser.add_argument('--store', default=None, help='store folder (default: the results folder)')
+    args = parser.parse_args()
+
+    if args.command == 'import':
+        import_csv(args.results, args.store)
+    elif not GameStore.exists(args.store or args.results):
+        parser.error(f"No game store in {args.store or args.results}; build it with: python game_store.py import")
+    else:
+        GameStore.load(args.store or args.results).to_csv(args.results)
@@ -0,0 +1,227 @@
+"""
+Head-to-head scores and results against opponents by rating, for every player.
+
+The index is filled while the games are replayed: every pair of players that met has
+one slot with the number of games and the half points of the player with the lower
+id, and every player has a histogram of the games and half points against opponents
+by their rating at the time of the game, in bins of 100 points. The counters are kept
+in flat arrays of the array module, so a question is a dict lookup and a few array
+reads, without reading the Rezultati files again.
+
+    python head_to_head.py "Владо Жарић" "Петар Спасић"      score of the first against the second
+    python head_to_head.py "Владо Жарић" --min 1600          score against opponents rated 1600 or more
+    python head_to_head.py "Владо Жарић" --opponents         everyone the player has met
+"""
+
+import argparse
+import sys
+from array import array
+
+import player_identity
+from pairing import BYE
+from Rating import initial_rating, update_ratings
+
+bin_width = 100
+# Opponents below the first bin or above the last one count in the first or last bin
+first_bin = 1000
+bin_count = 16
+
+
+def rating_bin(rating):
+    return min(max(int(rating - first_bin) // bin_width, 0), bin_count - 1)
+
+
+class HeadToHeadIndex:
+    """
+    Games and half points of every pair that met and of every player by opponent rating.
+    """
+
+    def __init__(self):
+        self.ids = {}
+        self.names = []
+        # (lower id << 32 | higher id) -> slot in the pair arrays
+        self.pair_slots = {}
+        self.pair_games = array('I')
+        self.pair_half_points = array('I')
+        # Opponent ids of every player, in the order they first met
+        self.opponent_ids = []
+        # bin_count entries per player
+        self.bin_games = array('I')
+        self.bin_half_points = array('I')
+
+    def player_id(self, name):
+        player_id = self.ids.get(name)
+        if player_id is None:
+            player_id = self.ids[name] = len(self.names)
+            self.names.append(name)
+            self.opponent_ids.append([])
+            self.bin_games.extend([0] * bin_count)
+            self.bin_half_points.extend([0] * bin_count)
+        return player_id
+
+    @staticmethod
+    def _pair_key(id1, id2):
+        return id1 << 32 | id2 if id1 < id2 else id2 << 32 | id1
+
+    def add_game(self, white, black, result, white_rating=initial_rating, black_rating=initial_rating):
+        """
+        Add a game with the ratings the players had before it.
+        """
+        white_id, black_id = self.player_id(white), self.player_id(black)
+        half_points = round(result * 2)
+
+        key = self._pair_key(white_id, black_id)
+        slot = self.pair_slots.get(key)
+        if slot is None:
+            slot = self.pair_slots[key] = len(self.pair_games)
+            self.pair_games.append(0)
+            self.pair_half_points.append(0)
+            self.opponent_ids[white_id].append(black_id)
+            self.opponent_ids[black_id].append(white_id)
+        self.pair_games[slot] += 1
+        self.pair_half_points[slot] += half_points if white_id < black_id else 2 - half_points
+
+        white_bin = white_id * bin_count + rating_bin(black_rating)
+        black_bin = black_id * bin_count + rating_bin(white_rating)
+        self.bin_games[white_bin] += 1
+        self.bin_half_points[white_bin] += half_points
+        self.bin_games[black_bin] += 1
+        self.bin_half_points[black_bin] += 2 - half_points
+
+    def _slot(self, player1, player2):
+        id1, id2 = self.ids.get(player1), self.ids.get(player2)
+        if id1 is None or id2 is None:
+            return None, id1, id2
+        return self.pair_slots.get(self._pair_key(id1, id2)), id1, id2
+
+    def played(self, player1, player2):
+        slot, _, _ = self._slot(player1, player2)
+        return slot is not None
+
+    def score(self, player1, player2):
+        """
+        Points of player1 against player2 and the number of games they played.
+        """
+        slot, id1, id2 = self._slot(player1, player2)
+        if slot is None:
+            return 0.0, 0
+        half_points = self.pair_half_points[slot]
+        if id1 > id2:
+            half_points = 2 * self.pair_games[slot] - half_points
+        return half_points / 2, self.pair_games[slot]
+
+    def opponents(self, player):
+        """
+        Opponents of a player with the player's points and the games against each.
+        """
+        player_id = self.ids.get(player)
+        if player_id is None:
+            return []
+        return [(self.names[opponent_id], *self.score(player, self.names[opponent_id]))
+                for opponent_id in self.opponent_ids[player_id]]
+
+    def pairs_among(self, players):
+        """
+        Pairs of the given players that have played each other.
+        """
+        players = [player for player in players if player in self.ids]
+        return [(player1, player2) for index, player1 in enumerate(players) for player2 in players[index + 1:]
+                if self.played(player1, player2)]
+
+    def histogram(self, player):
+        """
+        (lowest rating of the bin, games, points) against opponents by rating.
+        """
+        player_id = self.ids.get(player)
+        if player_id is None:
+            return []
+        start = player_id * bin_count
+        return [(first_bin + bin_index * bin_width, self.bin_games[start + bin_index],
+                 self.bin_half_points[start + bin_index] / 2) for bin_index in range(bin_count)]
+
+    def against(self, player, min_rating=None, max_rating=None):
+        """
+        Points and games against opponents rated from min_rating up to below max_rating.
+
+        The limits are rounded down to the bins of 100 points.
+        """
+        player_id = self.ids.get(player)
+        if player_id is None:
+            return 0.0, 0
+        low = rating_bin(min_rating) if min_rating is not None else 0
+        high = bin_count
+        if max_rating is not None:
+            high = min(max(int(max_rating - first_bin) // bin_width, 0), bin_count)
+        start = player_id * bin_count
+        games = sum(self.bin_games[start + low:start + high])
+        half_points = sum(self.bin_half_points[start + low:start + high])
+        return half_points / 2, games
+
+
+def build_index(games, identity=None):
+    """
+    Index of the games (tournament, round, white, black, result), replayed to get the
+    rating of each opponent at the time of the game.
+    """
+    identity = identity or player_identity.load_aliases()
+    index = HeadToHeadIndex()
+    ratings = {}
+    histories = {}
+    for _, _, white, black, result in games:
+        white, black = identity.register(white), identity.register(black)
+        # The bye is rated like a player, but it is nobody's opponent
+        if BYE not in (white, black):
+            index.add_game(white, black, result, ratings.get(white, initial_rating),
+                           ratings.get(black, initial_rating))
+        update_ratings([(white, black, result)], histories, ratings)
+    return index
+
+
+def load_index(use_store=False, identity=None):
+    """
+    Index of all results in the CSV files or the game store.
+    """
+    import crosstable
+    return build_index(crosstable.read_games(use_store), identity)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Head-to-head scores and results by opponent rating')
+    parser.add_argument('player')
+    parser.add_argument('opponent', nargs='?', help='score of the player against this opponent')
+    parser.add_argument('--min', type=int, help='lowest opponent rating')
+    parser.add_argument('--max', type=int, help='opponent rating below this')
+    parser.add_argument('--opponents', action='store_true', help='score against everyone the player has met')
+    parser.add_argument('--histogram', action='store_true', help='games and points by opponent rating')
+    parser.add_argument('--store', action='store_true', help='read the games from the binary game store')
+    args = parser.parse_args()
+
+    identity = player_identity.load_aliases()
+    index = load_index(args.store, identity)
+    player = identity.canonical(args.player)
+    if player not in index.ids:
+        print(f"{args.player} has no games")
+        return 1
+    print()
+
+    if args.opponent:
+        opponent = identity.canonical(args.opponent)
+        points, games = index.score(player, opponent)
+        print(f"{player} - {opponent}: {points:g} / {games}")
+    if args.opponents:
+        for opponent, points, games in sorted(index.opponents(player), key=lambda item: (-item[2], item[0])):
+            print(f"{opponent:<30} {points:>4g} / {games}")
+    if args.histogram:
+        for low, games, points in index.histogram(player):
+            if games:
+                print(f"{low:>4}-{low + bin_width - 1:<4} {points:>5g} / {games}")
+    if not (args.opponent or args.opponents or args.histogram) or args.min is not None or args.max is not None:
+        points, games = index.against(player, args.min, args.max)
+        limits = f"{args.min or ''}-{args.max or ''}" if args.min is not None or args.max is not None else 'all'
+        print(f"{player} against opponents rated {limits}: {points:g} / {games}"
+              + (f" ({100 * points / games:.0f}%)" if games else ''))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
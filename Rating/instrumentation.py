@@ -0,0 +1,144 @@
+"""
+Named timing spans and counters shared by the rating and tournament scripts.
+
+Every stage of a run is wrapped in a span:
+
+    with instrumentation.span('workbook.open'):
+        workbook = openpyxl.load_workbook(...)
+    instrumentation.count('games', len(rows))
+
+Recording a span costs two clock reads, so the spans are always on. With --profile
+a script prints how often each span ran and how long it took in total; with
+--profile-out the numbers are also written to a .json file, or the whole run is
+profiled with cProfile and the statistics written to any other file (e.g. .prof,
+to open with snakeviz or pstats).
+"""
+
+import contextlib
+import functools
+import json
+import sys
+import time
+
+# name -> [calls, seconds]
+_spans = {}
+# name -> total
+_counters = {}
+
+
+def record(name, seconds):
+    entry = _spans.get(name)
+    if entry is None:
+        _spans[name] = [1, seconds]
+    else:
+        entry[0] += 1
+        entry[1] += seconds
+
+
+@contextlib.contextmanager
+def span(name):
+    """
+    Time the block as one call of the named span, also when it raises.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start)
+
+
+def timed(name):
+    """
+    Decorator version of span.
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def count(name, amount=1):
+    _counters[name] = _counters.get(name, 0) + amount
+
+
+def reset():
+    _spans.clear()
+    _counters.clear()
+
+
+def snapshot():
+    """
+    The spans and counters recorded so far, as plain data.
+    """
+    return {
+        'spans': {name: {'calls': calls, 'seconds': seconds} for name, (calls, seconds) in _spans.items()},
+        'counters': dict(_counters)
+    }
+
+
+def report(wall_seconds=None, file=None):
+    """
+    Print the spans, slowest first, and the counters.
+    """
+    file = file or sys.stdout
+    rows = sorted(_spans.items(), key=lambda item: item[1][1], reverse=True)
+    width = max([len(name) for name in _spans] + [len('stage')])
+
+    print(f"\n{'stage':<{width}}  {'calls':>7}  {'total ms':>10}  {'mean ms':>9}" +
+          ("  {:>6}".format('% run') if wall_seconds else ''), file=file)
+    for name, (calls, seconds) in rows:
+        line = f"{name:<{width}}  {calls:>7}  {seconds * 1000:>10.1f}  {seconds * 1000 / calls:>9.2f}"
+        if wall_seconds:
+            line += f"  {100 * seconds / wall_seconds:>6.1f}"
+        print(line, file=file)
+    if wall_seconds is not None:
+        print(f"{'whole run':<{width}}  {'':>7}  {wall_seconds * 1000:>10.1f}", file=file)
+    for name, total in sorted(_counters.items()):
+        print(f"{name}: {total}", file=file)
+
+
+def add_arguments(parser):
+    """
+    Add --profile and --profile-out to an argparse parser.
+    """
+    parser.add_argument('--profile', action='store_true', help='print how long each stage of the run took')
+    parser.add_argument('--profile-out', metavar='FILE',
+                        help='also write the stage times to FILE.json, or cProfile statistics to any other file')
+
+
+@contextlib.contextmanager
+def profiling(args):
+    """
+    Report the spans of the block when --profile or --profile-out was given.
+    """
+    enabled = getattr(args, 'profile', False) or getattr(args, 'profile_out', None)
+    if not enabled:
+        yield
+        return
+
+    out = args.profile_out
+    profiler = None
+    if out and not out.endswith('.json'):
+        import cProfile
+        profiler = cProfile.Profile()
+
+    start = time.perf_counter()
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        wall_seconds = time.perf_counter() - start
+        report(wall_seconds)
+        if profiler is not None:
+            profiler.dump_stats(out)
+            print(f"cProfile statistics written to {out}")
+        elif out:
+            with open(out, 'w', encoding='utf-8') as file:
+                json.dump(dict(snapshot(), wall_seconds=wall_seconds), file, ensure_ascii=False, indent=1)
+            print(f"Stage times written to {out}")
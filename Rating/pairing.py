@@ -0,0 +1,282 @@
+"""
+Pairing by rating with a step that shrinks from round to round (see Sabloni/uradi.txt).
+
+Players are sorted by tournament rating, then by global rating. Going from the top,
+the first unpaired player is paired with the player `step` places below, then
+step - 1, ..., 1, then step + 1 to the end of the list, backtracking when the rest
+of the players cannot be paired. The step is 4 in the first round, 3 in the
+second, 2 in the third and 1 from the fourth round on.
+
+Pairs that already played and forbidden pairs are kept as bitsets, one int per
+player, so checking whether the remaining players can still be paired is cheap.
+Sets of remaining players that could not be paired are remembered, which keeps
+the search from repeating the same dead end.
+"""
+
+import os
+import sys
+
+import rating_client
+
+BYE = 'Непар'
+placeholder_prefixes = ('Играч ', 'Igrac ')
+
+
+def step_for_round(round_number):
+    return max(1, 5 - round_number)
+
+
+def candidate_offsets(step, count):
+    """
+    Places below the current player to try, in order: step, step - 1, ..., 1, step + 1, ...
+    """
+    step = min(step, count - 1)
+    return list(range(step, 0, -1)) + list(range(step + 1, count))
+
+
+def seed_order(players, tournament_ratings=None, global_ratings=None, default_rating=1400):
+    """
+    Players sorted by tournament rating, and by global rating when it is the same.
+    """
+    tournament_ratings = tournament_ratings or {}
+    global_ratings = global_ratings or {}
+    return sorted(players, key=lambda player: (-tournament_ratings.get(player, default_rating),
+                                               -global_ratings.get(player, default_rating)))
+
+
+def _bits(mask):
+    while mask:
+        low_bit = mask & -mask
+        yield low_bit.bit_length() - 1
+        mask ^= low_bit
+
+
+class _Search:
+    def __init__(self, count, blocked, step):
+        self.step = step
+        everyone = (1 << count) - 1
+        # Opponents each player can still get
+        self.allowed = [everyone & ~blocked[player] & ~(1 << player) for player in range(count)]
+        self.dead_ends = set()
+
+    def everyone_has_opponent(self, remaining):
+        return all(self.allowed[player] & remaining for player in _bits(remaining))
+
+    def pair(self, remaining):
+        if remaining == 0:
+            return []
+        if remaining in self.dead_ends:
+            return None
+
+        order = list(_bits(remaining))
+        first = order[0]
+        allowed = self.allowed[first] & remaining
+
+        for offset in candidate_offsets(self.step, len(order)):
+            opponent = order[offset]
+            if not allowed >> opponent & 1:
+                continue
+
+            rest = remaining & ~(1 << first) & ~(1 << opponent)
+            if not self.everyone_has_opponent(rest):
+                continue
+
+            pairs = self.pair(rest)
+            if pairs is not None:
+                return [(first, opponent)] + pairs
+
+        self.dead_ends.add(remaining)
+        return None
+
+
+def pair_players(ordered_players, step, played_pairs=(), forbidden_pairs=()):
+    """
+    Pair players given in seed order. Returns a list of (higher, lower) seeded pairs or None.
+    """
+    positions = {player: position for position, player in enumerate(ordered_players)}
+    blocked = [0] * len(ordered_players)
+    for player1, player2 in list(played_pairs) + list(forbidden_pairs):
+        if player1 in positions and player2 in positions:
+            position1, position2 = positions[player1], positions[player2]
+            blocked[position1] |= 1 << position2
+            blocked[position2] |= 1 << position1
+
+    if len(ordered_players) % 2:
+        return None
+
+    # The search goes at most one level deep per pair
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), len(ordered_players) + 100))
+
+    pairs = _Search(len(ordered_players), blocked, step).pair((1 << len(ordered_players)) - 1)
+    if pairs is None:
+        return None
+    return [(ordered_players[first], ordered_players[second]) for first, second in pairs]
+
+
+def assign_colors(pairs, white_counts=None):
+    """
+    White goes to the player who had white less often, to the higher seed when even.
+    """
+    white_counts = white_counts or {}
+    result = []
+    for higher, lower in pairs:
+        if white_counts.get(lower, 0) < white_counts.get(higher, 0):
+            result.append((lower, higher))
+        else:
+            result.append((higher, lower))
+    return result
+
+
+def pair_round(players, round_number, tournament_ratings=None, global_ratings=None,
+               played_pairs=(), forbidden_pairs=(), white_counts=None):
+    """
+    Pairs (white, black) for the next round, or None if the players cannot be paired.
+
+    With an odd number of players the bye (Непар) is added as a player.
+    """
+    players = [player for player in players if player != BYE]
+    if len(players) % 2:
+        players.append(BYE)
+
+    ordered_players = seed_order(players, tournament_ratings, global_ratings)
+    pairs = pair_players(ordered_players, step_for_round(round_number), played_pairs, forbidden_pairs)
+    if pairs is None:
+        return None
+    return assign_colors(pairs, white_counts)
+
+
+def tournament_ratings(players, games):
+    """
+    Ratings within the tournament, everyone starting from the initial rating.
+    """
+    import Rating
+
+    history = {player: [Rating.initial_rating] for player in players}
+    ratings = Rating.update_ratings([(white, black, result) for white, black, result in games], history)
+    return {player: ratings.get(player, Rating.initial_rating) for player in players}
+
+
+def read_tournament(tournament_file):
+    """
+    Players, global ratings, paused players, forbidden pairs and games of a tournament workbook.
+    """
+    # pip install openpyxl
+    import openpyxl
+
+    workbook = openpyxl.load_workbook(tournament_file, read_only=True, data_only=True, keep_links=False)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows)
+        columns = {str(value).strip(): index for index, value in enumerate(header) if value is not None}
+        rating_column = columns.get('Relativna snaga')
+        pause_column = columns.get('Pauzira')
+
+        players = []
+        global_ratings = {}
+        paused = set()
+        for row in rows:
+            name = row[0]
+            if name is None:
+                continue
+            name = str(name).strip()
+            if name.startswith(placeholder_prefixes):
+                continue
+            if rating_column is not None and isinstance(row[rating_column], (int, float)):
+                global_ratings[name] = row[rating_column]
+            if pause_column is not None and row[pause_column] is not None and name != BYE:
+                paused.add(name)
+            if name == BYE:
+                break
+            players.append(name)
+
+        forbidden_pairs = []
+        if 'Zabranjeni parovi' in workbook.sheetnames:
+            for row in workbook['Zabranjeni parovi'].iter_rows(max_col=2, values_only=True):
+                if row[0] and row[1]:
+                    forbidden_pairs.append((str(row[0]).strip(), str(row[1]).strip()))
+
+        games = []
+        rounds_played = 0
+        # round -> boards paired without a result yet
+        missing_results = {}
+        for sheet_name in workbook.sheetnames:
+            if not sheet_name.isnumeric():
+                continue
+            round_games = []
+            missing = []
+            for board, row in enumerate(workbook[sheet_name].iter_rows(min_row=2, max_col=4, values_only=True),
+                                        start=1):
+                row = tuple(row) + (None,) * (4 - len(row))
+                if not (row[1] and row[2]):
+                    continue
+                if isinstance(row[3], (int, float)):
+                    round_games.append((str(row[1]).strip(), str(row[2]).strip(), float(row[3])))
+                else:
+                    missing.append(row[0] if isinstance(row[0], int) else board)
+            games.extend(round_games)
+            if missing:
+                missing_results[int(sheet_name)] = missing
+            elif round_games:
+                rounds_played += 1
+    finally:
+        workbook.close()
+
+    return {
+        'players': [player for player in players if player not in paused],
+        'global_ratings': global_ratings,
+        'forbidden_pairs': forbidden_pairs,
+        'games': games,
+        'rounds_played': rounds_played,
+        'missing_results': missing_results
+    }
+
+
+def pair_next_round(tournament_file):
+    """
+    Pairs for the round after the last one with results in the workbook.
+
+    Raises ValueError while a paired round still has games without a result.
+    """
+    tournament = read_tournament(tournament_file)
+    if tournament['missing_results']:
+        round_number = min(tournament['missing_results'])
+        boards = ', '.join(map(str, tournament['missing_results'][round_number]))
+        raise ValueError(f"Round {round_number} is not finished, results are missing on boards {boards}")
+    games = tournament['games']
+    players = tournament['players'] + ([BYE] if len(tournament['players']) % 2 else [])
+
+    white_counts = {}
+    for white, _, _ in games:
+        white_counts[white] = white_counts.get(white, 0) + 1
+
+    # Current ratings from the rating service, when it runs, for players it knows
+    global_ratings = dict(tournament['global_ratings'])
+    service_ratings = rating_client.fetch_ratings()
+    if service_ratings is not None:
+        global_ratings.update((player, service_ratings[player]) for player in players if player in service_ratings)
+
+    return pair_round(tournament['players'], tournament['rounds_played'] + 1,
+                      tournament_ratings(players, games), global_ratings,
+                      [(white, black) for white, black, _ in games], tournament['forbidden_pairs'],
+                      white_counts)
+
+
+def main():
+    if len(sys.argv) < 2 or sys.argv[1] in ('-h', '--help'):
+        print(f"Usage: python {os.path.basename(__file__)} <tournament workbook>")
+        sys.exit(1 if len(sys.argv) < 2 else 0)
+
+    try:
+        pairs = pair_next_round(sys.argv[1])
+    except ValueError as e:
+        print(e)
+        sys.exit(1)
+    if pairs is None:
+        print("Players cannot be paired without repeating a game or a forbidden pair")
+        sys.exit(1)
+    for board, (white, black) in enumerate(pairs, start=1):
+        print(f"{board}. {white} - {black}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""
+Which tournaments every player took part in, for the rating list eligibility rule.
+
+Sabloni/uradi.txt: rating.csv lists the players who played in at least two
+tournaments and in at least one of the last three. Every player has a bitmap of
+the tournaments played (bit N for Rezultati/N.csv), the first and last tournament
+and the number of games in total and by tournament, filled in while the results are
+read. Checking a player is then a few integer operations, for the latest tournament
+or as of any earlier one.
+"""
+
+import argparse
+import os
+
+min_tournaments = 2
+recent_tournaments = 3
+
+
+def _count_bits(bitmap):
+    return bin(bitmap).count('1')
+
+
+class ParticipationIndex:
+    """
+    Tournaments bitmap, first and last tournament and game count of every player.
+    """
+
+    def __init__(self, entries=None):
+        # name -> [tournaments bitmap, first tournament, last tournament, games, {tournament: games}]
+        # The tournaments of the last entry are strings, as they are kept in the JSON state file
+        self.entries = entries if entries is not None else {}
+        self.latest = max((entry[2] for entry in self.entries.values()), default=0)
+
+    def add_game(self, tournament, player1, player2):
+        for player in (player1, player2):
+            entry = self.entries.get(player)
+            if entry is None:
+                self.entries[player] = [1 << tournament, tournament, tournament, 1, {str(tournament): 1}]
+                continue
+            entry[0] |= 1 << tournament
+            entry[1] = min(entry[1], tournament)
+            entry[2] = max(entry[2], tournament)
+            entry[3] += 1
+            entry[4][str(tournament)] = entry[4].get(str(tournament), 0) + 1
+        self.latest = max(self.latest, tournament)
+
+    @classmethod
+    def from_arrays(cls, names, tournaments, player1_ids, player2_ids):
+        """
+        Build the index from game arrays, e.g. of the game store, with names indexed by player id.
+        """
+        import numpy as np
+
+        player_ids = np.concatenate((player1_ids, player2_ids)).astype(np.int64)
+        game_tournaments = np.concatenate((tournaments, tournaments)).astype(np.int64)
+        count = len(names)
+
+        games = np.bincount(player_ids, minlength=count)
+        first = np.full(count, np.iinfo(np.int64).max)
+        last = np.zeros(count, dtype=np.int64)
+        np.minimum.at(first, player_ids, game_tournaments)
+        np.maximum.at(last, player_ids, game_tournaments)
+
+        index = cls()
+        for player_id in np.flatnonzero(games):
+            index.entries[names[player_id]] = [0, int(first[player_id]), int(last[player_id]), int(games[player_id]),
+                                               {}]
+        # One bit and one game count per distinct (player, tournament) pair
+        pairs, pair_games = np.unique(player_ids * 65536 + game_tournaments, return_counts=True)
+        for player_id, tournament, count in zip((pairs // 65536).tolist(), (pairs % 65536).tolist(),
+                                                pair_games.tolist()):
+            entry = index.entries[names[player_id]]
+            entry[0] |= 1 << tournament
+            entry[4][str(tournament)] = count
+        index.latest = int(last.max()) if len(last) else 0
+        return index
+
+    def _tournaments(self, player, as_of=None):
+        entry = self.entries.get(player)
+        if entry is None:
+            return 0
+        if as_of is None:
+            return entry[0]
+        return entry[0] & ((1 << (as_of + 1)) - 1)
+
+    def tournaments(self, player, as_of=None):
+        """
+        Numbers of the tournaments the player played, up to and including as_of.
+        """
+        bitmap = self._tournaments(player, as_of)
+        return [tournament for tournament in range(bitmap.bit_length()) if bitmap >> tournament & 1]
+
+    def tournament_count(self, player, as_of=None):
+        return _count_bits(self._tournaments(player, as_of))
+
+    def last_tournament(self, player, as_of=None):
+        return self._tournaments(player, as_of).bit_length() - 1
+
+    def game_count(self, player, as_of=None):
+        """
+        Games the player played, in the tournaments up to and including as_of.
+        """
+        entry = self.entries.get(player)
+        if entry is None:
+            return 0
+        if as_of is None:
+            return entry[3]
+        return sum(games for tournament, games in entry[4].items() if int(tournament) <= as_of)
+
+    def is_active(self, player, as_of=None, recent=recent_tournaments):
+        """
+        Whether the player played in one of the last `recent` tournaments up to as_of.
+        """
+        as_of = self.latest if as_of is None else as_of
+        return self._tournaments(player, as_of) >> max(as_of - recent + 1, 0) != 0
+
+    def is_eligible(self, player, as_of=None):
+        return (self.tournament_count(player, as_of) >= min_tournaments and
+                self.is_active(player, as_of))
+
+    def active_players(self, as_of=None, recent=recent_tournaments):
+        return {player for player in self.entries if self.is_active(player, as_of, recent)}
+
+    def eligible_players(self, as_of=None):
+        return {player for player in self.entries if self.is_eligible(player, as_of)}
+
+
+def load_index(results_folder, use_store=False):
+    """
+    Index of the results in the CSV files or the game store, with player names matched through aliases.
+    """
+    import numpy as np
+
+    import game_store
+    import player_identity
+
+    if use_store:
+        store = game_store.load_current(results_folder)
+    else:
+        store = game_store.GameStore.from_csv(results_folder)
+
+    identity = player_identity.load_aliases()
+    canonical_ids = {}
+    names = []
+    store_ids = []
+    for name in store.names:
+        canonical = identity.register(name)
+        if canonical not in canonical_ids:
+            canonical_ids[canonical] = len(names)
+            names.append(canonical)
+        store_ids.append(canonical_ids[canonical])
+
+    store_ids = np.array(store_ids, dtype=np.int64)
+    return ParticipationIndex.from_arrays(names, store.games['tournament'], store_ids[store.games['white']],
+                                          store_ids[store.games['black']])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Players eligible for the rating list, or active, as of a tournament')
+    parser.add_argument('--as-of', type=int, default=None, help='tournament number (default: the latest)')
+    parser.add_argument('--active', action='store_true',
+                        help=f'list players who played in one of the last {recent_tournaments} tournaments')
+    parser.add_argument('--results', default=os.path.join('..', 'Rezultati'), help='folder with N.csv files')
+    parser.add_argument('--store', action='store_true', help='read the games from the binary game store')
+    args = parser.parse_args()
+
+    index = load_index(args.results, args.store)
+    as_of = index.latest if args.as_of is None else args.as_of
+    players = index.active_players(as_of) if args.active else index.eligible_players(as_of)
+    for player in sorted(players, key=lambda player: (-index.tournament_count(player, as_of), player)):
+        print(f"{player}: {index.tournament_count(player, as_of)} tournaments, "
+              f"last in {index.last_tournament(player, as_of)}")
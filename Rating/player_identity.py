@@ -0,0 +1,158 @@
+"""
+One name per player, whatever spelling was typed into a workbook.
+
+Names are folded to a key that ignores the alphabet (Latin or Cyrillic), diacritics,
+case and extra whitespace, so "Milan Stefanovic", "Милан Стефановић" and
+"milan  stefanović" all find the same player with one dictionary lookup.
+Nicknames and other spellings that do not fold to the same key are listed in
+aliases.csv (alias,name).
+
+Folding also joins different letters (ж and з, ц, ч and ћ), so two names that are
+written with their diacritics and still differ, like Жарић and Зарић, are different
+players: their key is marked ambiguous and each name is kept as typed. A spelling
+listed in aliases.csv always goes to its player, whatever diacritics it has.
+"""
+
+import csv
+import hashlib
+import os
+
+default_aliases_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'aliases.csv')
+
+_cyrillic_to_latin = {
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'ђ': 'dj', 'е': 'e', 'ж': 'z',
+    'з': 'z', 'и': 'i', 'ј': 'j', 'к': 'k', 'л': 'l', 'љ': 'lj', 'м': 'm', 'н': 'n',
+    'њ': 'nj', 'о': 'o', 'п': 'p', 'р': 'r', 'с': 's', 'т': 't', 'ћ': 'c', 'у': 'u',
+    'ф': 'f', 'х': 'h', 'ц': 'c', 'ч': 'c', 'џ': 'dz', 'ш': 's'
+}
+
+_latin_diacritics = {
+    'č': 'c', 'ć': 'c', 'š': 's', 'ž': 'z', 'đ': 'dj', 'ǆ': 'dz', 'ǉ': 'lj', 'ǌ': 'nj'
+}
+
+_fold_table = str.maketrans({**_cyrillic_to_latin, **_latin_diacritics})
+
+# Cyrillic to Latin with the diacritics kept, so that only the alphabet is ignored
+_exact_table = str.maketrans({**_cyrillic_to_latin, 'ђ': 'đ', 'ж': 'ž', 'ћ': 'ć', 'ч': 'č', 'џ': 'dž', 'ш': 'š',
+                              'ǆ': 'dž', 'ǉ': 'lj', 'ǌ': 'nj'})
+
+# Marks a key shared by two different players; such names are only kept as typed
+_AMBIGUOUS = object()
+
+
+def clean(name):
+    """
+    The name with surrounding and repeated whitespace removed.
+    """
+    return ' '.join(str(name).split())
+
+
+def fold(name):
+    """
+    Lookup key of a name: Latin letters without diacritics, lower case, single spaces.
+    """
+    return clean(name).casefold().translate(_fold_table)
+
+
+def same_player(name1, name2):
+    """
+    Whether two names with the same key can be the same player: they are written
+    alike apart from the alphabet, or one of them is written without diacritics.
+    """
+    exact1 = clean(name1).casefold().translate(_exact_table)
+    exact2 = clean(name2).casefold().translate(_exact_table)
+    return exact1 == exact2 or exact1 == fold(name1) or exact2 == fold(name2)
+
+
+class PlayerIdentity:
+    """
+    Index from the folded key of every known spelling to the player's name.
+    """
+
+    def __init__(self):
+        self.index = {}
+        # Folded key of every spelling from the aliases file -> name; these win over the index
+        self.alias_names = {}
+        self.aliases = []
+
+    def add_name(self, name):
+        """
+        Register a player's name, unless a player with the same key is already known.
+
+        Returns the name the player is known under. A different player with the same
+        key makes the key ambiguous.
+        """
+        name = clean(name)
+        key = fold(name)
+        alias = self.alias_names.get(key)
+        if alias is not None:
+            return name if alias is _AMBIGUOUS else alias
+        known = self.index.get(key)
+        if known is None:
+            self.index[key] = name
+            return name
+        if known is _AMBIGUOUS:
+            return name
+        if known != name and not same_player(known, name):
+            print(f"Warning: '{name}' and '{known}' fold to the same key, both are kept only as typed")
+            self.index[key] = _AMBIGUOUS
+            return name
+        return known
+
+    def add_alias(self, alias, name):
+        name = self.add_name(name)
+        key = fold(alias)
+        known = self.alias_names.get(key)
+        if known is not None and known != name:
+            print(f"Warning: '{alias}' is already a spelling of '{known}', not of '{name}'")
+            self.alias_names[key] = _AMBIGUOUS
+            return
+        self.alias_names[key] = name
+        self.aliases.append((clean(alias), name))
+
+    def canonical(self, name):
+        """
+        The name of the player with this spelling, or the cleaned name if there is none.
+        """
+        name = clean(name)
+        key = fold(name)
+        alias = self.alias_names.get(key)
+        if alias is not None:
+            return name if alias is _AMBIGUOUS else alias
+        known = self.index.get(key)
+        if known is None or known is _AMBIGUOUS or not same_player(known, name):
+            return name
+        return known
+
+    def register(self, name):
+        """
+        Like canonical, but an unknown name becomes the name of a new player.
+        """
+        return self.add_name(self.canonical(name))
+
+    def signature(self):
+        """
+        Digest of the aliases, to notice when results must be matched to players again.
+        """
+        content = '\n'.join(f"{alias},{name}" for alias, name in self.aliases)
+        return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+
+def load_aliases(filename=default_aliases_file, known_names=()):
+    """
+    Build the index from an aliases file and the names of already known players.
+    """
+    identity = PlayerIdentity()
+
+    if os.path.exists(filename):
+        with open(filename, 'r', encoding='utf-8-sig', newline='') as file:
+            for row in csv.reader(file):
+                if len(row) < 2 or not row[0].strip() or row[0].startswith('#'):
+                    continue
+                identity.add_alias(row[0], row[1])
+    else:
+        print(f"Warning: Aliases file not found: {filename}")
+
+    for name in known_names:
+        identity.add_name(name)
+    return identity
@@ -0,0 +1,253 @@
+"""
+Projected rating changes of a tournament in progress, updated after every game.
+
+The ratings start from the committed state (the result files, continued from
+rating_state.json like Rating.py --incremental) and the finished games of the live
+workbook are rated on top of them in the order Rating.py will rate them once the
+workbook is exported: round by round, board by board. A game without a result yet
+is left out until its result is entered.
+
+The ratings after every round are kept, so a new result is rated from the round it
+belongs to: a result of the current round costs the games of that round only. When
+the workbook is read again, only the round sheets whose content changed are parsed;
+the other sheets are recognised by the checksums in the .xlsm archive.
+
+    python projection.py "../Turnir 2024/Turnir 2024.xlsm"            projected changes
+    python projection.py "../Turnir 2024/Turnir 2024.xlsm" --watch    reprint after every save
+"""
+
+import argparse
+import os
+import sys
+import time
+import zipfile
+
+import instrumentation
+import player_identity
+import rating_state
+from pairing import BYE
+from Rating import apply_results, initial_rating, k_factor, read_results, results_folder, update_ratings
+
+
+def _result(value):
+    """
+    0, 0.5 or 1 from a result cell, None while the game is not finished.
+    """
+    try:
+        result = float(value)
+    except (TypeError, ValueError):
+        return None
+    return result if result in (0.0, 0.5, 1.0) else None
+
+
+class Projection:
+    """
+    Ratings after the finished games of the live rounds, rated over the committed ratings.
+    """
+
+    def __init__(self, ratings, default_rating=initial_rating):
+        self.base = ratings
+        self.default_rating = default_rating
+        # round -> [[white, black, result or None]] in board order
+        self.rounds = {}
+        # Ratings of the players of the tournament after each round of the sorted rounds
+        self._after = []
+        self._order = []
+        self.version = 0
+
+    def _invalidate(self, round_key):
+        """
+        Forget the ratings from the given round on.
+        """
+        if round_key not in self._order:
+            self._order = sorted(self.rounds)
+        position = self._order.index(round_key)
+        del self._after[position:]
+        self.version += 1
+
+    def set_round(self, round_key, games):
+        """
+        Set the games (white, black, result or None) of a round, in board order.
+        """
+        games = [[white, black, _result(result)] for white, black, result in games]
+        if self.rounds.get(round_key) == games:
+            return False
+        self.rounds[round_key] = games
+        self._invalidate(round_key)
+        return True
+
+    def set_result(self, round_key, board, result):
+        """
+        Enter the result of one game; board counts from 1.
+        """
+        game = self.rounds[round_key][board - 1]
+        result = _result(result)
+        if game[2] == result:
+            return False
+        game[2] = result
+        self._invalidate(round_key)
+        return True
+
+    def ratings(self):
+        """
+        Projected ratings of the players of the tournament.
+        """
+        if len(self._after) < len(self._order):
+            with instrumentation.span('projection.rate'):
+                ratings = dict(self._after[-1]) if self._after else {}
+                histories = {}
+                for round_key in self._order[len(self._after):]:
+                    finished = [(white, black, result) for white, black, result in self.rounds[round_key]
+                                if result is not None]
+                    for white, black, _ in finished:
+                        for player in (white, black):
+                            if player not in ratings:
+                                ratings[player] = self.base.get(player, self.default_rating)
+                    update_ratings(finished, histories, ratings)
+                    self._after.append(dict(ratings))
+                    instrumentation.count('games projected', len(finished))
+        return self._after[-1] if self._after else {}
+
+    def deltas(self):
+        """
+        Projected change of every player of the tournament, the bye left out.
+        """
+        return {player: rating - self.base.get(player, self.default_rating)
+                for player, rating in self.ratings().items() if player != BYE}
+
+
+class WorkbookProjection(Projection):
+    """
+    Projection of the round sheets of a tournament workbook, read again only where they changed.
+    """
+
+    def __init__(self, tournament_file, ratings, identity):
+        super().__init__(ratings)
+        self.tournament_file = tournament_file
+        self.identity = identity
+        self.sheet_keys = {}
+        self.signature = None
+
+    def refresh(self):
+        """
+        Read the round sheets changed since the last refresh; True if any did.
+        """
+        # pip install openpyxl
+        import openpyxl
+
+        import excel_to_csv
+
+        stat = os.stat(self.tournament_file)
+        signature = (stat.st_size, stat.st_mtime_ns)
+        if signature == self.signature:
+            return False
+
+        with instrumentation.span('workbook.keys'):
+            keys = {name: key for name, key in excel_to_csv.sheet_keys(self.tournament_file).items()
+                    if name.isnumeric()}
+        changed = [name for name, key in keys.items() if self.sheet_keys.get(name) != key]
+        updated = False
+        if changed:
+            with instrumentation.span('workbook.open'):
+                workbook = openpyxl.load_workbook(self.tournament_file, read_only=True, data_only=True,
+                                                  keep_links=False)
+            try:
+                for name in changed:
+                    with instrumentation.span('sheet.parse'):
+                        games = [(self.identity.register(str(white).strip()), self.identity.register(str(black).strip()),
+                                  result)
+                                 for white, black, result in excel_to_csv.iter_sheet_games(workbook[name])
+                                 if white is not None and black is not None]
+                    updated = self.set_round(int(name), games) or updated
+            finally:
+                workbook.close()
+        self.sheet_keys = keys
+        self.signature = signature
+        return updated
+
+
+def tournament_file_number(tournament_file):
+    """
+    Number of the Rezultati file the workbook is exported to, None if it is not listed.
+    """
+    import excel_to_csv
+
+    folder = os.path.basename(os.path.dirname(os.path.abspath(tournament_file)))
+    for file_number, workbook_folder in excel_to_csv.workbooks:
+        if workbook_folder == folder:
+            return int(file_number)
+    return None
+
+
+def committed_ratings(identity, tournament_file=None):
+    """
+    Current ratings from the result files, leaving out the workbook's own results if
+    they were exported already, so that they are not counted twice.
+    """
+    file_number = tournament_file_number(tournament_file) if tournament_file else None
+    if file_number is not None and os.path.exists(rating_state.result_filename(results_folder, file_number)):
+        print(f"Results of the tournament are in {file_number}.csv already, rating without them")
+        new_results, _ = rating_state.read_new_results(rating_state.new_state(k_factor, initial_rating),
+                                                       results_folder)
+        ratings = {}
+        update_ratings([(identity.register(white), identity.register(black), result)
+                        for number, _, white, black, result in new_results if number != file_number], {}, ratings)
+        return ratings
+
+    # Like Rating.py --incremental, without saving the state
+    state, new_results, files = read_results(True, identity)
+    apply_results(state, identity, new_results, files)
+    return {player: history[-1] for player, history in state['players'].items()}
+
+
+def load_projection(tournament_file):
+    if not os.path.isfile(tournament_file):
+        raise FileNotFoundError(f"Tournament workbook not found: {tournament_file}")
+    identity = player_identity.load_aliases()
+    projection = WorkbookProjection(tournament_file, committed_ratings(identity, tournament_file), identity)
+    projection.refresh()
+    return projection
+
+
+def print_projection(projection):
+    deltas = projection.deltas()
+    ratings = projection.ratings()
+    print(f"\n{'':<30} {'rating':>7} {'change':>7}")
+    for player, delta in sorted(deltas.items(), key=lambda item: (-item[1], item[0])):
+        print(f"{player:<30} {ratings[player]:>7} {delta:>+7}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Projected rating changes of a tournament in progress')
+    parser.add_argument('tournament_file', help='the .xlsm workbook of the tournament')
+    parser.add_argument('--watch', action='store_true', help='print the changes again whenever the workbook is saved')
+    parser.add_argument('--interval', type=float, default=1.0, help='seconds between checks of the workbook')
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+
+    if not os.path.isfile(args.tournament_file):
+        print(f"Tournament workbook not found: {args.tournament_file}")
+        return 1
+
+    with instrumentation.profiling(args):
+        projection = load_projection(args.tournament_file)
+        print_projection(projection)
+        if not args.watch:
+            return 0
+        try:
+            while True:
+                time.sleep(args.interval)
+                try:
+                    if projection.refresh():
+                        print_projection(projection)
+                except (OSError, KeyError, ValueError, zipfile.BadZipFile) as e:
+                    # Usually the workbook is being saved; it is read again on the next check
+                    print(f"Warning: Could not read {args.tournament_file}: {e}")
+                    projection.signature = None
+        except KeyboardInterrupt:
+            pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,208 @@
+"""
+Rating systems that can replay the whole game archive.
+
+A backend gets the games as integer arrays in the order they were played, with
+round ids as GameStore.round_ids gives them (tournament * 65536 + round), and
+returns the rating history of every player id. Elo is the default and gives the
+same ratings as the loop in Rating.py.
+
+Glicko-2 (Glickman, "Example of the Glicko-2 system") also keeps a rating deviation
+and a volatility per player. All games of a rating period (a tournament or a round)
+are rated together as NumPy arrays, and the deviation of everyone who did not play
+in a period grows, so players who have not played for a long time, or have played
+only a few games, are left out of rating.csv.
+"""
+
+import math
+
+#pip install numpy
+import numpy as np
+
+from vectorized_elo import EloReplay, round_boundaries
+
+
+class RatingBackend:
+    """
+    Interface of a rating system.
+    """
+
+    name = None
+
+    def replay(self, round_ids, player1_ids, player2_ids, results, player_count):
+        """
+        Rate all games and return the rating history of every player id, the initial rating first.
+        """
+        raise NotImplementedError
+
+    def eligible(self):
+        """
+        Mask of the player ids reliable enough for rating.csv, or None to show everyone.
+        """
+        return None
+
+
+class EloBackend(RatingBackend):
+    name = 'elo'
+
+    def __init__(self, k_factor, initial_rating):
+        self.k_factor = k_factor
+        self.initial_rating = initial_rating
+        self.ratings = None
+
+    def replay(self, round_ids, player1_ids, player2_ids, results, player_count):
+        replay = EloReplay(self.k_factor, self.initial_rating)
+        replay.ensure_players(player_count)
+        replay.play(round_ids, player1_ids, player2_ids, results)
+        self.ratings = replay.ratings
+        return replay.histories()
+
+
+# Conversion between ratings and the Glicko-2 scale
+glicko2_scale = 400 / math.log(10)
+
+
+def _g(phi):
+    return 1 / np.sqrt(1 + 3 * phi * phi / math.pi ** 2)
+
+
+class Glicko2Backend(RatingBackend):
+    name = 'glicko2'
+
+    def __init__(self, initial_rating, initial_deviation=350, initial_volatility=0.06, tau=0.5,
+                 period='tournament', max_deviation=150, tolerance=1e-6):
+        if period not in ('tournament', 'round'):
+            raise ValueError(f"Unknown rating period: {period}")
+        self.initial_rating = initial_rating
+        self.initial_deviation = initial_deviation
+        self.initial_volatility = initial_volatility
+        self.tau = tau
+        self.period = period
+        self.max_deviation = max_deviation
+        self.tolerance = tolerance
+
+        self.mu = np.empty(0)
+        self.phi = np.empty(0)
+        self.sigma = np.empty(0)
+        self.seen = np.empty(0, dtype=bool)
+
+    @property
+    def ratings(self):
+        return self.initial_rating + glicko2_scale * self.mu
+
+    @property
+    def deviations(self):
+        return glicko2_scale * self.phi
+
+    def ensure_players(self, count):
+        known = len(self.mu)
+        if count <= known:
+            return
+        new = count - known
+        self.mu = np.concatenate((self.mu, np.zeros(new)))
+        self.phi = np.concatenate((self.phi, np.full(new, self.initial_deviation / glicko2_scale)))
+        self.sigma = np.concatenate((self.sigma, np.full(new, self.initial_volatility)))
+        self.seen = np.concatenate((self.seen, np.zeros(new, dtype=bool)))
+
+    def _new_volatility(self, phi, sigma, v, delta):
+        """
+        Step 5 of Glicko-2, the Illinois algorithm run for all players of the period at once.
+        """
+        a = np.log(sigma * sigma)
+        tau2 = self.tau * self.tau
+
+        def f(x):
+            ex = np.exp(x)
+            return (ex * (delta * delta - phi * phi - v - ex) / (2 * (phi * phi + v + ex) ** 2)
+                    - (x - a) / tau2)
+
+        big_step = delta * delta > phi * phi + v
+        lower = a.copy()
+        upper = np.where(big_step, np.log(np.maximum(delta * delta - phi * phi - v, 1e-300)), a - self.tau)
+        # Without a big step, go down from a until f changes sign
+        k = np.ones_like(a)
+        searching = ~big_step & (f(upper) < 0)
+        while searching.any():
+            k[searching] += 1
+            upper = np.where(searching, a - k * self.tau, upper)
+            searching &= f(upper) < 0
+
+        f_lower, f_upper = f(lower), f(upper)
+        active = np.abs(upper - lower) > self.tolerance
+        while active.any():
+            new = lower + (lower - upper) * f_lower / (f_upper - f_lower)
+            f_new = f(new)
+            crossed = f_new * f_upper <= 0
+            lower = np.where(active & crossed, upper, lower)
+            f_lower = np.where(active & crossed, f_upper, np.where(active, f_lower / 2, f_lower))
+            upper = np.where(active, new, upper)
+            f_upper = np.where(active, f_new, f_upper)
+            active &= np.abs(upper - lower) > self.tolerance
+
+        return np.exp(lower / 2)
+
+    def play_period(self, player1_ids, player2_ids, results):
+        """
+        Rate all games of one rating period from the ratings before the period.
+
+        Returns the ids of the players who played.
+        """
+        count = len(self.mu)
+        players = np.concatenate((player1_ids, player2_ids))
+        opponents = np.concatenate((player2_ids, player1_ids))
+        scores = np.concatenate((results, 1 - results))
+
+        g = _g(self.phi[opponents])
+        expected = 1 / (1 + np.exp(-g * (self.mu[players] - self.mu[opponents])))
+        information = np.bincount(players, weights=g * g * expected * (1 - expected), minlength=count)
+        improvement = np.bincount(players, weights=g * (scores - expected), minlength=count)
+
+        played = np.flatnonzero(np.bincount(players, minlength=count))
+        v = 1 / information[played]
+        delta = v * improvement[played]
+
+        phi = self.phi[played]
+        sigma = self._new_volatility(phi, self.sigma[played], v, delta)
+        phi_star = np.sqrt(phi * phi + sigma * sigma)
+        new_phi = 1 / np.sqrt(1 / (phi_star * phi_star) + 1 / v)
+
+        # Players who sat out the period become less certain, up to the initial deviation
+        idle = self.seen.copy()
+        idle[played] = False
+        self.phi[idle] = np.minimum(np.sqrt(self.phi[idle] ** 2 + self.sigma[idle] ** 2),
+                                    self.initial_deviation / glicko2_scale)
+
+        self.mu[played] += new_phi * new_phi * improvement[played]
+        self.phi[played] = new_phi
+        self.sigma[played] = sigma
+        self.seen[played] = True
+        return played
+
+    def replay(self, round_ids, player1_ids, player2_ids, results, player_count):
+        round_ids = np.asarray(round_ids, dtype=np.int64)
+        player1_ids = np.asarray(player1_ids, dtype=np.int64)
+        player2_ids = np.asarray(player2_ids, dtype=np.int64)
+        results = np.asarray(results, dtype=np.float64)
+        period_ids = round_ids // 65536 if self.period == 'tournament' else round_ids
+
+        self.ensure_players(player_count)
+        history_ids = [np.arange(player_count)]
+        history_ratings = [np.rint(self.ratings).astype(np.int64)]
+        for start, end in round_boundaries(period_ids):
+            played = self.play_period(player1_ids[start:end], player2_ids[start:end], results[start:end])
+            history_ids.append(played)
+            history_ratings.append(np.rint(self.ratings[played]).astype(np.int64))
+
+        player_ids = np.concatenate(history_ids)
+        ratings = np.concatenate(history_ratings)
+        order = np.argsort(player_ids, kind='stable')
+        counts = np.bincount(player_ids, minlength=player_count)
+        return np.split(ratings[order], np.cumsum(counts)[:-1])
+
+    def eligible(self):
+        return self.seen & (self.deviations <= self.max_deviation)
+
+
+backends = {
+    EloBackend.name: EloBackend,
+    Glicko2Backend.name: Glicko2Backend
+}
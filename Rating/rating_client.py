@@ -0,0 +1,78 @@
+"""
+Client of the rating service (rating_service.py), with only the standard library.
+
+Responses are cached with their ETag, so asking again for data that did not change
+costs a 304 reply and no parsing. When the service is not running every function
+returns None and the caller falls back to the CSV files.
+"""
+
+import json
+import os
+import urllib.error
+import urllib.parse
+import urllib.request
+
+service_url = os.environ.get('RATING_SERVICE_URL', 'http://127.0.0.1:8765')
+
+# path -> (ETag, parsed response)
+_cache = {}
+
+
+def get_json(path, timeout=1.0):
+    """
+    GET a path of the service, or None if the service cannot be reached.
+    """
+    request = urllib.request.Request(service_url + path)
+    cached = _cache.get(path)
+    if cached is not None:
+        request.add_header('If-None-Match', cached[0])
+
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            data = json.loads(response.read().decode('utf-8'))
+            etag = response.headers.get('ETag')
+            if etag:
+                _cache[path] = (etag, data)
+            return data
+    except urllib.error.HTTPError as e:
+        if e.code == 304 and cached is not None:
+            return cached[1]
+        print(f"Warning: Rating service returned {e.code} for {path}")
+        return None
+    except (urllib.error.URLError, OSError, ValueError):
+        return None
+
+
+def post_json(path, payload, timeout=5.0):
+    request = urllib.request.Request(service_url + path, data=json.dumps(payload, ensure_ascii=False).encode('utf-8'),
+                                     headers={'Content-Type': 'application/json'}, method='POST')
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return json.loads(response.read().decode('utf-8'))
+    except urllib.error.HTTPError as e:
+        print(f"Warning: Rating service returned {e.code} for {path}: {e.read().decode('utf-8', 'replace')}")
+        return None
+    except (urllib.error.URLError, OSError, ValueError):
+        return None
+
+
+def fetch_ratings(timeout=1.0):
+    """
+    Current rating of every player, like all_ratings.csv, or None without the service.
+    """
+    data = get_json('/ratings', timeout)
+    if data is None:
+        return None
+    return {name: rating for name, rating in data['ratings']}
+
+
+def fetch_player(name, timeout=1.0):
+    return get_json('/players/' + urllib.parse.quote(name), timeout)
+
+
+def submit_round(tournament, round_number, games, timeout=5.0):
+    """
+    Send the (white, black, result) games of a round as they are entered.
+    """
+    return post_json('/results', {'tournament': tournament, 'round': round_number,
+                                  'games': [list(game) for game in games]}, timeout)
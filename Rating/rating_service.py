@@ -0,0 +1,311 @@
+"""
+Local rating service: ratings kept in memory and served as JSON over HTTP.
+
+The service loads the rating state like Rating.py --incremental and checks the
+Rezultati files every few seconds, rating only the rows added since the last check.
+Results of a tournament in progress are posted round by round (POST /results) and
+give the projected ratings, without touching the CSV files. When excel_to_csv.py
+later exports the same rounds, they are taken from the files instead.
+
+    GET  /                  display board, refreshed from /standings
+    GET  /ratings           all ratings, like all_ratings.csv
+    GET  /standings         rating list with the live rounds, like rating.csv
+    GET  /projected         rating of every player after the live rounds
+    GET  /players/<name>    rating history of a player
+    POST /results           {"tournament": 12, "round": 3, "games": [[white, black, result], ...]}
+
+Every response has an ETag; a request with a matching If-None-Match gets 304.
+Run it from the Rating folder: python rating_service.py [--port 8765]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import secrets
+import urllib.parse
+
+import player_identity
+import rating_state
+from Rating import apply_results, initial_rating, read_results, results_folder, update_ratings
+
+default_host = '127.0.0.1'
+default_port = 8765
+
+_status_texts = {200: 'OK', 304: 'Not Modified', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed'}
+
+board_page = '''<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>Rejting</title>
+<style>
+body { font-family: sans-serif; font-size: 2em; margin: 1em; }
+table { border-collapse: collapse; }
+td { padding: 0.1em 0.8em; }
+.up { color: green; } .down { color: red; }
+</style>
+</head>
+<body>
+<table id="standings"></table>
+<script>
+let etag = null;
+async function refresh() {
+    const headers = etag ? {'If-None-Match': etag} : {};
+    const response = await fetch('/standings', {headers});
+    if (response.status === 200) {
+        etag = response.headers.get('ETag');
+        const data = await response.json();
+        // Names come from the posted rounds, so they are set as text, never as HTML
+        document.getElementById('standings').replaceChildren(...data.standings.map(row => {
+            const tr = document.createElement('tr');
+            const change = row.change ? (row.change > 0 ? '+' : '') + row.change : '';
+            for (const text of [row.place + '.', row.name, row.rating, change]) {
+                tr.appendChild(document.createElement('td')).textContent = text;
+            }
+            tr.lastChild.className = row.change > 0 ? 'up' : row.change < 0 ? 'down' : '';
+            return tr;
+        }));
+    }
+}
+refresh();
+setInterval(refresh, 5000);
+</script>
+</body>
+</html>
+'''
+
+
+def results_signature(folder):
+    """
+    Size and modification time of every result file, to notice new rows cheaply.
+    """
+    signature = []
+    file_number = 1
+    while True:
+        filename = rating_state.result_filename(folder, file_number)
+        if not os.path.exists(filename):
+            return signature
+        stat = os.stat(filename)
+        signature.append((stat.st_size, stat.st_mtime_ns))
+        file_number += 1
+
+
+class RatingService:
+    """
+    Ratings from the result files plus the rounds posted for the tournament in progress.
+    """
+
+    def __init__(self, folder=results_folder):
+        self.folder = folder
+        self.identity = player_identity.load_aliases()
+        self.version = 0
+        # The version starts at 0 in every process, the nonce keeps ETags of an earlier run from matching
+        self.nonce = secrets.token_hex(4)
+        # (tournament, round) -> [(white, black, result)] not in the result files yet
+        self.live = {}
+        self._projection = None
+
+        self.state, new_results, files = read_results(True, self.identity)
+        _, self.participation = apply_results(self.state, self.identity, new_results, files)
+        self.signature = results_signature(folder)
+
+    def etag(self):
+        return f'"{self.nonce}-{self.version}"'
+
+    def _changed(self):
+        self.version += 1
+        self._projection = None
+
+    def refresh(self):
+        """
+        Rate the rows added to the result files since the last check.
+        """
+        signature = results_signature(self.folder)
+        if signature == self.signature:
+            return False
+
+        new_results, files = rating_state.read_new_results(self.state, self.folder)
+        if new_results is None:
+            print("Already processed results have changed, doing a full replay")
+            self.identity = player_identity.load_aliases()
+            self.state, new_results, files = read_results(False, self.identity)
+        _, self.participation = apply_results(self.state, self.identity, new_results, files)
+        self.signature = signature
+
+        # Live rounds that are now in the files would be counted twice
+        last = self.state['last']
+        if last is not None:
+            self.live = {key: games for key, games in self.live.items()
+                         if key[0] > last['file'] or (key[0] == last['file'] and key[1] > int(last['round']))}
+        self._changed()
+        return True
+
+    def add_round(self, tournament, round_number, games):
+        """
+        Set the games of a live round, replacing what was posted for it before.
+        """
+        results = [float(result) for _, _, result in games]
+        for result in results:
+            if result not in (0.0, 0.5, 1.0):
+                raise ValueError(f"Result must be 0, 0.5 or 1, not {result}")
+        # Names are registered only once the whole round is accepted
+        games = [(self.identity.register(white), self.identity.register(black), result)
+                 for (white, black, _), result in zip(games, results)]
+        self.live[(tournament, round_number)] = games
+        self._changed()
+
+    def ratings(self):
+        return {player: history[-1] for player, history in self.state['players'].items()}
+
+    def projection(self):
+        """
+        Ratings and histories of the live games, applied in round order over the ratings.
+        """
+        if self._projection is None:
+            ratings = self.ratings()
+            histories = {player: [rating] for player, rating in ratings.items()}
+            for key in sorted(self.live):
+                update_ratings(self.live[key], histories, ratings)
+            self._projection = (ratings, histories)
+        return self._projection
+
+    def standings(self):
+        projected, _ = self.projection()
+        ratings = self.ratings()
+        eligible = self.participation.eligible_players()
+        # Players of the live rounds are listed as if the tournament was already in the files
+        for games in self.live.values():
+            for white, black, _ in games:
+                for player in (white, black):
+                    if self.participation.tournament_count(player) >= 1:
+                        eligible.add(player)
+
+        rows = sorted(((player, rating) for player, rating in projected.items() if player in eligible),
+                      key=lambda item: item[1], reverse=True)
+        return [{'place': place, 'name': player, 'rating': rating,
+                 'change': rating - ratings.get(player, initial_rating)}
+                for place, (player, rating) in enumerate(rows, start=1)]
+
+    def player(self, name):
+        name = self.identity.canonical(name)
+        history = self.state['players'].get(name)
+        projected, live_histories = self.projection()
+        if history is None and name not in projected:
+            return None
+        return {
+            'name': name,
+            'rating': history[-1] if history is not None else None,
+            'projected': projected.get(name),
+            'history': history or [],
+            'live': live_histories.get(name, [None])[1:],
+            'tournaments': self.participation.tournaments(name)
+        }
+
+    def route(self, method, target, body):
+        """
+        Status and JSON (or HTML) payload of a request.
+        """
+        path = urllib.parse.unquote(urllib.parse.urlsplit(target).path)
+
+        if method == 'POST':
+            if path != '/results':
+                return 405, {'error': 'Only /results accepts POST'}
+            try:
+                request = json.loads(body.decode('utf-8'))
+                self.add_round(int(request['tournament']), int(request['round']), request['games'])
+            except (ValueError, KeyError, TypeError) as e:
+                return 400, {'error': str(e)}
+            return 200, {'version': self.version, 'live_rounds': sorted(self.live)}
+
+        if method != 'GET':
+            return 405, {'error': f'{method} is not supported'}
+        if path == '/':
+            return 200, board_page
+        if path == '/ratings':
+            ratings = sorted(self.ratings().items(), key=lambda item: item[1], reverse=True)
+            return 200, {'version': self.version, 'ratings': ratings}
+        if path == '/standings':
+            return 200, {'version': self.version, 'live_rounds': sorted(self.live), 'standings': self.standings()}
+        if path == '/projected':
+            projected, _ = self.projection()
+            return 200, {'version': self.version, 'ratings': projected}
+        if path.startswith('/players/'):
+            player = self.player(path[len('/players/'):])
+            if player is None:
+                return 404, {'error': 'Unknown player'}
+            return 200, player
+        return 404, {'error': 'Not found'}
+
+    async def handle(self, reader, writer):
+        try:
+            request_line = (await reader.readline()).decode('latin-1').split()
+            if len(request_line) < 2:
+                return
+            method, target = request_line[0], request_line[1]
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                headers[name.strip().lower()] = value.strip()
+            body = await reader.readexactly(int(headers.get('content-length', 0) or 0))
+
+            etag = self.etag()
+            if method == 'GET' and headers.get('if-none-match') == etag:
+                status, content, content_type = 304, b'', None
+            else:
+                status, payload = self.route(method, target, body)
+                if isinstance(payload, str):
+                    content, content_type = payload.encode('utf-8'), 'text/html; charset=utf-8'
+                else:
+                    content = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+                    content_type = 'application/json; charset=utf-8'
+                # A POST changes the version, the reply carries the new one
+                etag = self.etag()
+
+            response = [f"HTTP/1.1 {status} {_status_texts.get(status, '')}", f"ETag: {etag}",
+                        f"Content-Length: {len(content)}", "Cache-Control: no-cache", "Connection: close"]
+            if content_type:
+                response.append(f"Content-Type: {content_type}")
+            writer.write(('\r\n'.join(response) + '\r\n\r\n').encode('latin-1') + content)
+            await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError) as e:
+            print(f"Warning: Bad request: {e}")
+        finally:
+            writer.close()
+
+    async def watch_results(self, interval):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                if self.refresh():
+                    print(f"Result files changed, ratings updated (version {self.version})")
+            except (OSError, ValueError) as e:
+                print(f"Warning: Could not read the result files: {e}")
+
+
+async def serve(host=default_host, port=default_port, interval=2.0):
+    service = RatingService()
+    server = await asyncio.start_server(service.handle, host, port)
+    print(f"Rating service on http://{host}:{port}/ with {len(service.state['players'])} players")
+    watcher = asyncio.ensure_future(service.watch_results(interval))
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        watcher.cancel()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Local HTTP/JSON rating service')
+    parser.add_argument('--host', default=default_host)
+    parser.add_argument('--port', type=int, default=default_port)
+    parser.add_argument('--interval', type=float, default=2.0, help='seconds between checks of the result files')
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(args.host, args.port, args.interval))
+    except KeyboardInterrupt:
+        pass
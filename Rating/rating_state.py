@@ -0,0 +1,146 @@
+"""
+Persisted rating state, so that a rating refresh only has to apply new results.
+
+The state keeps the rating history of every player (the last entry is the current
+rating, the rest are the games played), the tournaments every player took part in
+and how far each result file was processed.
+"""
+
+import csv
+import hashlib
+import json
+import os
+
+# Bump when the layout of the state file changes; older files are ignored
+STATE_VERSION = 3
+
+
+def new_state(k_factor, initial_rating):
+    """
+    Create an empty rating state for the given rating parameters.
+    """
+    return {
+        'version': STATE_VERSION,
+        'k_factor': k_factor,
+        'initial_rating': initial_rating,
+        'files': {},
+        'last': None,
+        'players': {},
+        'participation': {}
+    }
+
+
+def load_state(filename):
+    """
+    Load a rating state saved by save_state, or None if there is no usable one.
+    """
+    if not os.path.exists(filename):
+        return None
+
+    try:
+        with open(filename, 'r', encoding='utf-8') as file:
+            state = json.load(file)
+    except (OSError, ValueError) as e:
+        print(f"Warning: Could not read rating state {filename}: {e}")
+        return None
+
+    if state.get('version') != STATE_VERSION:
+        return None
+    return state
+
+
+def save_state(filename, state):
+    """
+    Save the rating state, replacing the old file only once the new one is written.
+    """
+    temp_filename = filename + '.tmp'
+    with open(temp_filename, 'w', encoding='utf-8') as file:
+        json.dump(state, file, ensure_ascii=False)
+    os.replace(temp_filename, filename)
+
+
+def result_filename(results_folder, file_number):
+    return os.path.join(results_folder, f"{file_number}.csv")
+
+
+def _read_lines(filename):
+    with open(filename, 'r', encoding='utf-8', newline='') as file:
+        return file.read().splitlines(keepends=True)
+
+
+def _digest(lines):
+    return hashlib.sha1(''.join(lines).encode('utf-8')).hexdigest()
+
+
+def _file_info(filename, lines):
+    stat = os.stat(filename)
+    return {
+        'rows': len(lines),
+        'digest': _digest(lines),
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns
+    }
+
+
+def read_new_results(state, results_folder):
+    """
+    Read the result rows that were not applied to the state yet.
+
+    Returns a list of (file_number, round, player1, player2, result) for the new rows
+    together with the updated file records for the state, or (None, None) if an already
+    processed file was changed or removed since the state was saved, in which case only
+    a full replay gives correct ratings.
+    """
+    new_results = []
+    files = dict(state['files'])
+    file_number = 1
+
+    while True:
+        filename = result_filename(results_folder, file_number)
+        info = files.get(str(file_number))
+
+        if not os.path.exists(filename):
+            if info is not None:
+                return None, None
+            break
+
+        stat = os.stat(filename)
+        if info is not None and stat.st_size == info['size'] and stat.st_mtime_ns == info['mtime_ns']:
+            # Untouched since the last run, nothing new in it
+            file_number += 1
+            continue
+
+        lines = _read_lines(filename)
+        processed = info['rows'] if info is not None else 0
+        if processed > len(lines) or (processed and _digest(lines[:processed]) != info['digest']):
+            return None, None
+
+        new_lines = lines[processed:]
+        if new_lines and state['last'] is not None and file_number < state['last']['file']:
+            # Rows added to an older tournament belong before games already rated
+            return None, None
+        if processed == 0:
+            print(f"Processing {filename} ...")
+        elif new_lines:
+            print(f"Processing {filename} from row {processed + 1} ...")
+        for row in csv.reader(new_lines):
+            new_results.append((file_number, row[0], row[1], row[2], float(row[3])))
+
+        files[str(file_number)] = _file_info(filename, lines)
+        file_number += 1
+
+    return new_results, files
+
+
+def mark_processed(state, files, new_results):
+    """
+    Record the files and the last result row that the state now includes.
+    """
+    state['files'] = files
+    if new_results:
+        file_number, round_name = new_results[-1][0], new_results[-1][1]
+        state['last'] = {
+            'file': file_number,
+            'round': round_name,
+            'row': files[str(file_number)]['rows']
+        }
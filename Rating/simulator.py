@@ -0,0 +1,241 @@
+"""
+Monte Carlo tournament simulator, for comparing pairing systems and K factors.
+
+The winner of every simulated game is drawn at random, with the expected score
+from the Elo formula in Rating.py for the players' global ratings. Thousands of
+tournaments are played in a process pool; every chunk of tournaments has its own
+seeded random generator, so the results do not depend on the number of workers.
+
+For each setting the report shows how well the final standings follow the real
+strength of the players, and how far the games sit from the diagonal of the
+crosstable (the goal in Sabloni/uradi.txt is as many crosses near it as possible).
+"""
+
+import argparse
+import csv
+import random
+from multiprocessing import Pool
+
+import pairing
+from Rating import expected_score, initial_rating
+
+pairing_systems = ['rating-step', 'swiss']
+
+# Tournaments simulated by one task in the pool
+chunk_size = 500
+
+
+def load_field(filename, count=None):
+    """
+    Players and their global ratings from a rating CSV file, strongest first.
+    """
+    with open(filename, 'r', encoding='utf-8-sig', newline='') as file:
+        field = [(row[0], int(row[1])) for row in csv.reader(file) if row and row[0] != pairing.BYE]
+    field.sort(key=lambda player: -player[1])
+    return field[:count] if count else field
+
+
+def play_game(white_strength, black_strength, rng, draw_rate):
+    """
+    Result for white; the expected value is the Elo expected score.
+    """
+    expected = expected_score(white_strength, black_strength)
+    draw = min(draw_rate, 2 * expected, 2 * (1 - expected))
+    value = rng.random()
+    if value < expected - draw / 2:
+        return 1.0
+    if value < expected + draw / 2:
+        return 0.5
+    return 0.0
+
+
+def pair_swiss(players, ratings, scores, strengths, played_pairs, white_counts):
+    ordered_players = sorted(players, key=lambda player: (-scores.get(player, 0), -ratings.get(player, 0),
+                                                          -strengths.get(player, 0)))
+    pairs = pairing.pair_players(ordered_players, 1, played_pairs)
+    return pairing.assign_colors(pairs, white_counts) if pairs is not None else None
+
+
+def simulate_tournament(field, rounds, k_factor, system, rng, draw_rate):
+    """
+    Play one tournament. Returns the players in final order and the games played.
+    """
+    strengths = dict(field)
+    players = [name for name, _ in field]
+    if len(players) % 2:
+        players.append(pairing.BYE)
+
+    ratings = {player: initial_rating for player in players}
+    scores = {player: 0 for player in players}
+    white_counts = {}
+    played_pairs = set()
+    games = []
+
+    for round_number in range(1, rounds + 1):
+        if system == 'swiss':
+            pairs = pair_swiss(players, ratings, scores, strengths, played_pairs, white_counts)
+        else:
+            pairs = pairing.pair_round(players, round_number, ratings, strengths, played_pairs, (), white_counts)
+        if pairs is None:
+            break
+
+        for white, black in pairs:
+            played_pairs.add((white, black))
+            white_counts[white] = white_counts.get(white, 0) + 1
+            if pairing.BYE in (white, black):
+                # A free point, not a game
+                scores[black if white == pairing.BYE else white] += 1
+                continue
+
+            result = play_game(strengths[white], strengths[black], rng, draw_rate)
+            scores[white] += result
+            scores[black] += 1 - result
+
+            # Same zero-sum update as Rating.update_ratings
+            new_white_rating = round(ratings[white] + k_factor * (result - expected_score(ratings[white], ratings[black])))
+            ratings[black] -= new_white_rating - ratings[white]
+            ratings[white] = new_white_rating
+            games.append((white, black))
+
+    if pairing.BYE in players:
+        players.remove(pairing.BYE)
+    if system == 'swiss':
+        standings = sorted(players, key=lambda player: (-scores[player], -ratings[player]))
+    else:
+        # Final placement is by tournament rating
+        standings = sorted(players, key=lambda player: (-ratings[player], -scores[player]))
+    return standings, games
+
+
+def _simulate_chunk(task):
+    field, rounds, k_factor, system, seed, chunk, events, draw_rate = task
+    rng = random.Random(seed * 1000003 + chunk)
+    count = len(field)
+    strength_rank = {name: rank for rank, (name, _) in enumerate(field)}
+
+    rank_counts = [[0] * count for _ in range(count)]
+    rank_error = 0
+    rank_correlation = 0.0
+    diagonal_distance = 0
+    game_count = 0
+
+    for _ in range(events):
+        standings, games = simulate_tournament(field, rounds, k_factor, system, rng, draw_rate)
+        final_rank = {name: rank for rank, name in enumerate(standings)}
+
+        squared_difference = 0
+        for name, rank in final_rank.items():
+            rank_counts[strength_rank[name]][rank] += 1
+            rank_error += abs(rank - strength_rank[name])
+            squared_difference += (rank - strength_rank[name]) ** 2
+        # Spearman rank correlation between strength and final standing
+        if count > 1:
+            rank_correlation += 1 - 6 * squared_difference / (count * (count * count - 1))
+
+        for white, black in games:
+            diagonal_distance += abs(final_rank[white] - final_rank[black])
+        game_count += len(games)
+
+    return {
+        'events': events,
+        'rank_counts': rank_counts,
+        'rank_error': rank_error,
+        'rank_correlation': rank_correlation,
+        'diagonal_distance': diagonal_distance,
+        'games': game_count
+    }
+
+
+def simulate(field, rounds, k_factor, system, events, seed=1, draw_rate=0.1, workers=None, pool=None):
+    """
+    Simulate events tournaments and sum up the statistics of all of them.
+    """
+    tasks = []
+    for chunk, start in enumerate(range(0, events, chunk_size)):
+        tasks.append((field, rounds, k_factor, system, seed, chunk, min(chunk_size, events - start), draw_rate))
+
+    if pool is not None:
+        parts = pool.map(_simulate_chunk, tasks)
+    elif workers == 1:
+        parts = [_simulate_chunk(task) for task in tasks]
+    else:
+        with Pool(processes=workers) as own_pool:
+            parts = own_pool.map(_simulate_chunk, tasks)
+
+    count = len(field)
+    total = {
+        'events': 0,
+        'rank_counts': [[0] * count for _ in range(count)],
+        'rank_error': 0,
+        'rank_correlation': 0.0,
+        'diagonal_distance': 0,
+        'games': 0
+    }
+    for part in parts:
+        for key in ('events', 'rank_error', 'rank_correlation', 'diagonal_distance', 'games'):
+            total[key] += part[key]
+        for player, counts in enumerate(part['rank_counts']):
+            for rank, value in enumerate(counts):
+                total['rank_counts'][player][rank] += value
+    return total
+
+
+def summarize(field, total):
+    events = max(total['events'], 1)
+    return {
+        'mean_rank_error': total['rank_error'] / (events * len(field)),
+        'rank_correlation': total['rank_correlation'] / events,
+        'diagonal_distance': total['diagonal_distance'] / max(total['games'], 1),
+        'strongest_wins': total['rank_counts'][0][0] / events
+    }
+
+
+def print_standings_distribution(field, total, top=3):
+    events = max(total['events'], 1)
+    print(f"{'Player':30} {'rating':>6} {'mean place':>10} " + ' '.join(f"{f'P({place})':>6}" for place in range(1, top + 1)))
+    for (name, rating), counts in zip(field, total['rank_counts']):
+        mean_place = sum((rank + 1) * value for rank, value in enumerate(counts)) / events
+        chances = ' '.join(f"{counts[rank] / events:6.1%}" for rank in range(min(top, len(counts))))
+        print(f"{name:30} {rating:6} {mean_place:10.2f} {chances}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Monte Carlo comparison of pairing systems and K factors')
+    parser.add_argument('--events', type=int, default=10000, help='tournaments per setting')
+    parser.add_argument('--rounds', type=int, default=7)
+    parser.add_argument('--k', type=int, nargs='+', default=[40, 80], help='K factors to compare')
+    parser.add_argument('--system', nargs='+', choices=pairing_systems, default=['rating-step'])
+    parser.add_argument('--ratings', default='rating.csv', help='field of players with their global ratings')
+    parser.add_argument('--players', type=int, default=None, help='take only the strongest players')
+    parser.add_argument('--draw-rate', type=float, default=0.1)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--workers', type=int, default=None, help='default: one per CPU')
+    parser.add_argument('--distribution', action='store_true', help='print where every player finished')
+    args = parser.parse_args()
+
+    field = load_field(args.ratings, args.players)
+    print(f"Simulating {args.events} tournaments of {len(field)} players and {args.rounds} rounds per setting\n")
+
+    results = []
+    with Pool(processes=args.workers) as pool:
+        for system in args.system:
+            for k_factor in args.k:
+                total = simulate(field, args.rounds, k_factor, system, args.events, args.seed, args.draw_rate, pool=pool)
+                results.append((system, k_factor, summarize(field, total)))
+                if args.distribution:
+                    print(f"\n{system}, K = {k_factor}")
+                    print_standings_distribution(field, total)
+
+    print(f"\n{'System':12} {'K':>4} {'diagonal':>9} {'rank error':>10} {'Spearman':>9} {'best wins':>9}")
+    for system, k_factor, summary in results:
+        print(f"{system:12} {k_factor:4} {summary['diagonal_distance']:9.3f} {summary['mean_rank_error']:10.3f} "
+              f"{summary['rank_correlation']:9.3f} {summary['strongest_wins']:9.1%}")
+
+    # Crosses near the diagonal are the goal, the standings are the tiebreak
+    system, k_factor, _ = min(results, key=lambda result: (result[2]['diagonal_distance'],
+                                                           result[2]['mean_rank_error']))
+    print(f"\nClosest to the diagonal: {system} with K = {k_factor}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""
+Sweep of rating settings over all historical results.
+
+Every setting (K factor, initial rating and an optional per-round K schedule) replays
+all games, and every game is predicted from the ratings before it is rated. The
+settings are scored by the log-loss and Brier score of those predictions; lower is
+better for both.
+
+The games are read from the binary game store, which every worker process memory
+maps once, so the result files are not parsed again for each setting. Spellings of
+the same player share one rating, and games against the bye (Непар) are left out:
+they are certain wins that would only reward a large K.
+
+The schedule multiplies K by round of the tournament, e.g. "2,1.5,1" uses 2K in the
+first round, 1.5K in the second and K from the third round on. Since every player
+starts from the same initial rating and only rating differences matter, the initial
+rating moves all ratings by the same amount and does not change the predictions.
+"""
+
+import argparse
+import itertools
+from multiprocessing import Pool
+
+#pip install numpy
+import numpy as np
+
+import game_store
+import player_identity
+from pairing import BYE
+from Rating import initial_rating, k_factor, results_folder
+from vectorized_elo import EloReplay, PlayerIndex, conflict_free_chunks, round_boundaries
+
+# Keeps the log-loss finite for predictions of exactly 0 or 1
+epsilon = 1e-15
+
+# Games of the worker process, loaded once by _init_worker
+_games = None
+
+
+def prepare_games(store):
+    """
+    Arrays of the games to score: player ids with aliases merged, without the games of the bye.
+    """
+    identity = player_identity.load_aliases()
+    player_index = PlayerIndex()
+    player_ids = np.array([player_index.add(identity.register(name)) for name in store.names], dtype=np.int64)
+    white_ids = player_ids[store.games['white']]
+    black_ids = player_ids[store.games['black']]
+
+    keep = np.ones(len(store), dtype=bool)
+    if BYE in player_index.ids:
+        bye_id = player_index.ids[BYE]
+        keep = (white_ids != bye_id) & (black_ids != bye_id)
+
+    return {
+        'player_count': len(player_index),
+        'white': white_ids[keep],
+        'black': black_ids[keep],
+        'results': store.results()[keep],
+        'rounds': np.asarray(store.games['round'])[keep],
+        'round_ids': store.round_ids()[keep]
+    }
+
+
+def _init_worker(store_folder):
+    global _games
+    _games = prepare_games(game_store.GameStore.load(store_folder))
+
+
+def parse_schedule(text):
+    if not text:
+        return None
+    return tuple(float(value) for value in text.split(','))
+
+
+def schedule_label(schedule):
+    return ','.join(f"{value:g}" for value in schedule) if schedule else '-'
+
+
+def score_setting(setting, games=None):
+    """
+    Replay all games with one setting and return its prediction scores.
+    """
+    setting_k_factor, setting_initial_rating, schedule = setting
+    games = games or _games
+
+    player1_ids = games['white']
+    player2_ids = games['black']
+    results = games['results']
+    rounds = games['rounds']
+
+    replay = EloReplay(setting_k_factor, setting_initial_rating, record_history=False)
+    replay.ensure_players(games['player_count'])
+
+    log_loss = 0.0
+    brier = 0.0
+    for start, end in round_boundaries(games['round_ids']):
+        if schedule:
+            replay.k_factor = setting_k_factor * schedule[min(int(rounds[start]), len(schedule)) - 1]
+        for chunk_start, chunk_end in conflict_free_chunks(player1_ids, player2_ids, start, end):
+            chunk_results = results[chunk_start:chunk_end]
+            expected_scores = replay.play_batch(player1_ids[chunk_start:chunk_end],
+                                                player2_ids[chunk_start:chunk_end], chunk_results)
+
+            predicted = np.clip(expected_scores, epsilon, 1 - epsilon)
+            log_loss -= float(np.sum(chunk_results * np.log(predicted) + (1 - chunk_results) * np.log(1 - predicted)))
+            brier += float(np.sum((expected_scores - chunk_results) ** 2))
+
+    count = max(len(results), 1)
+    return {
+        'k_factor': setting_k_factor,
+        'initial_rating': setting_initial_rating,
+        'schedule': schedule,
+        'log_loss': log_loss / count,
+        'brier': brier / count
+    }
+
+
+def sweep(settings, store_folder=results_folder, workers=None):
+    """
+    Score all settings in parallel, best log-loss first.
+    """
+    # The CSV files may have changed since the store was imported
+    game_store.load_current(store_folder)
+
+    if workers == 1:
+        _init_worker(store_folder)
+        scores = [score_setting(setting) for setting in settings]
+    else:
+        with Pool(processes=workers, initializer=_init_worker, initargs=(store_folder,)) as pool:
+            scores = pool.map(score_setting, settings)
+    return sorted(scores, key=lambda score: (score['log_loss'], score['brier']))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Score rating settings by how well they predict the next game')
+    parser.add_argument('--k', type=float, nargs='+', default=[k_factor],
+                        help='K factors, e.g. --k 20 30 40 60 80')
+    parser.add_argument('--k-range', type=float, nargs=3, metavar=('FROM', 'TO', 'STEP'),
+                        help='K factors from FROM to TO (inclusive) in steps of STEP')
+    parser.add_argument('--initial', type=int, nargs='+', default=[initial_rating], help='initial ratings')
+    parser.add_argument('--schedule', nargs='+', default=[''],
+                        help='K multipliers by round, e.g. "2,1.5,1"; "" for a constant K')
+    parser.add_argument('--store', default=results_folder, help='folder of the game store')
+    parser.add_argument('--workers', type=int, default=None, help='default: one per CPU')
+    parser.add_argument('--top', type=int, default=20, help='settings to print')
+    args = parser.parse_args()
+
+    k_factors = list(args.k)
+    if args.k_range:
+        start, stop, step = args.k_range
+        k_factors = list(np.arange(start, stop + step / 2, step))
+
+    settings = [(float(k), initial, parse_schedule(schedule))
+                for k, initial, schedule in itertools.product(k_factors, args.initial, args.schedule)]
+    scores = sweep(settings, args.store, args.workers)
+
+    print(f"{'K':>6} {'initial':>7} {'schedule':>12} {'log-loss':>9} {'Brier':>8}")
+    for score in scores[:args.top]:
+        print(f"{score['k_factor']:6g} {score['initial_rating']:7} {schedule_label(score['schedule']):>12} "
+              f"{score['log_loss']:9.5f} {score['brier']:8.5f}")
+
+    best = scores[0]
+    print(f"\nBest: K = {best['k_factor']:g}, schedule {schedule_label(best['schedule'])}"
+          f" (current K = {k_factor})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+"""
+Array based Elo replay, for histories with millions of games.
+
+Player names are interned to integer ids and ratings are kept in a NumPy vector.
+All games of one round are rated together, which gives the same ratings as the
+game by game loop in Rating.py because a player plays at most once per round.
+Rounds where someone appears twice are split so that the order still holds.
+"""
+
+#pip install numpy
+import numpy as np
+
+
+class PlayerIndex:
+    """
+    Interns player names to consecutive integer ids, in order of first appearance.
+    """
+
+    def __init__(self, names=()):
+        self.ids = {}
+        self.names = []
+        for name in names:
+            self.add(name)
+
+    def add(self, name):
+        player_id = self.ids.get(name)
+        if player_id is None:
+            player_id = len(self.names)
+            self.ids[name] = player_id
+            self.names.append(name)
+        return player_id
+
+    def __len__(self):
+        return len(self.names)
+
+
+class ExpectedScoreTable:
+    """
+    Expected score for every integer rating difference.
+
+    Ratings are whole numbers, so the expected score only depends on an integer
+    difference. The table is filled with the same Python expression as
+    new_elo_rating, which keeps the replay identical to the scalar one.
+    """
+
+    def __init__(self, max_difference=1000):
+        self.max_difference = 0
+        self.values = np.empty(0)
+        self.extend(max_difference)
+
+    def extend(self, max_difference):
+        if max_difference <= self.max_difference and len(self.values):
+            return
+        self.max_difference = max_difference
+        self.values = np.array([1 / (1 + 10 ** (difference / 400))
+                                for difference in range(-max_difference, max_difference + 1)])
+
+    def lookup(self, differences):
+        """
+        Expected score of the players for opponent rating minus player rating.
+        """
+        largest = int(np.abs(differences).max()) if len(differences) else 0
+        if largest > self.max_difference:
+            self.extend(max(largest, 2 * self.max_difference))
+        return self.values[differences + self.max_difference]
+
+
+def round_boundaries(round_ids):
+    """
+    Start and end of every run of equal round ids.
+    """
+    round_ids = np.asarray(round_ids)
+    if len(round_ids) == 0:
+        return []
+    starts = np.flatnonzero(round_ids[1:] != round_ids[:-1]) + 1
+    starts = np.concatenate(([0], starts, [len(round_ids)]))
+    return list(zip(starts[:-1].tolist(), starts[1:].tolist()))
+
+
+def conflict_free_chunks(player1_ids, player2_ids, start, end):
+    """
+    Split games start..end into consecutive chunks where nobody plays twice.
+    """
+    players = np.concatenate((player1_ids[start:end], player2_ids[start:end]))
+    if len(np.unique(players)) == len(players):
+        return [(start, end)]
+
+    chunks = []
+    seen = set()
+    chunk_start = start
+    for game in range(start, end):
+        player1, player2 = int(player1_ids[game]), int(player2_ids[game])
+        if player1 in seen or player2 in seen or player1 == player2:
+            chunks.append((chunk_start, game))
+            chunk_start = game
+            seen = set()
+        seen.update((player1, player2))
+    chunks.append((chunk_start, end))
+    return [chunk for chunk in chunks if chunk[0] < chunk[1]]
+
+
+class EloReplay:
+    """
+    Ratings of all players as a vector, updated one round at a time.
+    """
+
+    def __init__(self, k_factor, initial_rating, record_history=True):
+        self.k_factor = k_factor
+        self.initial_rating = initial_rating
+        self.record_history = record_history
+        self.ratings = np.empty(0, dtype=np.int64)
+        self.expected_scores = ExpectedScoreTable()
+        self._history_ids = []
+        self._history_ratings = []
+
+    def ensure_players(self, count, ratings=None):
+        """
+        Make room for players up to id count - 1, starting from the given or initial rating.
+        """
+        known = len(self.ratings)
+        if count <= known:
+            return
+        new_ratings = np.full(count - known, self.initial_rating, dtype=np.int64)
+        if ratings is not None:
+            new_ratings[:] = ratings[known:count]
+        self.ratings = np.concatenate((self.ratings, new_ratings))
+        if self.record_history:
+            self._history_ids.append(np.arange(known, count))
+            self._history_ratings.append(new_ratings.copy())
+
+    def play_batch(self, player1_ids, player2_ids, results):
+        """
+        Rate games in which every player appears at most once.
+
+        Returns the expected scores of the first players, from the ratings before the games.
+        """
+        player1_ratings = self.ratings[player1_ids]
+        player2_ratings = self.ratings[player2_ids]
+
+        expected_scores = self.expected_scores.lookup(player2_ratings - player1_ratings)
+        new_player1_ratings = np.rint(
+            player1_ratings + self.k_factor * (results - expected_scores)).astype(np.int64)
+
+        # sum of all ratings for all players is constant
+        new_player2_ratings = player2_ratings - (new_player1_ratings - player1_ratings)
+
+        self.ratings[player1_ids] = new_player1_ratings
+        self.ratings[player2_ids] = new_player2_ratings
+
+        if self.record_history:
+            self._history_ids.append(np.concatenate((player1_ids, player2_ids)))
+            self._history_ratings.append(np.concatenate((new_player1_ratings, new_player2_ratings)))
+        return expected_scores
+
+    def play(self, round_ids, player1_ids, player2_ids, results):
+        """
+        Rate games in order, one round (run of equal round ids) per batch.
+        """
+        player1_ids = np.asarray(player1_ids, dtype=np.int64)
+        player2_ids = np.asarray(player2_ids, dtype=np.int64)
+        results = np.asarray(results, dtype=np.float64)
+
+        if len(player1_ids):
+            self.ensure_players(int(max(player1_ids.max(), player2_ids.max())) + 1)
+
+        for start, end in round_boundaries(round_ids):
+            for chunk_start, chunk_end in conflict_free_chunks(player1_ids, player2_ids, start, end):
+                self.play_batch(player1_ids[chunk_start:chunk_end],
+                                player2_ids[chunk_start:chunk_end],
+                                results[chunk_start:chunk_end])
+
+    def histories(self):
+        """
+        Rating history of every player, the initial rating first, as one array per player id.
+        """
+        if not self._history_ids:
+            return [np.empty(0, dtype=np.int64) for _ in range(len(self.ratings))]
+        player_ids = np.concatenate(self._history_ids)
+        ratings = np.concatenate(self._history_ratings)
+
+        # A stable sort keeps the games of each player in the order they were played
+        order = np.argsort(player_ids, kind='stable')
+        counts = np.bincount(player_ids, minlength=len(self.ratings))
+        return np.split(ratings[order], np.cumsum(counts)[:-1])
+
+
+def update_ratings_by_round(match_results, per_player_history, ratings, k_factor, initial_rating):
+    """
+    Same contract as Rating.update_ratings, for (round, player1, player2, result) rows.
+
+    The round can be any hashable value, e.g. (file number, round) for Rezultati files.
+    """
+    index = PlayerIndex(per_player_history)
+    round_index = {}
+    round_ids = []
+    player1_ids = []
+    player2_ids = []
+    results = []
+    for round_key, player1, player2, result in match_results:
+        round_ids.append(round_index.setdefault(round_key, len(round_index)))
+        player1_ids.append(index.add(player1))
+        player2_ids.append(index.add(player2))
+        results.append(result)
+
+    known_ratings = np.array([ratings.get(name, initial_rating) for name in index.names], dtype=np.int64)
+    replay = EloReplay(k_factor, initial_rating)
+    replay.ensure_players(len(index), known_ratings)
+    replay.play(round_ids, player1_ids, player2_ids, results)
+
+    histories = replay.histories()
+    for player_id, name in enumerate(index.names):
+        # The first entry is the rating the replay started from, already in the history
+        new_history = histories[player_id][1:].tolist()
+        if name not in per_player_history:
+            per_player_history[name] = [initial_rating]
+        per_player_history[name].extend(new_history)
+
+    for player_id, name in enumerate(index.names):
+        ratings[name] = int(replay.ratings[player_id])
+    return ratings
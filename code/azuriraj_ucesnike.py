@@ -5,45 +5,63 @@ Chess Tournament Participant Update Script
 Transfers paid participants from Ucesnici file to tournament bracket file
 """
 
-import pandas as pd
+import argparse
+import csv
+import importlib.util
 import os
 import sys
 import time
 import shutil
 from pathlib import Path
-try:
-    import win32com.client
-    EXCEL_COM_AVAILABLE = True
-except ImportError:
-    EXCEL_COM_AVAILABLE = False
+
+# Player names are shared with the rating scripts
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "Rating"))
+import instrumentation
+import player_identity
+import rating_client
+import tournament_model
+
+# win32com is only looked up here; it is imported when Excel is first used
+EXCEL_COM_AVAILABLE = importlib.util.find_spec("win32com") is not None
+if not EXCEL_COM_AVAILABLE:
     print("Warning: win32com not available. Install with: pip install pywin32")
 
+def _excel_application():
+    """Excel.Application object through COM"""
+    import win32com.client
+    return win32com.client.Dispatch("Excel.Application")
+
 def load_ratings_lookup(ratings_file):
     """Load player ratings from CSV file into a dictionary"""
     ratings = {}
     try:
-        df = pd.read_csv(ratings_file, header=None, names=['name', 'rating'])
-        for _, row in df.iterrows():
-            ratings[row['name']] = int(row['rating'])
+        with open(ratings_file, 'r', encoding='utf-8-sig', newline='') as file:
+            for row in csv.reader(file):
+                if len(row) >= 2:
+                    ratings[row[0]] = int(row[1])
     except Exception as e:
         print(f"Warning: Could not load ratings file {ratings_file}: {e}")
     return ratings
 
+def load_ratings(project_root):
+    """Ratings from the rating service if it is running, otherwise from Rating/all_ratings.csv"""
+    ratings_file = Path(project_root) / "Rating" / "all_ratings.csv"
+    with instrumentation.span('ratings.service'):
+        ratings_lookup = rating_client.fetch_ratings()
+    if ratings_lookup is not None:
+        print(f"Loaded {len(ratings_lookup)} ratings from the rating service")
+        return ratings_lookup
+    if not ratings_file.exists():
+        print(f"Warning: Ratings file not found: {ratings_file}")
+        return {}
+    with instrumentation.span('ratings.read'):
+        return load_ratings_lookup(ratings_file)
+
 def get_paid_participants(ucesnici_file):
     """Get list of participants who have paid their fee"""
     try:
-        df = pd.read_excel(ucesnici_file)
-        # Check if payment column has any non-null values (indicating payment)
-        paid_participants = []
-        for _, row in df.iterrows():
-            name = row['Име']
-            payment_status = row['Уплаћено учешће']
-            # Consider participant as paid if there's any value in payment column
-            # Skip rows where name is NaN or "Укупно" (total row)
-            if pd.notna(name) and name != "Укупно" and pd.notna(payment_status) and payment_status > 0:
-                paid_participants.append(name)
-        
-        return paid_participants
+        with instrumentation.span('workbook.read.participants'):
+            return tournament_model.read_paid_participants(ucesnici_file)
     except Exception as e:
         print(f"Error reading participants file {ucesnici_file}: {e}")
         return []
@@ -92,367 +110,290 @@ def create_tournament_file_from_template(tournament_folder):
         print(f"Error creating tournament file from template: {e}")
         return None
 
-def update_excel_via_com(tournament_file, updates, player_slots_end=30):
-    """Update Excel file using COM interface (works even when file is open)"""
-    if not EXCEL_COM_AVAILABLE:
-        return False
-    
-    try:
-        # Connect to Excel application
-        xl = win32com.client.Dispatch("Excel.Application")
-        xl.Visible = True  # Make Excel visible so we can see what's happening
-        xl.DisplayAlerts = False  # Suppress alerts
-        
-        # Try to find if the workbook is already open
-        workbook = None
-        file_name = Path(tournament_file).name
-        
+# Excel constants used through COM
+XL_PASTE_FORMATS = -4122
+XL_CALCULATION_MANUAL = -4135
+
+def _contiguous_runs(rows):
+    """Split sorted row numbers into (first, last) runs of consecutive rows"""
+    runs = []
+    for row in rows:
+        if runs and row == runs[-1][1] + 1:
+            runs[-1][1] = row
+        else:
+            runs.append([row, row])
+    return [tuple(run) for run in runs]
+
+def _open_workbook_via_com(xl, tournament_file):
+    """The workbook if it is already open in Excel, otherwise open it"""
+    file_name = Path(tournament_file).name
+    with instrumentation.span('com.open'):
         for wb in xl.Workbooks:
             if wb.Name == file_name:
-                workbook = wb
-                break
-        
-        # If not open, open it
-        if workbook is None:
-            workbook = xl.Workbooks.Open(tournament_file)
-        
-        # Get the first worksheet
-        worksheet = workbook.Worksheets(1)
-        
-        # Apply updates
-        updates_applied = 0
-        for row_idx, col_name, value in updates:
-            # Find column index by name (check first row for headers)
-            col_idx = None
-            for col in range(1, worksheet.UsedRange.Columns.Count + 1):
-                header_value = worksheet.Cells(1, col).Value
-                if header_value and str(header_value).strip() == str(col_name).strip():
-                    col_idx = col
-                    break
-            
-            # If not found in first row, try to find by column position for player names
-            if col_idx is None and col_name == "Unnamed: 0":
-                col_idx = 1  # First column is player names
+                return wb
+        return xl.Workbooks.Open(tournament_file)
+
+def _suspend_updating(xl):
+    """Turn off screen updating and calculation, returning the settings to restore"""
+    settings = (xl.ScreenUpdating, xl.Calculation)
+    xl.ScreenUpdating = False
+    xl.Calculation = XL_CALCULATION_MANUAL
+    return settings
+
+def _write_cells_via_com(xl, worksheet, writes, reference_rows):
+    """Write {column: {row: value}} with one format copy and one value write per run of rows"""
+    for col_idx, rows in writes.items():
+        reference_row = reference_rows.get(col_idx)
+        for first_row, end_row in _contiguous_runs(sorted(rows)):
+            target = worksheet.Range(worksheet.Cells(first_row, col_idx), worksheet.Cells(end_row, col_idx))
             
-            if col_idx:
-                # Excel uses 1-based indexing, pandas uses 0-based
-                excel_row = row_idx + 2  # +1 for 0-based to 1-based, +1 for header row
-                
-                # Get current cell and its value
-                current_cell = worksheet.Cells(excel_row, col_idx)
-                
-                # Use format copying approach to preserve formatting
+            # Copy the format of a placeholder cell, once per run
+            if reference_row is not None and (first_row, end_row) != (reference_row, reference_row):
                 try:
-                    # Find a reference cell with the same formatting (a placeholder cell)
-                    reference_cell = None
-                    for ref_row in range(1, player_slots_end + 2):  # +2 for Excel 1-based and header
-                        ref_cell = worksheet.Cells(ref_row, col_idx)
-                        ref_value = ref_cell.Value
-                        if ref_value and str(ref_value).startswith("Играч "):
-                            reference_cell = ref_cell
-                            break
-                    
-                    # Update the cell value
-                    current_cell.Value = value
-                    
-                    # Copy formatting from reference cell if found
-                    if reference_cell:
-                        try:
-                            # Copy the format using Excel's built-in copy format functionality
-                            reference_cell.Copy()
-                            current_cell.PasteSpecial(Paste=-4122)  # xlPasteFormats
-                            
-                            # Clear the clipboard
-                            xl.CutCopyMode = False
-                            
-                            # Restore the value (PasteSpecial might have changed it)
-                            current_cell.Value = value
-                        except:
-                            pass  # Ignore formatting errors
-                    
-                except:
-                    current_cell.Value = value
-                
-                updates_applied += 1
-        
-        if updates_applied > 0:
-            # Save the workbook
-            workbook.Save()
-            return True
-        else:
-            return False
-        
-    except Exception as e:
+                    with instrumentation.span('com.format'):
+                        worksheet.Cells(reference_row, col_idx).Copy()
+                        target.PasteSpecial(Paste=XL_PASTE_FORMATS)
+                        xl.CutCopyMode = False
+                except Exception:
+                    # The values are still written, only without the placeholder format
+                    instrumentation.count('com format errors')
+            
+            with instrumentation.span('com.write'):
+                target.Value = tuple((rows[row],) for row in range(first_row, end_row + 1))
+
+def _write_forbidden_pairs_via_com(workbook, forbidden_pairs):
+    """Replace the content of the Zabranjeni parovi sheet; False if there is no such sheet"""
+    sheet = None
+    for ws in workbook.Worksheets:
+        if ws.Name == tournament_model.FORBIDDEN_PAIRS_SHEET:
+            sheet = ws
+            break
+    
+    if sheet is None:
+        print("Warning: 'Zabranjeni parovi' sheet not found in tournament file")
         return False
-    finally:
-        try:
-            if 'xl' in locals():
-                xl.DisplayAlerts = True
-        except:
-            pass
+    
+    # Clear existing content (optional - you might want to append instead)
+    sheet.UsedRange.Clear()
+    
+    # Add pairs in one write
+    if forbidden_pairs:
+        with instrumentation.span('com.write'):
+            sheet.Range(sheet.Cells(1, 1), sheet.Cells(len(forbidden_pairs), 2)).Value = \
+                tuple((player1, player2) for player1, player2 in forbidden_pairs)
+    return True
 
-def save_with_retry(df, file_path, max_retries=3, retry_delay=1):
-    """Try to save Excel file with retries and different methods"""
+def _patch_with_retry(tournament_file, cells=None, style_from=None, replace_sheets=None,
+                      max_retries=3, retry_delay=1):
+    """One workbook_patch write, retried while the file is locked by another program"""
+    import workbook_patch
     
     for attempt in range(max_retries):
         try:
-            # Method 1: Direct save
-            df.to_excel(file_path, index=False)
+            with instrumentation.span('workbook.write'):
+                workbook_patch.patch_workbook(tournament_file, cells, style_from, replace_sheets)
             return True
-            
-        except PermissionError as e:
+        except PermissionError:
+            # The file is open in another program
+            instrumentation.count('write retries')
             if attempt < max_retries - 1:
                 time.sleep(retry_delay)
                 retry_delay *= 2  # Exponential backoff
-            
+        except KeyError as e:
+            print(f"Warning: Sheet {e} not found in tournament file")
+            break
         except Exception as e:
+            print(f"Error writing tournament file {tournament_file}: {e}")
             break
     
-    # Method 2: Try saving to temporary file then replace
+    return False
+
+def apply_changes_via_com(tournament_file, changes, xl=None):
+    """Write the new participants and the forbidden pairs in one Excel session and save once"""
+    if xl is None and not EXCEL_COM_AVAILABLE:
+        return False
+    
+    settings = None
     try:
-        temp_file = str(Path(file_path).with_suffix('.tmp.xlsx'))
-        df.to_excel(temp_file, index=False)
-        
-        # Wait a moment then replace
-        time.sleep(0.5)
-        shutil.move(temp_file, file_path)
+        if xl is None:
+            with instrumentation.span('com.connect'):
+                xl = _excel_application()
+        xl.Visible = True
+        xl.DisplayAlerts = False
+        
+        workbook = _open_workbook_via_com(xl, tournament_file)
+        settings = _suspend_updating(xl)
+        if changes.writes:
+            _write_cells_via_com(xl, workbook.Worksheets(1), changes.writes, changes.style_rows)
+        if changes.forbidden_pairs is not None:
+            _write_forbidden_pairs_via_com(workbook, changes.forbidden_pairs)
+        
+        with instrumentation.span('com.save'):
+            workbook.Save()
         return True
         
     except Exception as e:
-        pass
+        print(f"Warning: Could not update the tournament file through Excel: {e}")
+        return False
+    finally:
+        try:
+            if settings is not None:
+                xl.ScreenUpdating, xl.Calculation = settings
+            if xl is not None:
+                xl.DisplayAlerts = True
+        except Exception as e:
+            print(f"Warning: Could not restore the Excel settings: {e}")
+
+def apply_changes_via_file(tournament_file, model, changes, max_retries=3, retry_delay=1):
+    """Write the new participants and the forbidden pairs with one patch of the file"""
+    cells = {}
+    style_from = {}
+    if changes.writes:
+        cells[model.sheet_name] = changes.cells()
+        style_from[model.sheet_name] = changes.style_from()
+    replace_sheets = {}
+    if changes.forbidden_pairs is not None:
+        replace_sheets[tournament_model.FORBIDDEN_PAIRS_SHEET] = [list(pair) for pair in changes.forbidden_pairs]
+    
+    return _patch_with_retry(tournament_file, cells, style_from, replace_sheets, max_retries, retry_delay)
+
+def apply_changes(tournament_file, model, changes):
+    """Write the changes through Excel if possible, otherwise into the file"""
+    # Method 1: COM interface (works with open files)
+    if EXCEL_COM_AVAILABLE and apply_changes_via_com(tournament_file, changes):
+        return True
     
+    # Method 2: Patch the cells in the file, which keeps macros and formatting
+    if apply_changes_via_file(tournament_file, model, changes):
+        return True
+    
+    # Method 3: Last resort - inform user
+    print("Error: Could not save tournament file. Please close Excel and try again.")
     return False
 
-def update_tournament_file(tournament_file, paid_participants, ratings_lookup, default_rating=1400):
-    """Update tournament file with paid participants and their ratings"""
+def report_missing_slots(failed_participants, slot_count):
+    """Tell the user which participants did not get a slot"""
+    for participant in failed_participants:
+        print(f"  ERROR: No available placeholder slot for {participant}")
+    
+    error_msg = (f"Not enough placeholder slots in tournament file!\n\n"
+                f"Could not add {len(failed_participants)} participants:\n"
+                f"{', '.join(failed_participants)}\n\n"
+                f"Tournament file only has {slot_count} player slots.\n"
+                f"Please expand the tournament or remove some existing participants.")
+    
+    print(f"\nWARNING: {len(failed_participants)} participants could not be added due to insufficient slots")
+    
+    # Show error dialog
     try:
-        # Read the tournament file
-        df = pd.read_excel(tournament_file)
-        
-        # Get existing participants and find player slot range
-        existing_participants = set()
-        player_name_column = df.columns[0]  # First column contains player names
-        
-        # Find the end of player slots (marked by "Непар")
-        player_slots_end = len(df)
-        for idx in range(len(df)):
-            name = df.iloc[idx][player_name_column]
-            if pd.notna(name) and str(name) == "Непар":
-                player_slots_end = idx
-                break
-        
-        # Check existing participants in player slots only
-        for idx in range(player_slots_end):
-            name = df.iloc[idx][player_name_column]
-            if pd.notna(name) and not str(name).startswith("Играч "):
-                # Filter out UI elements and only keep actual player names
-                name_str = str(name)
-                if (not name_str in ["Унос играча", "Ресетовање", "Генериисање парова", 
-                                   "Ажурирање табеле", "Касни почеци", "Паузирање"] and
-                    not name_str.startswith("Играчи који не треба") and
-                    not name_str.isdigit() and
-                    len(name_str) > 3):  # Actual names are longer than 3 characters
-                    existing_participants.add(name)
-        
-        # Process each paid participant and collect updates
-        updated_count = 0
-        com_updates = []  # For COM method: (row_idx, col_name, value)
-        failed_participants = []  # Track participants that couldn't be added
-        
-        for participant in paid_participants:
-            if participant in existing_participants:
-                continue
-            
-            # Find first placeholder slot (only in player slots range)
-            placeholder_found = False
-            for idx in range(player_slots_end):
-                name = df.iloc[idx][player_name_column]
-                if pd.notna(name) and str(name).startswith("Играч "):
-                    # Replace placeholder with participant name
-                    df.at[idx, player_name_column] = participant
-                    
-                    # Look up and set rating
-                    rating = ratings_lookup.get(participant, default_rating)
-                    if 'Relativna snaga' in df.columns:
-                        df.at[idx, 'Relativna snaga'] = rating
-                    
-                    # Store updates for COM method
-                    com_updates.append((idx, player_name_column, participant))
-                    if 'Relativna snaga' in df.columns:
-                        com_updates.append((idx, 'Relativna snaga', rating))
-                    
-                    print(f"{participant} - {rating}")
-                    updated_count += 1
-                    placeholder_found = True
-                    break
-            
-            if not placeholder_found:
-                print(f"  ERROR: No available placeholder slot for {participant}")
-                print(f"  Tournament file only has {player_slots_end} player slots, all are filled.")
-                failed_participants.append(participant)
-        
-        # Show dialog if some participants couldn't be added
-        if failed_participants:
-            error_msg = (f"Not enough placeholder slots in tournament file!\n\n"
-                        f"Could not add {len(failed_participants)} participants:\n"
-                        f"{', '.join(failed_participants)}\n\n"
-                        f"Tournament file only has {player_slots_end} player slots.\n"
-                        f"Please expand the tournament or remove some existing participants.")
-            
-            print(f"\nWARNING: {len(failed_participants)} participants could not be added due to insufficient slots")
-            
-            # Show error dialog
-            try:
-                import win32api
-                win32api.MessageBox(0, error_msg, 'Insufficient Tournament Slots', 0x30)  # Warning icon
-            except:
-                pass  # If win32api not available, just print to console
-        
-        if updated_count > 0:
-            # Method 1: Try COM interface (works with open files)
-            if EXCEL_COM_AVAILABLE and com_updates:
-                if update_excel_via_com(tournament_file, com_updates, player_slots_end):
-                    return
-            
-            # Method 2: Try save with retry and temporary file
-            if save_with_retry(df, tournament_file):
-                return
-            
-            # Method 3: Last resort - inform user
-            print("Error: Could not save tournament file. Please close Excel and try again.")
-        else:
-            print("No new participants to transfer")
-            
+        import win32api
+        win32api.MessageBox(0, error_msg, 'Insufficient Tournament Slots', 0x30)  # Warning icon
+    except ImportError:
+        pass  # If win32api not available, just print to console
     except Exception as e:
-        print(f"Error updating tournament file {tournament_file}: {e}")
+        print(f"Warning: Could not show the message box: {e}")
 
-def process_forbidden_pairs(tournament_file, paid_participants, project_root):
-    """Process forbidden pairs and add them to tournament file"""
+def find_forbidden_pairs_file(project_root):
+    """Забрањени парови.xlsx or .xlsm in the project root, or None"""
+    for ext in ['.xlsx', '.xlsm']:
+        test_file = Path(project_root) / f"Забрањени парови{ext}"
+        if test_file.exists():
+            return test_file
+    return None
+
+def load_forbidden_groups(project_root, identity):
+    """Groups of the Забрањени парови file, or None without the file"""
+    forbidden_file = find_forbidden_pairs_file(project_root)
+    if forbidden_file is None:
+        print("No forbidden pairs Excel file found (looking for Забрањени парови.xlsx or .xlsm)")
+        return None
     try:
-        # Find forbidden pairs Excel file
-        forbidden_file = None
-        for ext in ['.xlsx', '.xlsm']:
-            test_file = project_root / f"Забрањени парови{ext}"
-            if test_file.exists():
-                forbidden_file = test_file
-                break
-        
-        if not forbidden_file:
-            print("No forbidden pairs Excel file found (looking for Забрањени парови.xlsx or .xlsm)")
-            return
-        
-        # Read forbidden pairs from Excel
-        forbidden_groups = []
-        df = pd.read_excel(forbidden_file, header=None)  # No headers, just data
-        
-        for _, row in df.iterrows():
-            # Get all non-null values from the row and trim whitespace
-            names = []
-            for value in row:
-                if pd.notna(value) and str(value).strip():
-                    names.append(str(value).strip())
-            
-            if len(names) >= 2:
-                forbidden_groups.append(names)
-        
-        if not forbidden_groups:
-            print("No forbidden pairs found in file")
-            return
-        
-        # Generate pairs from paid participants
-        forbidden_pairs = []
-        paid_set = set(paid_participants)
-        
-        for group in forbidden_groups:
-            # Find which names from this group are paid participants
-            paid_in_group = [name for name in group if name in paid_set]
-            
-            # Generate all pairs from paid participants in this group
-            for i in range(len(paid_in_group)):
-                for j in range(i + 1, len(paid_in_group)):
-                    pair = (paid_in_group[i], paid_in_group[j])
-                    forbidden_pairs.append(pair)
-        
-        if not forbidden_pairs:
-            print("No forbidden pairs among paid participants")
-            return
-        
-        print(f"Found {len(forbidden_pairs)} forbidden pairs among paid participants:")
-        for player1, player2 in forbidden_pairs:
-            print(f"  {player1} - {player2}")
-        
-        # Add pairs to tournament file
-        add_forbidden_pairs_to_tournament(tournament_file, forbidden_pairs)
-        
+        with instrumentation.span('workbook.read.forbidden_pairs'):
+            return tournament_model.read_forbidden_groups(forbidden_file, identity)
     except Exception as e:
         print(f"Error processing forbidden pairs: {e}")
+        return None
 
-def add_forbidden_pairs_to_tournament(tournament_file, forbidden_pairs):
-    """Add forbidden pairs to the tournament file's Zabranjeni parovi sheet"""
-    try:
-        if EXCEL_COM_AVAILABLE:
-            # Use COM to add to specific sheet
-            xl = win32com.client.Dispatch("Excel.Application")
-            xl.Visible = True
-            xl.DisplayAlerts = False
-            
-            # Try to find if workbook is open
-            workbook = None
-            file_name = Path(tournament_file).name
-            
-            for wb in xl.Workbooks:
-                if wb.Name == file_name:
-                    workbook = wb
-                    break
-            
-            if workbook is None:
-                workbook = xl.Workbooks.Open(tournament_file)
-            
-            # Find or create "Zabranjeni parovi" sheet
-            sheet = None
-            for ws in workbook.Worksheets:
-                if ws.Name == "Zabranjeni parovi":
-                    sheet = ws
-                    break
-            
-            if sheet is None:
-                print("Warning: 'Zabranjeni parovi' sheet not found in tournament file")
-                return
-            
-            # Clear existing content (optional - you might want to append instead)
-            sheet.UsedRange.Clear()
-            
-            # Add pairs
-            for i, (player1, player2) in enumerate(forbidden_pairs, start=1):
-                sheet.Cells(i, 1).Value = player1
-                sheet.Cells(i, 2).Value = player2
-            
-            workbook.Save()
-            print(f"Added {len(forbidden_pairs)} forbidden pairs to 'Zabranjeni parovi' sheet")
-            
-        else:
-            print("Warning: COM not available, cannot update forbidden pairs sheet")
-            
-    except Exception as e:
-        print(f"Error adding forbidden pairs to tournament file: {e}")
+def sync_tournament(tournament_file, paid_participants, ratings_lookup, project_root=None, identity=None,
+                    default_rating=1400, withdrawn=(), replacements=None, model=None, forbidden_groups=None,
+                    updated_ratings=None):
+    """Read the tournament file once, plan every change and write them together
 
-def main():
-    """Main function to orchestrate the participant update process"""
+    withdrawn players get their placeholder slot back; replacements ({old: new}) put a
+    late entry into the slot of a player who withdrew; updated_ratings ({name: rating})
+    are written for players already in the file. A model and forbidden groups read
+    before are used instead of reading the files again. Returns the changes that were
+    written, or None if the tournament file could not be read.
+    """
+    if identity is None:
+        identity = player_identity.load_aliases(known_names=ratings_lookup)
+    if model is None:
+        try:
+            with instrumentation.span('workbook.read.tournament'):
+                model = tournament_model.load_tournament(tournament_file, identity)
+        except Exception as e:
+            print(f"Error reading tournament file {tournament_file}: {e}")
+            return None
     
-    # Determine tournament folder
-    if len(sys.argv) > 1:
-        tournament_folder = Path(sys.argv[1])
-    else:
+    if forbidden_groups is None and project_root is not None:
+        forbidden_groups = load_forbidden_groups(project_root, identity)
+    
+    with instrumentation.span('plan'):
+        changes = tournament_model.plan_changes(model, paid_participants, ratings_lookup, forbidden_groups,
+                                                default_rating, withdrawn, replacements, updated_ratings)
+    instrumentation.count('cells changed', len(changes.cells()))
+    
+    for name in changes.not_found:
+        print(f"Warning: {name} has no slot in the tournament file")
+    for name in changes.removed:
+        print(f"{name} - removed")
+    for participant, rating in changes.added:
+        print(f"{participant} - {rating}")
+    for participant, rating in changes.updated:
+        print(f"{participant} - new rating {rating}")
+    if changes.failed:
+        report_missing_slots(changes.failed, len(model.slot_rows))
+    if not changes.added and not changes.updated:
+        print("No new participants to transfer")
+    if changes.forbidden_pairs is not None:
+        print(f"Found {len(changes.forbidden_pairs)} forbidden pairs among paid participants:")
+        for player1, player2 in changes.forbidden_pairs:
+            print(f"  {player1} - {player2}")
+    elif forbidden_groups is not None and not model.has_forbidden_pairs_sheet:
+        print("Warning: 'Zabranjeni parovi' sheet not found in tournament file")
+    
+    if changes:
+        changes.written = apply_changes(tournament_file, model, changes)
+    if changes.written:
+        if changes.forbidden_pairs is not None:
+            print(f"Added {len(changes.forbidden_pairs)} forbidden pairs to 'Zabranjeni parovi' sheet")
+    return changes
+
+def find_most_recent_tournament(project_root=None):
+    """The last "Turnir ..." folder of the project; folder names sort by date"""
+    if project_root is None:
+        project_root = Path(__file__).resolve().parent.parent
+    folders = [folder for folder in Path(project_root).glob("Turnir *") if folder.is_dir()]
+    if not folders:
+        return None
+    return max(folders, key=lambda folder: folder.name)
+
+def find_tournament_files(tournament_folder=None):
+    """Tournament folder and its Ucesnici file, or (folder, None) with the reason printed
+
+    Without a folder the most recent tournament folder is used.
+    """
+    if tournament_folder is None:
         # Find the most recent tournament folder
         tournament_folder = find_most_recent_tournament()
         if not tournament_folder:
             print("Error: No tournament folder found")
-            return
+            return None, None
     
     # Check if tournament folder exists
     if not tournament_folder.exists():
         print(f"Error: Tournament folder does not exist: {tournament_folder}")
-        return
+        return tournament_folder, None
     
     # Find participants file (only .xlsm files with macros)
     year = tournament_folder.name.split()[-1]
@@ -464,20 +405,39 @@ def main():
         if xlsx_file.exists():
             print(f"Error: Found {xlsx_file.name} but this script requires .xlsm file with macros.")
             print(f"Please rename {xlsx_file.name} to {ucesnici_file.name} and add the VBA macro.")
-            return
         else:
             print(f"Error: Participants file not found: {ucesnici_file.name}")
-            return
+        return tournament_folder, None
     
-    # Load ratings lookup (relative to project root)
-    project_root = tournament_folder.parent
-    ratings_file = project_root / "Rating" / "all_ratings.csv"
+    return tournament_folder, ucesnici_file
+
+def main():
+    """Main function to orchestrate the participant update process"""
     
-    if not ratings_file.exists():
-        print(f"Warning: Ratings file not found: {ratings_file}")
-        ratings_lookup = {}
-    else:
-        ratings_lookup = load_ratings_lookup(ratings_file)
+    parser = argparse.ArgumentParser(description='Transfer paid participants to the tournament file')
+    parser.add_argument('tournament_folder', nargs='?', help='default: the most recent tournament folder')
+    parser.add_argument('--withdraw', action='append', default=[], metavar='NAME',
+                        help='free the slot of a player who withdrew (also remove their payment in Ucesnici)')
+    parser.add_argument('--replace', action='append', nargs=2, default=[], metavar=('OLD', 'NEW'),
+                        help='give the slot of a player who withdrew to a late entry')
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+    
+    with instrumentation.profiling(args):
+        import_participants(args)
+
+def import_participants(args):
+    """Transfer the paid participants of the tournament folder given in args"""
+    
+    # Determine tournament folder
+    tournament_folder = Path(args.tournament_folder) if args.tournament_folder else None
+    tournament_folder, ucesnici_file = find_tournament_files(tournament_folder)
+    if ucesnici_file is None:
+        return
+    
+    # Load ratings lookup from the rating service, or from the CSV file (relative to project root)
+    project_root = tournament_folder.parent
+    ratings_lookup = load_ratings(project_root)
     
     # Find tournament file
     tournament_file = find_tournament_file(tournament_folder)
@@ -494,13 +454,17 @@ def main():
         print("No paid participants found.")
         return
     
-    print(f"Found {len(paid_participants)} paid participants")
+    # Use the names from the rating list, so the same player does not get a second history
+    identity = player_identity.load_aliases(known_names=ratings_lookup)
+    paid_participants = list(dict.fromkeys(identity.register(name) for name in paid_participants))
     
-    # Update tournament file
-    update_tournament_file(tournament_file, paid_participants, ratings_lookup)
+    print(f"Found {len(paid_participants)} paid participants")
     
-    # Process forbidden pairs
-    process_forbidden_pairs(tournament_file, paid_participants, project_root)
+    # New participants, ratings and forbidden pairs, read and written in one pass
+    withdrawn = [identity.canonical(name) for name in args.withdraw]
+    replacements = {identity.canonical(old): identity.register(new) for old, new in args.replace}
+    sync_tournament(tournament_file, paid_participants, ratings_lookup, project_root, identity,
+                    withdrawn=withdrawn, replacements=replacements)
 
 if __name__ == "__main__":
     main()
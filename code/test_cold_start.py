@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Test script for the start-up time of the turniri commands (runs without Excel)
+
+Every command is started in a new Python process, as the button of the workbook
+does, and must get to its --help within the time budget without loading the heavy
+packages it does not need yet.
+"""
+
+import json
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+turniri = Path(__file__).parent / "turniri.py"
+
+# Seconds from starting Python to the end of --help, on a slow laptop at the venue
+COLD_START_BUDGET = 1.0
+
+heavy_modules = ['pandas', 'numpy', 'matplotlib', 'openpyxl', 'win32com']
+
+# Packages a command needs as soon as its script is loaded
+needed_modules = {
+    'export-results': {'numpy', 'openpyxl'},
+}
+
+probe = '''
+import json, runpy, sys
+sys.argv = [sys.argv[1], sys.argv[2], '--help']
+try:
+    runpy.run_path(sys.argv[0], run_name='__main__')
+except SystemExit:
+    pass
+print(json.dumps(sorted(name for name in {heavy} if name in sys.modules)))
+'''.format(heavy=heavy_modules)
+
+
+def start_time(command):
+    """Seconds until `turniri <command> --help` exits"""
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, str(turniri), command, '--help'],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return time.perf_counter() - start, result.returncode
+
+
+def loaded_modules(command):
+    """Heavy packages loaded by the time `turniri <command> --help` is done"""
+    result = subprocess.run([sys.executable, '-c', probe, str(turniri), command],
+                            capture_output=True, text=True, encoding='utf-8')
+    return set(json.loads(result.stdout.strip().splitlines()[-1]))
+
+
+def time_command(command):
+    # The first start warms the disk cache, like any click after the first
+    start_time(command)
+    elapsed, returncode = start_time(command)
+    unexpected = loaded_modules(command) - needed_modules.get(command, set())
+
+    passed = returncode == 0 and elapsed <= COLD_START_BUDGET and not unexpected
+    details = f"{elapsed:.2f} s"
+    if unexpected:
+        details += f", loads {', '.join(sorted(unexpected))}"
+    if returncode != 0:
+        details += f", exit code {returncode}"
+    print(f"{'✅' if passed else '❌'} {command} ({details})")
+    return passed
+
+
+if __name__ == "__main__":
+    sys.path.append(str(Path(__file__).parent))
+    import turniri as turniri_module
+
+    print("=== Cold Start Test ===")
+    results = [time_command(command) for command in turniri_module.commands]
+    sys.exit(0 if all(results) else 1)
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+Test script for the batched COM update of apply_changes_via_com, with a fake Excel
+object (runs without Excel)
+"""
+
+import sys
+from pathlib import Path
+
+# Add the code directory to path so we can import our functions
+sys.path.append(str(Path(__file__).parent))
+
+from azuriraj_ucesnike import apply_changes_via_com
+import player_identity
+import tournament_model
+
+XL_CALCULATION_AUTOMATIC = -4105
+
+
+class FakeRange:
+    def __init__(self, sheet, first_row, first_col, last_row, last_col):
+        self.sheet = sheet
+        self.first_row, self.first_col = first_row, first_col
+        self.last_row, self.last_col = last_row, last_col
+
+    def cells(self):
+        for row in range(self.first_row, self.last_row + 1):
+            yield [(row, col) for col in range(self.first_col, self.last_col + 1)]
+
+    @property
+    def Value(self):
+        self.sheet.excel.calls += 1
+        rows = tuple(tuple(self.sheet.values.get(cell) for cell in row) for row in self.cells())
+        if len(rows) == 1 and len(rows[0]) == 1:
+            return rows[0][0]
+        return rows
+
+    @Value.setter
+    def Value(self, value):
+        self.sheet.excel.calls += 1
+        self.sheet.excel.writes_while_updating += self.sheet.excel.ScreenUpdating
+        if not isinstance(value, tuple):
+            value = ((value,),)
+        for row_cells, row_values in zip(self.cells(), value):
+            for cell, cell_value in zip(row_cells, row_values):
+                self.sheet.values[cell] = cell_value
+
+    def Copy(self):
+        self.sheet.excel.calls += 1
+        self.sheet.excel.clipboard = self.sheet.formats.get((self.first_row, self.first_col))
+
+    def PasteSpecial(self, Paste):
+        self.sheet.excel.calls += 1
+        for row in self.cells():
+            for cell in row:
+                self.sheet.formats[cell] = self.sheet.excel.clipboard
+
+
+class FakeUsedRange:
+    def __init__(self, sheet):
+        self.sheet = sheet
+
+    def Clear(self):
+        self.sheet.excel.calls += 1
+        self.sheet.values.clear()
+        self.sheet.formats.clear()
+
+
+class FakeSheet:
+    def __init__(self, excel, name, values, formats):
+        self.excel = excel
+        self.Name = name
+        self.values = values
+        self.formats = formats
+
+    @property
+    def UsedRange(self):
+        self.excel.calls += 1
+        return FakeUsedRange(self)
+
+    def Cells(self, row, col):
+        self.excel.calls += 1
+        return FakeRange(self, row, col, row, col)
+
+    def Range(self, first, last):
+        self.excel.calls += 1
+        return FakeRange(self, first.first_row, first.first_col, last.last_row, last.last_col)
+
+
+class FakeSheets(list):
+    """Worksheets(1) and iterating over Worksheets, like the COM collection"""
+
+    def __call__(self, index):
+        return self[index - 1]
+
+
+class FakeWorkbook:
+    def __init__(self, name, sheets):
+        self.Name = name
+        self.Worksheets = FakeSheets(sheets)
+        self.saved = False
+        self.fail_save = False
+
+    def Save(self):
+        if self.fail_save:
+            raise OSError("The file is read-only")
+        self.saved = True
+
+
+class FakeExcel:
+    def __init__(self, workbook_name, values, formats):
+        self.Visible = False
+        self.DisplayAlerts = True
+        self.ScreenUpdating = True
+        self.Calculation = XL_CALCULATION_AUTOMATIC
+        self.CutCopyMode = False
+        self.clipboard = None
+        self.calls = 0
+        self.writes_while_updating = 0
+        self.forbidden_values = {}
+        self.workbook = FakeWorkbook(workbook_name, [
+            FakeSheet(self, "1", values, formats),
+            FakeSheet(self, tournament_model.FORBIDDEN_PAIRS_SHEET, self.forbidden_values, {})])
+        self.Workbooks = [self.workbook]
+
+
+def make_tournament_sheet(slots=30):
+    """Names in column A, a crosstable header and the rating column, like the template"""
+    values = {}
+    formats = {}
+    rating_col = slots + 3
+    for slot in range(1, slots + 1):
+        values[(1, slot + 1)] = f"Играч {slot}"
+        values[(slot + 1, 1)] = f"Играч {slot}"
+        formats[(slot + 1, 1)] = 'placeholder'
+    values[(slots + 2, 1)] = "Непар"
+    values[(1, rating_col)] = "Relativna snaga"
+    return values, formats, rating_col
+
+
+def plan(values, rating_col, participants, ratings, forbidden_groups=None):
+    """Changes for the participants, planned from the sheet like sync_tournament does"""
+    header = [values.get((1, col)) for col in range(1, rating_col + 1)]
+    last_row = max(row for row, _ in values)
+    names = [(row, values.get((row, 1))) for row in range(2, last_row + 1)]
+    model = tournament_model.TournamentModel("1", header, names, ["1", tournament_model.FORBIDDEN_PAIRS_SHEET],
+                                             [], player_identity.PlayerIdentity())
+    return tournament_model.plan_changes(model, participants, ratings, forbidden_groups)
+
+
+def check_full_import():
+    slots = 30
+    values, formats, rating_col = make_tournament_sheet(slots)
+    # The first slot is already taken and has its own format
+    values[(2, 1)] = "Већ уписан"
+    formats[(2, 1)] = 'taken'
+
+    excel = FakeExcel("Turnir 2026.xlsm", values, formats)
+    participants = [f"Играч број {idx}" for idx in range(1, slots)]
+    ratings = {f"Играч број {idx}": 1400 + idx for idx in range(1, slots)}
+    changes = plan(values, rating_col, participants, ratings, [["Играч број 1", "Играч број 2"]])
+
+    ok = apply_changes_via_com("Turnir 2026/Turnir 2026.xlsm", changes, xl=excel)
+
+    checks = [
+        ("update reported success", ok),
+        ("workbook saved", excel.workbook.saved),
+        ("names written", all(values[(idx + 2, 1)] == f"Играч број {idx}" for idx in range(1, slots))),
+        ("ratings written", all(values[(idx + 2, rating_col)] == 1400 + idx for idx in range(1, slots))),
+        ("untouched slot kept", values[(2, 1)] == "Већ уписан" and formats[(2, 1)] == 'taken'),
+        ("placeholder format copied", all(formats[(idx + 2, 1)] == 'placeholder' for idx in range(1, slots))),
+        ("forbidden pairs written", excel.forbidden_values == {(1, 1): "Играч број 1", (1, 2): "Играч број 2"}),
+        ("no writes with screen updating on", excel.writes_while_updating == 0),
+        ("screen updating restored", excel.ScreenUpdating is True),
+        ("calculation restored", excel.Calculation == XL_CALCULATION_AUTOMATIC),
+        ("alerts restored", excel.DisplayAlerts is True),
+        (f"few COM calls for {slots - 1} players ({excel.calls})", excel.calls <= 25),
+    ]
+
+    all_passed = True
+    for name, passed in checks:
+        print(f"{'✅' if passed else '❌'} {name}")
+        all_passed = all_passed and passed
+    return all_passed
+
+
+def check_split_rows():
+    values, formats, rating_col = make_tournament_sheet(10)
+    # Slots 3 to 5 are taken, so the new players go to rows 2, 3 and 7
+    for row in (4, 5, 6):
+        values[(row, 1)] = f"Уписан {row}"
+    excel = FakeExcel("Turnir 2026.xlsm", values, formats)
+    changes = plan(values, rating_col, ["Прва", "Друга", "Трећа"], {})
+
+    ok = apply_changes_via_com("Turnir 2026.xlsm", changes, xl=excel)
+    passed = (ok and [values[(row, 1)] for row in (2, 3, 7)] == ["Прва", "Друга", "Трећа"]
+              and values[(4, 1)] == "Уписан 4" and values[(8, 1)] == "Играч 7")
+    print(f"{'✅' if passed else '❌'} rows that are not consecutive are written separately")
+    return passed
+
+
+def check_restore_after_error():
+    values, formats, rating_col = make_tournament_sheet(10)
+    excel = FakeExcel("Turnir 2026.xlsm", values, formats)
+    excel.workbook.fail_save = True
+    changes = plan(values, rating_col, ["Прва"], {})
+
+    ok = apply_changes_via_com("Turnir 2026.xlsm", changes, xl=excel)
+    passed = (not ok and excel.ScreenUpdating is True and excel.Calculation == XL_CALCULATION_AUTOMATIC
+              and excel.DisplayAlerts is True)
+    print(f"{'✅' if passed else '❌'} Excel settings restored when the save fails")
+    return passed
+
+
+if __name__ == "__main__":
+    print("=== Batched COM Update Test ===")
+    results = [check_full_import(), check_split_rows(), check_restore_after_error()]
+    sys.exit(0 if all(results) else 1)
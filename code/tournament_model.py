@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Workbooks of a tournament read once into memory, and the changes planned from them
+
+Each workbook (the tournament file, Ucesnici and "Забрањени парови") is read with one
+pass of openpyxl in read-only mode. The participants to add, their ratings and the
+forbidden pairs are then worked out in memory as one set of changes, which
+azuriraj_ucesnike.py writes to the tournament file in a single session.
+"""
+
+import heapq
+import re
+
+PLACEHOLDER_PREFIX = "Играч "
+SLOTS_END_MARKER = "Непар"
+NAME_COLUMN = 1
+RATING_HEADER = 'Relativna snaga'
+FORBIDDEN_PAIRS_SHEET = "Zabranjeni parovi"
+
+# Buttons and notes of the template in the name column, which are never player names
+ui_labels = frozenset({"Непар", "Унос играча", "Ресетовање", "Генериисање парова", "Ажурирање табеле",
+                       "Касни почеци", "Паузирање"})
+ui_label_prefixes = ("Играчи који не треба",)
+
+_placeholder_pattern = re.compile(r'^' + PLACEHOLDER_PREFIX + r'\d+$')
+
+
+def _open_workbook(file_path):
+    # pip install openpyxl
+    import openpyxl
+    return openpyxl.load_workbook(file_path, read_only=True, data_only=True, keep_links=False)
+
+
+def _text(value):
+    if value is None:
+        return ''
+    return str(value).strip()
+
+
+def is_placeholder(value):
+    return _placeholder_pattern.match(_text(value)) is not None
+
+
+def is_ui_label(value):
+    text = _text(value)
+    return text in ui_labels or text.startswith(ui_label_prefixes)
+
+
+class SlotAllocator:
+    """Player slots of a tournament sheet: which row holds whom, and which rows are free
+
+    Built once from the name column. Free rows (placeholders and empty cells) are kept
+    in a heap, so a new player always gets the first free slot and a slot freed by a
+    withdrawal is used again, in O(log slots) per change.
+    """
+
+    def __init__(self, slot_rows, values, identity):
+        self.identity = identity
+        self.slot_rows = list(slot_rows)
+        self.positions = {row: position for position, row in enumerate(self.slot_rows)}
+        self.rows = {}
+        self.names = {}
+        self.free = []
+        for row, value in zip(self.slot_rows, values):
+            if value is None or is_placeholder(value) or not _text(value):
+                self.free.append(row)
+            elif isinstance(value, str) and not is_ui_label(value):
+                self._take(identity.canonical(value), row)
+        heapq.heapify(self.free)
+
+    def __len__(self):
+        return len(self.slot_rows)
+
+    def __contains__(self, name):
+        return self.identity.canonical(name) in self.rows
+
+    @property
+    def free_count(self):
+        return len(self.free)
+
+    def row_of(self, name):
+        return self.rows.get(self.identity.canonical(name))
+
+    def first_free(self):
+        return self.free[0] if self.free else None
+
+    def placeholder(self, row):
+        """Text of the template in a free slot: "Играч 1" in the first slot"""
+        return f"{PLACEHOLDER_PREFIX}{self.positions[row] + 1}"
+
+    def placeholder_rating(self, row):
+        """Relativna snaga of a free slot in the template: the slot count down to 1"""
+        return len(self.slot_rows) - self.positions[row]
+
+    def _take(self, name, row):
+        self.rows[name] = row
+        self.names[row] = name
+
+    def assign(self, name):
+        """Row of the player, taking the first free slot for a new one; None if all are taken"""
+        name = self.identity.canonical(name)
+        row = self.rows.get(name)
+        if row is None and self.free:
+            row = heapq.heappop(self.free)
+            self._take(name, row)
+        return row
+
+    def release(self, name):
+        """Free the slot of a player who withdrew; returns its row, None for an unknown player"""
+        row = self.rows.pop(self.identity.canonical(name), None)
+        if row is not None:
+            del self.names[row]
+            heapq.heappush(self.free, row)
+        return row
+
+    def reassign(self, old_name, new_name):
+        """Give the slot of old_name to new_name (a late entry replacing a withdrawal)
+
+        Returns the row, or None if old_name has no slot or new_name already has one.
+        """
+        old_name = self.identity.canonical(old_name)
+        new_name = self.identity.canonical(new_name)
+        row = self.rows.get(old_name)
+        if row is None or new_name in self.rows:
+            return None
+        del self.rows[old_name]
+        self._take(new_name, row)
+        return row
+
+
+class TournamentModel:
+    """First sheet of a tournament workbook, as far as entering participants needs it
+
+    slots holds the player slots (the rows up to "Непар"): who is in which row and
+    which rows are still free.
+    """
+
+    def __init__(self, sheet_name, header, names, sheet_names, forbidden_pairs, identity):
+        self.sheet_name = sheet_name
+        self.columns = {}
+        for col, value in enumerate(header, start=1):
+            if value is not None:
+                self.columns.setdefault(_text(value), col)
+        self.rating_column = self.columns.get(RATING_HEADER)
+        self.sheet_names = list(sheet_names)
+        # Pairs now in the Zabranjeni parovi sheet, None without the sheet
+        self.forbidden_pairs = forbidden_pairs
+
+        slot_rows = []
+        values = []
+        for row, value in names:
+            if _text(value) == SLOTS_END_MARKER:
+                break
+            slot_rows.append(row)
+            values.append(value)
+        self.slots = SlotAllocator(slot_rows, values, identity)
+
+        # The format of new names is copied from the first placeholder
+        self.reference_row = next((row for row, value in zip(slot_rows, values) if is_placeholder(value)), None)
+
+    @property
+    def slot_rows(self):
+        return self.slots.slot_rows
+
+    @property
+    def has_forbidden_pairs_sheet(self):
+        return self.forbidden_pairs is not None
+
+
+def load_tournament(tournament_file, identity):
+    """Read the slots, the header and the forbidden pairs of a tournament file in one pass"""
+    workbook = _open_workbook(tournament_file)
+    try:
+        worksheet = workbook.worksheets[0]
+        rows = worksheet.iter_rows(min_row=1, values_only=True)
+        header = next(rows, ())
+        names = []
+        for row, values in enumerate(rows, start=2):
+            value = values[NAME_COLUMN - 1] if values else None
+            names.append((row, value))
+            if _text(value) == SLOTS_END_MARKER:
+                break
+
+        forbidden_pairs = None
+        if FORBIDDEN_PAIRS_SHEET in workbook.sheetnames:
+            forbidden_pairs = [tuple(_text(value) for value in values[:2])
+                               for values in workbook[FORBIDDEN_PAIRS_SHEET].iter_rows(max_col=2, values_only=True)
+                               if values and any(_text(value) for value in values[:2])]
+        return TournamentModel(worksheet.title, header, names, workbook.sheetnames, forbidden_pairs, identity)
+    finally:
+        workbook.close()
+
+
+def read_paid_participants(ucesnici_file):
+    """Names with a payment > 0 in the "Уплаћено учешће" column of the Ucesnici file"""
+    workbook = _open_workbook(ucesnici_file)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = [_text(value) for value in next(rows, ())]
+        name_col = header.index('Име')
+        payment_col = header.index('Уплаћено учешће')
+
+        paid_participants = []
+        for values in rows:
+            if len(values) <= max(name_col, payment_col):
+                continue
+            name = values[name_col]
+            payment = values[payment_col]
+            # Skip empty names and the "Укупно" (total) row
+            if name is None or _text(name) in ('', "Укупно"):
+                continue
+            if isinstance(payment, (int, float)) and not isinstance(payment, bool) and payment > 0:
+                paid_participants.append(name)
+        return paid_participants
+    finally:
+        workbook.close()
+
+
+def read_forbidden_groups(forbidden_file, identity):
+    """Groups of players (one row each) who must not play each other"""
+    workbook = _open_workbook(forbidden_file)
+    try:
+        groups = []
+        for values in workbook.worksheets[0].iter_rows(values_only=True):
+            names = [identity.canonical(value) for value in values if _text(value)]
+            if len(names) >= 2:
+                groups.append(names)
+        return groups
+    finally:
+        workbook.close()
+
+
+def forbidden_pairs_among(groups, participants):
+    """All pairs of the same group in which both players take part"""
+    participant_set = set(participants)
+    pairs = []
+    for group in groups:
+        present = [name for name in group if name in participant_set]
+        for i in range(len(present)):
+            for j in range(i + 1, len(present)):
+                pairs.append((present[i], present[j]))
+    return pairs
+
+
+class TournamentChanges:
+    """Everything one update writes to the tournament file
+
+    writes is {column: {row: value}} of the first sheet, style_rows the row whose
+    format a column copies, forbidden_pairs the new content of the Zabranjeni parovi
+    sheet or None to leave it as it is.
+    """
+
+    def __init__(self):
+        self.writes = {}
+        self.style_rows = {}
+        self.forbidden_pairs = None
+        self.added = []
+        # (name, rating) of players already in the file whose rating changed
+        self.updated = []
+        self.removed = []
+        self.failed = []
+        # Withdrawn or replaced players who had no slot
+        self.not_found = []
+        # Set once the changes are in the file
+        self.written = False
+
+    def set_cell(self, row, col, value):
+        self.writes.setdefault(col, {})[row] = value
+
+    def cells(self):
+        """(row, col) -> value"""
+        return {(row, col): value for col, rows in self.writes.items() for row, value in rows.items()}
+
+    def style_from(self):
+        """(row, col) -> (row, col) of the cell whose format is copied"""
+        return {(row, col): (self.style_rows[col], col)
+                for col, rows in self.writes.items() if col in self.style_rows for row in rows}
+
+    def __bool__(self):
+        return bool(self.writes) or self.forbidden_pairs is not None
+
+
+def plan_changes(model, paid_participants, ratings_lookup, forbidden_groups=None, default_rating=1400,
+                 withdrawn=(), replacements=None, updated_ratings=None):
+    """Work out the changes for the paid participants, without touching the file
+
+    withdrawn players get their placeholder back, replacements ({old: new}) give the slot
+    of a player who withdrew to a late entry, and new participants take the free slots
+    in order. updated_ratings ({name: rating}) are written for players who already have
+    a slot. The model is updated as if the changes had been written.
+    """
+    slots = model.slots
+    changes = TournamentChanges()
+    if model.reference_row is not None:
+        changes.style_rows[NAME_COLUMN] = model.reference_row
+
+    def enter(row, participant):
+        rating = ratings_lookup.get(participant, default_rating)
+        changes.set_cell(row, NAME_COLUMN, participant)
+        if model.rating_column is not None:
+            changes.set_cell(row, model.rating_column, rating)
+        changes.added.append((participant, rating))
+
+    for old_name, new_name in (replacements or {}).items():
+        row = slots.reassign(old_name, new_name)
+        if row is None:
+            changes.not_found.append(old_name)
+        else:
+            changes.removed.append(slots.identity.canonical(old_name))
+            enter(row, slots.names[row])
+
+    for name in withdrawn:
+        row = slots.release(name)
+        if row is None:
+            changes.not_found.append(name)
+            continue
+        changes.removed.append(slots.identity.canonical(name))
+        changes.set_cell(row, NAME_COLUMN, slots.placeholder(row))
+        if model.rating_column is not None:
+            changes.set_cell(row, model.rating_column, slots.placeholder_rating(row))
+
+    if model.rating_column is not None:
+        for name, rating in (updated_ratings or {}).items():
+            row = slots.row_of(name)
+            if row is not None:
+                changes.set_cell(row, model.rating_column, rating)
+                changes.updated.append((slots.names[row], rating))
+
+    # A player who withdrew in this update is not entered again, even if still marked as paid
+    removed = set(changes.removed)
+    for participant in paid_participants:
+        if participant in slots or participant in removed:
+            continue
+        row = slots.assign(participant)
+        if row is None:
+            changes.failed.append(participant)
+        else:
+            enter(row, participant)
+
+    if forbidden_groups is not None and model.has_forbidden_pairs_sheet:
+        participants = [name for name in paid_participants if name not in removed]
+        participants += [slots.identity.canonical(name) for name in (replacements or {}).values()]
+        pairs = forbidden_pairs_among(forbidden_groups, participants)
+        if pairs and pairs != model.forbidden_pairs:
+            changes.forbidden_pairs = pairs
+            model.forbidden_pairs = pairs
+    return changes
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+One command for all tournament scripts
+
+    python code/turniri.py import-participants ["Turnir 2025"] [--withdraw NAME] ...
+    python code/turniri.py watch ["Turnir 2025"]
+    python code/turniri.py export-results
+    python code/turniri.py rate [--incremental] [--no-charts] ...
+    python code/turniri.py plot [--charts web] [--force]
+    python code/turniri.py crosstable [11] [--print]
+    python code/turniri.py head-to-head PLAYER [OPPONENT] [--min 1600]
+    python code/turniri.py pair "Turnir 2025/Turnir 2025.xlsm"
+    python code/turniri.py project "Turnir 2025/Turnir 2025.xlsm" [--watch]
+
+The options after the command are those of the script it runs (add --help to see
+them). Only the standard library is loaded here; each command imports its script,
+and pandas, openpyxl, NumPy, matplotlib and pywin32 are loaded only by the steps
+that use them, so a button click does not wait for imports it does not need.
+"""
+
+import os
+import sys
+from pathlib import Path
+
+code_folder = Path(__file__).resolve().parent
+rating_folder = code_folder.parent / "Rating"
+
+
+def _use_rating_folder():
+    """The rating scripts read and write their files relative to the Rating folder"""
+    sys.path.insert(0, str(rating_folder))
+    os.chdir(rating_folder)
+
+
+def _absolute_workbook(args):
+    """The workbook, given first and relative to where the command was started, as an absolute path"""
+    if args and not args[0].startswith('-'):
+        return [os.path.abspath(args[0])] + args[1:]
+    return args
+
+
+def _run(command, main, args):
+    sys.argv = [f"turniri {command}"] + args
+    return main()
+
+
+def import_participants(command, args):
+    import azuriraj_ucesnike
+    return _run(command, azuriraj_ucesnike.main, args)
+
+
+def watch(command, args):
+    import watch_participants
+    return _run(command, watch_participants.main, args)
+
+
+def export_results(command, args):
+    _use_rating_folder()
+    import excel_to_csv
+    return _run(command, excel_to_csv.main, args)
+
+
+def rate(command, args):
+    _use_rating_folder()
+    import Rating
+    return _run(command, Rating.main, args)
+
+
+def plot(command, args):
+    _use_rating_folder()
+    import charts
+    return _run(command, charts.main, args)
+
+
+def crosstable(command, args):
+    _use_rating_folder()
+    import crosstable
+    return _run(command, crosstable.main, args)
+
+
+def head_to_head(command, args):
+    _use_rating_folder()
+    import head_to_head
+    return _run(command, head_to_head.main, args)
+
+
+def pair(command, args):
+    args = _absolute_workbook(args)
+    _use_rating_folder()
+    import pairing
+    return _run(command, pairing.main, args)
+
+
+def project(command, args):
+    args = _absolute_workbook(args)
+    _use_rating_folder()
+    import projection
+    return _run(command, projection.main, args)
+
+
+commands = {
+    'import-participants': (import_participants, 'transfer paid participants to the tournament file'),
+    'watch': (watch, 'keep the tournament file in sync while registration is open'),
+    'export-results': (export_results, 'export the workbook results to Rezultati/N.csv'),
+    'rate': (rate, 'compute the ratings, histories and charts'),
+    'plot': (plot, 'draw the rating history charts'),
+    'crosstable': (crosstable, 'write the crosstables and standings with tiebreaks'),
+    'head-to-head': (head_to_head, 'score of a player against an opponent or by opponent rating'),
+    'pair': (pair, 'pair the next round of a tournament workbook'),
+    'project': (project, 'projected rating changes of a tournament in progress'),
+}
+
+
+def usage():
+    lines = ["usage: turniri <command> [options]", "", "commands:"]
+    width = max(len(name) for name in commands)
+    for name, (_, description) in commands.items():
+        lines.append(f"  {name:<{width}}  {description}")
+    lines.append("")
+    lines.append("Run 'turniri <command> --help' for the options of a command.")
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if not argv or argv[0] in ('-h', '--help'):
+        print(usage())
+        return 0 if argv else 2
+    if argv[0] not in commands:
+        print(f"turniri: unknown command '{argv[0]}'\n\n{usage()}", file=sys.stderr)
+        return 2
+
+    command, args = argv[0], argv[1:]
+    sys.path.insert(0, str(code_folder))
+    run, _ = commands[command]
+    return run(command, args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Keeps the tournament file up to date while registration is open
+
+Runs in the background instead of the Azuriraj button: the Ucesnici file,
+Rating/all_ratings.csv and the forbidden pairs file are checked every second, and
+once a burst of saves has settled only what changed is written to the tournament
+file: the newly paid participants and the ratings that changed for players who are
+already in it. Python, the workbooks and the ratings stay loaded between updates.
+
+Polls the files, so it runs the same on Windows and Linux:
+    python code/watch_participants.py ["Turnir 2025"] [--interval 1] [--debounce 2]
+"""
+
+import argparse
+import os
+import time
+from pathlib import Path
+
+import azuriraj_ucesnike
+import instrumentation
+import player_identity
+import tournament_model
+
+
+def file_signature(path):
+    """Size and modification time, None while the file does not exist"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_size, stat.st_mtime_ns)
+
+
+class FileWatch:
+    """Change of one file, reported once it has not changed for debounce seconds"""
+
+    def __init__(self, path, debounce):
+        self.path = Path(path)
+        self.debounce = debounce
+        self.signature = file_signature(self.path)
+        self.pending_since = None
+
+    def poll(self, now):
+        signature = file_signature(self.path)
+        if signature != self.signature:
+            # Every save of a burst restarts the wait
+            self.signature = signature
+            self.pending_since = now
+            return False
+        if self.pending_since is not None and now - self.pending_since >= self.debounce:
+            self.pending_since = None
+            return True
+        return False
+
+
+class ParticipantWatcher:
+    """The state of the last update, to find what changed since"""
+
+    def __init__(self, tournament_folder, ucesnici_file, debounce=2.0):
+        self.tournament_folder = tournament_folder
+        self.project_root = tournament_folder.parent
+        self.ucesnici_file = ucesnici_file
+        self.tournament_file = azuriraj_ucesnike.find_tournament_file(tournament_folder)
+        if not self.tournament_file:
+            print("Creating tournament file from template...")
+            self.tournament_file = azuriraj_ucesnike.create_tournament_file_from_template(tournament_folder)
+            if not self.tournament_file:
+                raise FileNotFoundError("Failed to create tournament file from template")
+
+        self.ratings_file = FileWatch(self.project_root / "Rating" / "all_ratings.csv", debounce)
+        self.participants_file = FileWatch(ucesnici_file, debounce)
+        self.forbidden_file = FileWatch(azuriraj_ucesnike.find_forbidden_pairs_file(self.project_root) or
+                                        self.project_root / "Забрањени парови.xlsx", debounce)
+
+        self.ratings = azuriraj_ucesnike.load_ratings(self.project_root)
+        self.identity = player_identity.load_aliases(known_names=self.ratings)
+        self.forbidden_groups = azuriraj_ucesnike.load_forbidden_groups(self.project_root, self.identity)
+        self.paid = []
+        self.model = None
+        self.tournament_signature = None
+
+    def read_paid(self):
+        paid = tournament_model.read_paid_participants(self.ucesnici_file)
+        return list(dict.fromkeys(self.identity.register(name) for name in paid))
+
+    def current_model(self):
+        """The model of the tournament file, read again only if someone else changed the file"""
+        if self.model is None or file_signature(self.tournament_file) != self.tournament_signature:
+            self.model = tournament_model.load_tournament(self.tournament_file, self.identity)
+            self.tournament_signature = file_signature(self.tournament_file)
+        return self.model
+
+    def sync(self, updated_ratings=None):
+        changes = azuriraj_ucesnike.sync_tournament(self.tournament_file, self.paid, self.ratings,
+                                                    identity=self.identity, model=self.current_model(),
+                                                    forbidden_groups=self.forbidden_groups,
+                                                    updated_ratings=updated_ratings)
+        if changes is None or (changes and not changes.written):
+            # The model may not match the file any more: read it again next time
+            self.model = None
+        elif changes.written:
+            self.tournament_signature = file_signature(self.tournament_file)
+
+    def start(self):
+        self.paid = self.read_paid()
+        print(f"Found {len(self.paid)} paid participants")
+        self.sync()
+
+    def check(self, now):
+        """Apply the files that changed and have settled; True if anything was updated"""
+        ratings_changed = self.ratings_file.poll(now)
+        participants_changed = self.participants_file.poll(now)
+        forbidden_changed = self.forbidden_file.poll(now)
+        if not (ratings_changed or participants_changed or forbidden_changed):
+            return False
+
+        try:
+            with instrumentation.span('watch.update'):
+                self.update(ratings_changed, participants_changed, forbidden_changed)
+        except Exception:
+            # Usually a file read in the middle of a save: try again after the next wait
+            for watch, changed in ((self.ratings_file, ratings_changed), (self.participants_file, participants_changed),
+                                   (self.forbidden_file, forbidden_changed)):
+                if changed:
+                    watch.pending_since = now
+            raise
+        return True
+
+    def update(self, ratings_changed, participants_changed, forbidden_changed):
+        updated_ratings = None
+        if ratings_changed:
+            ratings = azuriraj_ucesnike.load_ratings(self.project_root)
+            updated_ratings = {name: rating for name, rating in ratings.items()
+                               if self.ratings.get(name) != rating}
+            self.ratings = ratings
+            print(f"Ratings changed for {len(updated_ratings)} players")
+        if forbidden_changed:
+            self.forbidden_groups = azuriraj_ucesnike.load_forbidden_groups(self.project_root, self.identity)
+            # The pairs are worked out from the paid participants again
+        if participants_changed:
+            paid = self.read_paid()
+            known = set(self.paid)
+            new = [name for name in paid if name not in known]
+            print(f"Ucesnici changed: {len(new)} newly paid participants")
+            self.paid = paid
+
+        self.sync(updated_ratings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Update the tournament file whenever the participants or ratings change')
+    parser.add_argument('tournament_folder', nargs='?', help='default: the most recent tournament folder')
+    parser.add_argument('--interval', type=float, default=1.0, help='seconds between checks of the files')
+    parser.add_argument('--debounce', type=float, default=2.0,
+                        help='seconds a file must stay unchanged before it is read')
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+
+    tournament_folder, ucesnici_file = azuriraj_ucesnike.find_tournament_files(
+        Path(args.tournament_folder) if args.tournament_folder else None)
+    if ucesnici_file is None:
+        return
+
+    # With --profile the stage times of all updates are printed on Ctrl+C
+    with instrumentation.profiling(args):
+        watcher = ParticipantWatcher(tournament_folder, ucesnici_file, args.debounce)
+        watcher.start()
+        print(f"Watching {ucesnici_file.name} and {watcher.ratings_file.path.name}, press Ctrl+C to stop")
+        try:
+            while True:
+                time.sleep(args.interval)
+                try:
+                    watcher.check(time.monotonic())
+                except Exception as e:
+                    print(f"Warning: Update failed, trying again: {e}")
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cell edits of .xlsx/.xlsm workbooks without Excel
+
+Only the XML of the edited sheets is changed. Every other part of the file (macros,
+buttons, drawings, printer settings, the other sheets) is copied as it is. openpyxl
+is not used for writing because it drops the form controls (the buttons) of the
+tournament template. The new file is written next to the old one and renamed over
+it, so the workbook is never left half written.
+"""
+
+import os
+import posixpath
+import re
+import zipfile
+import xml.etree.ElementTree as ET
+from xml.sax.saxutils import escape
+
+MAIN_NAMESPACE = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+RELATIONSHIP_NAMESPACE = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+
+_sheet_data_pattern = re.compile(r'<sheetData\s*/>|<sheetData>(.*?)</sheetData>', re.DOTALL)
+_row_pattern = re.compile(r'<row\b[^>]*?(?:/>|>.*?</row>)', re.DOTALL)
+_cell_pattern = re.compile(r'<c\b[^>]*?(?:/>|>.*?</c>)', re.DOTALL)
+_attribute_pattern = re.compile(r'\s(\w+)="([^"]*)"')
+
+
+def column_letter(col):
+    """1 -> A, 27 -> AA"""
+    letters = ''
+    while col:
+        col, remainder = divmod(col - 1, 26)
+        letters = chr(ord('A') + remainder) + letters
+    return letters
+
+
+def column_number(letters):
+    col = 0
+    for letter in letters:
+        col = col * 26 + ord(letter) - ord('A') + 1
+    return col
+
+
+def _split_reference(reference):
+    letters = reference.rstrip('0123456789')
+    return int(reference[len(letters):]), column_number(letters)
+
+
+def _attributes(element):
+    start_tag = element[:element.index('>') + 1]
+    return dict(_attribute_pattern.findall(start_tag))
+
+
+def _cell_xml(row, col, value, style=None):
+    attributes = f' r="{column_letter(col)}{row}"'
+    if style is not None:
+        attributes += f' s="{style}"'
+    if value is None:
+        return f'<c{attributes}/>'
+    if isinstance(value, bool):
+        return f'<c{attributes} t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, float)):
+        return f'<c{attributes}><v>{value!r}</v></c>'
+    # Inline strings leave the shared string table untouched
+    return f'<c{attributes} t="inlineStr"><is><t xml:space="preserve">{escape(str(value))}</t></is></c>'
+
+
+def sheet_parts(archive):
+    """Zip part of every sheet by sheet name, in workbook order"""
+    workbook = ET.fromstring(archive.read('xl/workbook.xml'))
+    relationships = ET.fromstring(archive.read('xl/_rels/workbook.xml.rels'))
+    targets = {relationship.get('Id'): relationship.get('Target') for relationship in relationships}
+
+    parts = {}
+    for sheet in workbook.iter(f'{{{MAIN_NAMESPACE}}}sheet'):
+        target = targets[sheet.get(f'{{{RELATIONSHIP_NAMESPACE}}}id')]
+        if target.startswith('/'):
+            parts[sheet.get('name')] = target[1:]
+        else:
+            parts[sheet.get('name')] = posixpath.normpath(posixpath.join('xl', target))
+    return parts
+
+
+def _sheet_rows(sheet_xml):
+    match = _sheet_data_pattern.search(sheet_xml)
+    if match is None:
+        raise ValueError("Sheet has no sheetData")
+    rows = {}
+    for row_match in _row_pattern.finditer(match.group(1) or ''):
+        rows[int(_attributes(row_match.group(0))['r'])] = row_match.group(0)
+    return match, rows
+
+
+def _with_sheet_rows(sheet_xml, match, rows):
+    content = ''.join(rows[row] for row in sorted(rows))
+    return sheet_xml[:match.start()] + f'<sheetData>{content}</sheetData>' + sheet_xml[match.end():]
+
+
+def _cell_styles(rows):
+    styles = {}
+    for row_xml in rows.values():
+        for cell_match in _cell_pattern.finditer(row_xml):
+            attributes = _attributes(cell_match.group(0))
+            if 's' in attributes:
+                styles[_split_reference(attributes['r'])] = attributes['s']
+    return styles
+
+
+def patch_sheet_xml(sheet_xml, cells, style_from=None):
+    """Set cell values in the XML of one sheet
+
+    cells maps (row, col) to a value, style_from (row, col) to the (row, col) of the
+    cell whose format the cell gets; otherwise a cell keeps its own format.
+    Returns the new XML and whether a formula was overwritten.
+    """
+    match, rows = _sheet_rows(sheet_xml)
+    style_from = style_from or {}
+    styles = _cell_styles(rows) if style_from else {}
+    formula_overwritten = False
+
+    cells_by_row = {}
+    for (row, col), value in cells.items():
+        cells_by_row.setdefault(row, {})[col] = value
+
+    for row, row_cells in cells_by_row.items():
+        row_xml = rows.get(row, f'<row r="{row}"></row>')
+        if row_xml.endswith('/>'):
+            row_xml = row_xml[:-2] + '></row>'
+        start_tag = row_xml[:row_xml.index('>') + 1]
+        # spans is only a hint and may not cover the new cells
+        start_tag = re.sub(r'\sspans="[^"]*"', '', start_tag)
+
+        row_content = {}
+        for cell_match in _cell_pattern.finditer(row_xml[len(start_tag):]):
+            cell = cell_match.group(0)
+            row_content[_split_reference(_attributes(cell)['r'])[1]] = cell
+
+        for col, value in row_cells.items():
+            old_cell = row_content.get(col)
+            style = _attributes(old_cell).get('s') if old_cell else None
+            if (row, col) in style_from:
+                style = styles.get(style_from[(row, col)], style)
+            if old_cell and '<f' in old_cell:
+                formula_overwritten = True
+            row_content[col] = _cell_xml(row, col, value, style)
+
+        rows[row] = start_tag + ''.join(row_content[col] for col in sorted(row_content)) + '</row>'
+
+    return _with_sheet_rows(sheet_xml, match, rows), formula_overwritten
+
+
+def replace_sheet_values(sheet_xml, values):
+    """Replace all cells of a sheet with rows of values from A1, like clearing the sheet first"""
+    match, _ = _sheet_rows(sheet_xml)
+    rows = {}
+    for row, row_values in enumerate(values, start=1):
+        rows[row] = f'<row r="{row}">' + ''.join(
+            _cell_xml(row, col, value) for col, value in enumerate(row_values, start=1)) + '</row>'
+
+    sheet_xml = _with_sheet_rows(sheet_xml, match, rows)
+    width = max((len(row_values) for row_values in values), default=1)
+    return re.sub(r'<dimension ref="[^"]*"/>', f'<dimension ref="A1:{column_letter(width)}{max(len(values), 1)}"/>',
+                  sheet_xml, count=1)
+
+
+def _without_calc_chain(parts):
+    """Drop the formula calculation order; Excel rebuilds it when a formula was removed"""
+    parts.pop('xl/calcChain.xml', None)
+    parts['[Content_Types].xml'] = re.sub(
+        rb'<Override[^>]*PartName="/xl/calcChain.xml"[^>]*/>', b'', parts['[Content_Types].xml'])
+    parts['xl/_rels/workbook.xml.rels'] = re.sub(
+        rb'<Relationship[^>]*Target="(?:/xl/)?calcChain.xml"[^>]*/>', b'', parts['xl/_rels/workbook.xml.rels'])
+
+
+def _full_calculation_on_load(workbook_xml):
+    """Formulas that show the edited cells are recalculated when Excel opens the file"""
+    if b'fullCalcOnLoad' in workbook_xml:
+        return workbook_xml
+    if b'<calcPr' in workbook_xml:
+        return workbook_xml.replace(b'<calcPr', b'<calcPr fullCalcOnLoad="1"', 1)
+    return workbook_xml
+
+
+def patch_workbook(file_path, cells=None, style_from=None, replace_sheets=None):
+    """Edit a workbook in place
+
+    cells: {sheet name: {(row, col): value}}, style_from: {sheet name: {(row, col): (row, col)}},
+    replace_sheets: {sheet name: rows of values} for sheets whose content is replaced.
+    Raises KeyError for a missing sheet and OSError when the file cannot be replaced,
+    e.g. while it is open in Excel on Windows.
+    """
+    cells = cells or {}
+    style_from = style_from or {}
+    replace_sheets = replace_sheets or {}
+
+    with zipfile.ZipFile(file_path) as archive:
+        infos = archive.infolist()
+        parts = {info.filename: archive.read(info.filename) for info in infos}
+        sheets = sheet_parts(archive)
+
+    formula_overwritten = False
+    for sheet_name, sheet_cells in cells.items():
+        part = sheets[sheet_name]
+        sheet_xml, overwritten = patch_sheet_xml(parts[part].decode('utf-8'), sheet_cells,
+                                                 style_from.get(sheet_name))
+        parts[part] = sheet_xml.encode('utf-8')
+        formula_overwritten = formula_overwritten or overwritten
+    for sheet_name, values in replace_sheets.items():
+        part = sheets[sheet_name]
+        sheet_xml = parts[part].decode('utf-8')
+        # Clearing a sheet with formulas also needs a new calculation order
+        formula_overwritten = formula_overwritten or '<f' in _sheet_data_pattern.search(sheet_xml).group(0)
+        parts[part] = replace_sheet_values(sheet_xml, values).encode('utf-8')
+
+    if formula_overwritten:
+        _without_calc_chain(parts)
+    parts['xl/workbook.xml'] = _full_calculation_on_load(parts['xl/workbook.xml'])
+
+    directory, name = os.path.split(os.path.abspath(file_path))
+    temp_file = os.path.join(directory, f"~{name}.tmp")
+    try:
+        with zipfile.ZipFile(temp_file, 'w') as archive:
+            for info in infos:
+                if info.filename in parts:
+                    archive.writestr(info, parts[info.filename])
+        os.replace(temp_file, file_path)
+    finally:
+        if os.path.exists(temp_file):
+            os.remove(temp_file)